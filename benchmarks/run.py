@@ -0,0 +1,297 @@
+"""
+Benchmarks for `to_dict` hot paths on the bundled models, run against an in-memory SQLite database.
+
+Every benchmark reports operations per second, peak memory allocated by an operation and queries per operation.
+Results may be saved as a machine-readable baseline and compared against later:
+
+    python -m benchmarks.run --save baseline.json
+    python -m benchmarks.run --compare baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from django.conf import settings
+
+settings.configure(
+    DEBUG=False,
+    USE_TZ=True,
+    DATABASES={
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": ":memory:",
+        }
+    },
+    INSTALLED_APPS=[
+        "django.contrib.contenttypes",
+        "django_model_to_dict",
+    ],
+)
+
+import django  # noqa: E402
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.core.serializers.json import DjangoJSONEncoder  # noqa: E402
+from django.db import connection, models  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product  # noqa: E402
+from django_model_to_dict.plugins.serialization import SerializationPlugin  # noqa: E402
+from django_model_to_dict.dbjson import to_db_json  # noqa: E402
+from django_model_to_dict.encoding import to_json_lines  # noqa: E402
+from django_model_to_dict.querysets import to_dicts  # noqa: E402
+from django_model_to_dict.records import to_records  # noqa: E402
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name, objects=1):
+    """Registers a benchmark; `objects` is the number of objects serialized per operation"""
+    def decorator(func):
+        BENCHMARKS[name] = (func, objects)
+        return func
+    return decorator
+
+
+class UpperCasePlugin(SerializationPlugin):
+    field_type = models.CharField
+
+    @staticmethod
+    def serialize_field(field, model_instance):
+        value = field.value_from_object(model_instance)
+        return value and value.upper()
+
+
+class PluginCustomer(Customer):
+    TO_DICT_SERIALIZATION_PLUGINS = (UpperCasePlugin,)
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+CUSTOMERS = 100
+ORDERS_PER_CUSTOMER = 5
+POSITIONS_PER_ORDER = 4
+
+
+def populate():
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    Product.objects.bulk_create([Product(name='Product %s' % i, price=i + 1) for i in range(20)])
+    products = list(Product.objects.all())
+    Customer.objects.bulk_create([
+        Customer(first_name='First %s' % i, middle_name=(i % 2 and 'Middle') or None, last_name='Last %s' % i,
+                 nickname='Nick %s' % i, has_superpowers=bool(i % 3), tel='555-55-%02d' % (i % 100),
+                 email='customer%s@example.com' % i, website='https://example.com/%s' % i,
+                 address_country='Country', address_city=(i % 2 and 'City') or None, address_street='Street %s' % i)
+        for i in range(CUSTOMERS)])
+    Order.objects.bulk_create([
+        Order(customer=customer) for customer in Customer.objects.all() for _ in range(ORDERS_PER_CUSTOMER)])
+    OrderPosition.objects.bulk_create([
+        OrderPosition(order=order, product=products[(order.pk + i) % len(products)], price=10, quantity=i + 1)
+        for order in Order.objects.all() for i in range(POSITIONS_PER_ORDER)])
+
+
+@benchmark('single.customer.fields')
+def single_customer_fields():
+    customer = Customer.objects.first()
+    return lambda: customer.to_dict(inspect_related_objects=False)
+
+
+@benchmark('single.customer.uncompressed')
+def single_customer_uncompressed():
+    customer = Customer.objects.first()
+    return lambda: customer.to_dict(compress_fields=False, compress_groups=False, compress_prefixes=False,
+                                    compress_postfixes=False, inspect_related_objects=False)
+
+
+@benchmark('single.customer.compress_empty_groups')
+def single_customer_compress_empty_groups():
+    customer = Customer.objects.first()
+    return lambda: customer.to_dict(compress_empty_groups=True, inspect_related_objects=False)
+
+
+@benchmark('single.customer.plugins')
+def single_customer_plugins():
+    customer = PluginCustomer.objects.first()
+    return lambda: customer.to_dict(inspect_related_objects=False)
+
+
+@benchmark('related.order.depth1')
+def related_order():
+    order = Order.objects.first()
+    return lambda: order.to_dict()
+
+
+@benchmark('related.customer.depth1')
+def related_customer():
+    customer = Customer.objects.first()
+    return lambda: customer.to_dict()
+
+
+@benchmark('related.order.fk_pk')
+def related_order_fk_pk():
+    order = Order.objects.first()
+    return lambda: order.to_dict(related_modes={'customer': 'pk'})
+
+
+@benchmark('bulk.customer.list_comprehension', objects=CUSTOMERS)
+def bulk_customer_list_comprehension():
+    return lambda: [o.to_dict(inspect_related_objects=False) for o in Customer.objects.all()]
+
+
+@benchmark('bulk.customer.to_dicts', objects=CUSTOMERS)
+def bulk_customer_to_dicts():
+    return lambda: to_dicts(Customer.objects.all(), inspect_related_objects=False)
+
+
+@benchmark('bulk.customer.related.list_comprehension', objects=CUSTOMERS)
+def bulk_customer_related_list_comprehension():
+    return lambda: [o.to_dict() for o in Customer.objects.all()]
+
+
+@benchmark('bulk.customer.related.to_dicts', objects=CUSTOMERS)
+def bulk_customer_related_to_dicts():
+    return lambda: to_dicts(Customer.objects.all())
+
+
+@benchmark('bulk.customer.depth3.to_dicts', objects=CUSTOMERS)
+def bulk_customer_depth3_to_dicts():
+    return lambda: to_dicts(Customer.objects.all(), depth=3)
+
+
+@benchmark('bulk.order_position.fk_pk.to_dicts', objects=CUSTOMERS * ORDERS_PER_CUSTOMER * POSITIONS_PER_ORDER)
+def bulk_order_position_fk_pk_to_dicts():
+    return lambda: to_dicts(OrderPosition.objects.all(), related_modes={'order': 'pk', 'product': 'pk'})
+
+
+@benchmark('bulk.order_position.to_dicts', objects=CUSTOMERS * ORDERS_PER_CUSTOMER * POSITIONS_PER_ORDER)
+def bulk_order_position_to_dicts():
+    return lambda: to_dicts(OrderPosition.objects.all(), inspect_related_objects=False)
+
+
+@benchmark('bulk.customer.to_records', objects=CUSTOMERS)
+def bulk_customer_to_records():
+    return lambda: to_records(Customer.objects.all(), inspect_related_objects=False)
+
+
+@benchmark('bulk.order_position.to_records', objects=CUSTOMERS * ORDERS_PER_CUSTOMER * POSITIONS_PER_ORDER)
+def bulk_order_position_to_records():
+    return lambda: to_records(OrderPosition.objects.all(), inspect_related_objects=False)
+
+
+@benchmark('bulk.order_position.json.dumps', objects=CUSTOMERS * ORDERS_PER_CUSTOMER * POSITIONS_PER_ORDER)
+def bulk_order_position_json_dumps():
+    encode = DjangoJSONEncoder(separators=(',', ':')).encode
+    return lambda: '\n'.join(encode(result) for result in to_dicts(OrderPosition.objects.all(),
+                                                                   inspect_related_objects=False))
+
+
+@benchmark('bulk.order_position.to_json_lines', objects=CUSTOMERS * ORDERS_PER_CUSTOMER * POSITIONS_PER_ORDER)
+def bulk_order_position_to_json_lines():
+    return lambda: to_json_lines(OrderPosition.objects.all(), inspect_related_objects=False)
+
+
+@benchmark('bulk.customer.related.to_json_lines', objects=CUSTOMERS)
+def bulk_customer_related_to_json_lines():
+    return lambda: to_json_lines(Customer.objects.all())
+
+
+@benchmark('bulk.customer.related.to_db_json', objects=CUSTOMERS)
+def bulk_customer_related_to_db_json():
+    return lambda: to_db_json(Customer.objects.all())
+
+
+@benchmark('bulk.order_position.to_db_json', objects=CUSTOMERS * ORDERS_PER_CUSTOMER * POSITIONS_PER_ORDER)
+def bulk_order_position_to_db_json():
+    return lambda: to_db_json(OrderPosition.objects.all(), inspect_related_objects=False)
+
+
+def measure(func, min_time):
+    """Returns operations per second, peak memory allocated by an operation and queries per operation"""
+    func()  # warming up, e.g. building plans
+
+    iterations, elapsed = 0, 0.0
+    start = time.perf_counter()
+    while elapsed < min_time:
+        func()
+        iterations += 1
+        elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    _, peak_allocated = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with CaptureQueriesContext(connection) as queries:
+        func()
+
+    return OrderedDict((
+        ('ops_per_sec', iterations / elapsed),
+        ('peak_allocated_bytes', peak_allocated),
+        ('queries', len(queries)),
+    ))
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the difference with the baseline.
+
+    :return: names of the benchmarks slower by more than `threshold`, or issuing more queries
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['ops_per_sec'] / baseline[name]['ops_per_sec']
+        queries = result['queries'] - baseline[name]['queries']
+        print('%-45s %+7.1f%% ops/sec %+4d queries' % (name, (ratio - 1) * 100, queries))
+        if ratio < 1 - threshold or queries > 0:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('filter', nargs='?', default='', help='run only benchmarks containing this substring')
+    parser.add_argument('--min-time', type=float, default=0.5, help='minimal time per benchmark, seconds')
+    parser.add_argument('--save', metavar='PATH', help='save results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare results with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='tolerated ops/sec slowdown ratio')
+    args = parser.parse_args(argv)
+
+    populate()
+
+    results = OrderedDict()
+    print('%-45s %12s %12s %12s %8s' % ('benchmark', 'ops/sec', 'objects/sec', 'bytes/op', 'queries'))
+    for name, (setup, objects) in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(setup(), args.min_time)
+        result['objects_per_op'] = objects
+        print('%-45s %12.1f %12.1f %12d %8d' % (
+            name, result['ops_per_sec'], result['ops_per_sec'] * objects, result['peak_allocated_bytes'],
+            result['queries']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'django': django.get_version(), 'python': sys.version.split()[0], 'results': results},
+                      f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('\nRegressions: %s' % ', '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,3 @@
 __version__ = '0.2.0'
+
+default_app_config = 'django_model_to_dict.apps.DjangoModelToDictConfig'
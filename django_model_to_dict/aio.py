@@ -0,0 +1,227 @@
+"""
+Asynchronous serialization for ASGI views.
+
+With Django's async ORM (Django 4.1+), related objects are loaded natively (`aiterator()`, `afirst()`),
+and objects which need no database access at all are serialized right in the event loop.
+Whatever requires synchronous database access (custom related fields strategies, `_to_dict_pre_finish_hook`,
+serialization plugins, output caching, deferred fields, many-to-many relations, related modes, graphs deeper
+than a single level, or Django versions without the async ORM) is run in a worker thread, with a single thread hop
+per object (`ato_dict`) or per chunk (`ato_dicts`).
+
+The test suite runs on Django versions without the async ORM, so the native code path is not verified by it yet:
+set `HAS_ASYNC_ORM = False` to have everything serialized in worker threads, with the synchronous functions.
+
+`TO_DICT_ASYNC_CONCURRENCY` limits the number of database operations run concurrently by these functions
+within an event loop (unlimited by default).
+
+This module requires Python 3.5+.
+"""
+import asyncio
+import functools
+import weakref
+
+from django.db.models import QuerySet, prefetch_related_objects
+
+from .plan import get_related_key, parse_projection
+from .querysets import to_dicts, _can_serialize_values, _get_loaded_fields, _get_related_lookups, \
+    _get_row_serializer
+from .settings import TO_DICT_ASYNC_CONCURRENCY, TO_DICT_DEPTH, TO_DICT_REPEATED_OBJECTS
+from . import cache
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:  # Django < 3.0
+    sync_to_async = None
+
+try:
+    from django.db.models import aprefetch_related_objects
+except ImportError:  # Django < 5.0
+    aprefetch_related_objects = None
+
+HAS_ASYNC_ORM = hasattr(QuerySet, 'aiterator')
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+async def ato_dict(instance, compress_fields=True, compress_groups=True, compress_prefixes=True,
+                   compress_postfixes=True, compress_empty_groups=False, inspect_related_objects=True,
+                   compress_empty_related_objects=False, fields=None, depth=None, repeated_objects=None,
+                   related_modes=None):
+    """
+    Asynchronous counterpart of `ToDictMixin.to_dict`, accepting the same arguments.
+    """
+    kwargs = dict(compress_fields=compress_fields, compress_groups=compress_groups,
+                  compress_prefixes=compress_prefixes, compress_postfixes=compress_postfixes,
+                  compress_empty_groups=compress_empty_groups,
+                  compress_empty_related_objects=compress_empty_related_objects, fields=fields,
+                  depth=depth, repeated_objects=repeated_objects, related_modes=related_modes)
+    plan = instance._get_to_dict_plan(fields)
+    if depth is None:
+        depth = getattr(instance, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+
+    # graphs deeper than a single level are serialized synchronously, with an identity map
+    if depth > 1 or related_modes or not _is_native(instance, plan):
+        return await _run_sync(functools.partial(instance.to_dict, inspect_related_objects=inspect_related_objects,
+                                                 **kwargs))
+
+    result = instance.to_dict(inspect_related_objects=False, **kwargs)
+    if inspect_related_objects and depth > 0:
+        await _default_related_fields_strategy(instance, result, plan)
+    return result
+
+
+async def ato_dicts(queryset, compress_fields=True, compress_groups=True, compress_prefixes=True,
+                    compress_postfixes=True, compress_empty_groups=False, inspect_related_objects=True,
+                    compress_empty_related_objects=False, chunk_size=None, fields=None, depth=None,
+                    repeated_objects=None, related_modes=None):
+    """
+    Asynchronous counterpart of `querysets.to_dicts`, accepting the same arguments.
+
+    :param chunk_size: with the async ORM, instances are fetched and their related objects prefetched
+        in chunks of this size (the whole queryset at once by default)
+    """
+    model = queryset.model
+    if fields is not None:
+        fields = parse_projection(fields)
+    plan = model._get_to_dict_plan(fields)
+    compression = (compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups)
+    if depth is None:
+        depth = getattr(model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+    if repeated_objects is None:
+        repeated_objects = getattr(model, 'TO_DICT_REPEATED_OBJECTS', TO_DICT_REPEATED_OBJECTS)
+    inspect_related_objects = inspect_related_objects and depth > 0
+
+    has_hooks = hasattr(model, '_to_dict_pre_finish_hook') or hasattr(model, '_to_dict_related_fields_strategy')
+    native = depth <= 1 and not related_modes and not plan.related_modes and HAS_ASYNC_ORM and \
+        not plan.plugin_fields and cache.get_backend(model) is None and not has_hooks and not _has_many_to_many(plan)
+    if not native:
+        return await _run_sync(functools.partial(
+            to_dicts, queryset, *compression, inspect_related_objects=inspect_related_objects,
+            compress_empty_related_objects=compress_empty_related_objects, chunk_size=chunk_size, fields=fields,
+            depth=depth, repeated_objects=repeated_objects, related_modes=related_modes))
+
+    if _can_serialize_values(model, plan, inspect_related_objects, related_modes):
+        rows = queryset.values_list(*plan.attnames) if plan.attnames else queryset.values_list('pk')
+        serialize = _get_row_serializer(plan, compression)
+        results = []
+        async with _get_semaphore():
+            async for row in rows.aiterator():
+                results.append(serialize(row))
+        return results
+
+    if fields is not None:
+        queryset = queryset.only(*_get_loaded_fields(model, plan, inspect_related_objects))
+    select_related, prefetch_related = _get_related_lookups(model, plan, depth, related_modes) \
+        if inspect_related_objects else ((), ())
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+
+    kwargs = dict(inspect_related_objects=inspect_related_objects,
+                  compress_empty_related_objects=compress_empty_related_objects, fields=fields, depth=depth,
+                  repeated_objects=repeated_objects, related_modes=related_modes)
+    results, chunk = [], []
+    async with _get_semaphore():
+        async for obj in queryset.aiterator():
+            chunk.append(obj)
+            if chunk_size and len(chunk) >= chunk_size:
+                results.extend(await _serialize_chunk(chunk, prefetch_related, compression, kwargs))
+                chunk = []
+        if chunk:
+            results.extend(await _serialize_chunk(chunk, prefetch_related, compression, kwargs))
+    return results
+
+
+async def _serialize_chunk(chunk, prefetch_related, compression, kwargs):
+    if prefetch_related:
+        if aprefetch_related_objects is not None:
+            await aprefetch_related_objects(chunk, *prefetch_related)
+        else:
+            await sync_to_async(prefetch_related_objects)(chunk, *prefetch_related)
+    # all the related objects are loaded, no database access is left
+    return [obj.to_dict(*compression, **kwargs) for obj in chunk]
+
+
+async def _default_related_fields_strategy(instance, result, plan):
+    """Asynchronous counterpart of `ToDictMixin._default_related_fields_strategy`"""
+    for rf in plan.related_fields:
+        projection = plan.projection and plan.projection[get_related_key(rf)] or None
+        if rf.one_to_many:
+            if not rf.related_name:
+                continue
+            related_objects = []
+            async with _get_semaphore():
+                async for related_object in getattr(instance, rf.related_name).all():
+                    related_objects.append(related_object)
+            result[rf.related_name] = [
+                i.to_dict(inspect_related_objects=False, fields=projection) for i in related_objects]
+        if rf.many_to_one or rf.one_to_one:
+            related_object = await _get_related_object(instance, rf)
+            if hasattr(related_object, 'to_dict'):
+                result[rf.name] = related_object.to_dict(inspect_related_objects=False, fields=projection)
+
+
+async def _get_related_object(instance, rf):
+    if rf.is_cached(instance):
+        return getattr(instance, rf.name)
+    if rf.concrete:
+        value = getattr(instance, rf.attname)
+        if value is None:
+            return None
+        lookup = {rf.target_field.name: value}
+    else:
+        lookup = {rf.field.name: instance}
+    async with _get_semaphore():
+        return await rf.related_model._base_manager.filter(**lookup).afirst()
+
+
+def _is_native(instance, plan):
+    """Tells whether the instance may be serialized with the async ORM, without any synchronous database access"""
+    model = type(instance)
+    if not HAS_ASYNC_ORM or plan.plugin_fields or cache.get_backend(model) is not None:
+        return False
+    if hasattr(model, '_to_dict_pre_finish_hook') or hasattr(model, '_to_dict_related_fields_strategy'):
+        return False
+    if _has_many_to_many(plan) or plan.related_modes:
+        return False
+    return not instance.get_deferred_fields().intersection(plan.attnames)
+
+
+def _has_many_to_many(plan):
+    # many-to-many relations are loaded through the through table, synchronously
+    return any(rf.many_to_many for rf in plan.related_fields)
+
+
+async def _run_sync(func):
+    async with _get_semaphore():
+        if sync_to_async is not None:
+            return await sync_to_async(func)()
+        return await asyncio.get_event_loop().run_in_executor(None, _close_connections_after(func))
+
+
+def _close_connections_after(func):
+    # executor threads are not managed by Django, so their connections must not be left open
+    def wrapper():
+        from django.db import connections
+        try:
+            return func()
+        finally:
+            connections.close_all()
+    return wrapper
+
+
+class _NoLimit:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def _get_semaphore():
+    if not TO_DICT_ASYNC_CONCURRENCY:
+        return _NoLimit()
+    loop = asyncio.get_event_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(TO_DICT_ASYNC_CONCURRENCY)
+    return semaphore
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class DjangoModelToDictConfig(AppConfig):
     name = 'django_model_to_dict'
+
+    def ready(self):
+        # cached output is invalidated by every process saving objects, even if it never reads the cache
+        from . import cache
+        if cache.is_enabled():
+            cache.connect_signals()
@@ -0,0 +1,333 @@
+import pickle
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db.models.fields.reverse_related import ForeignObjectRel
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.utils.module_loading import import_string
+
+from .plan import get_related_key, get_many_to_many_through
+from .settings import TO_DICT_CACHE, TO_DICT_CACHE_VERSION
+
+
+class CacheBackend:
+    """
+    Base class for `to_dict()` output cache backends.
+
+    Every serialized object is stored under a single key, holding its `to_dict()` outputs
+    for every combination of `to_dict` arguments it has been serialized with,
+    so an object is invalidated by deleting a single key.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        raise NotImplementedError
+
+
+class DjangoCacheBackend(CacheBackend):
+    """Stores `to_dict()` output in one of the caches configured with Django's cache framework"""
+
+    def __init__(self, alias='default', timeout=None):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def delete_many(self, keys):
+        self.cache.delete_many(keys)
+
+
+class LRUCacheBackend(CacheBackend):
+    """
+    In-process cache keeping at most `max_size` serialized objects.
+
+    Values are pickled, so callers are free to modify the dictionaries they get.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                return None
+            self._data.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# instance attribute holding the objects which embedded the instance before it was saved,
+# see `remember_previous_dependents`
+PREVIOUS_DEPENDENTS_ATTRIBUTE = '_to_dict_previous_dependents'
+# instance attribute holding the objects a many-to-many relation of the instance was cleared of, by through model,
+# see `remember_cleared_objects`
+CLEARED_OBJECTS_ATTRIBUTE = '_to_dict_cleared_objects'
+
+_backends = {}
+_local = threading.local()
+_dependencies = None
+_signals_connected = False
+
+
+def get_backend(model):
+    """
+    Returns the cache backend configured for the model with `TO_DICT_CACHE`, or `None`.
+
+    `TO_DICT_CACHE` is either a `CacheBackend` instance or a dotted path to a `CacheBackend` class.
+    Backends specified with a dotted path are instantiated once and shared between models.
+    """
+    backend = getattr(model, 'TO_DICT_CACHE', TO_DICT_CACHE)
+    if isinstance(backend, str):
+        if backend not in _backends:
+            _backends[backend] = import_string(backend)()
+        backend = _backends[backend]
+    return backend
+
+
+def is_enabled():
+    """Whether `TO_DICT_CACHE` is set globally or for any of the installed models"""
+    return TO_DICT_CACHE is not None or any(
+        hasattr(model, 'to_dict') and get_backend(model) is not None for model in apps.get_models())
+
+
+def is_tracked(model):
+    """
+    Whether serialization output of the model is kept anywhere: in the output cache or in snapshots
+    (see `django_model_to_dict.snapshots`), so that it has to be refreshed when the objects it embeds change
+    """
+    if get_backend(model) is not None:
+        return True
+    if apps.is_installed('django_model_to_dict.snapshots'):
+        from .snapshots.store import is_enabled as snapshots_enabled
+        return bool(snapshots_enabled(model))
+    return False
+
+
+@contextmanager
+def bypass():
+    """
+    Neither reads nor stores cached `to_dict()` output in the current thread within the block,
+    e.g. to serialize objects right after their relations changed, before the receivers invalidated them.
+    """
+    outer = getattr(_local, 'bypass', False)
+    _local.bypass = True
+    try:
+        yield
+    finally:
+        _local.bypass = outer
+
+
+def get_cached(backend, instance, arguments):
+    """Returns cached `to_dict()` output of the instance for the given arguments, or `None`"""
+    if getattr(_local, 'bypass', False):
+        return None
+    # models configured after the app registry is ready (see `DjangoModelToDictConfig`) are handled here
+    connect_signals()
+    entry = backend.get(_get_key(type(instance), instance.pk))
+    if entry:
+        return entry.get(arguments)
+    return None
+
+
+def set_cached(backend, instance, arguments, result):
+    """Stores `to_dict()` output of the instance for the given arguments"""
+    if getattr(_local, 'bypass', False):
+        return
+    key = _get_key(type(instance), instance.pk)
+    entry = backend.get(key) or {}
+    entry[arguments] = result
+    backend.set(key, entry)
+
+
+def invalidate(model, pks):
+    """Removes cached `to_dict()` output of the given model objects"""
+    backend = get_backend(model)
+    if backend is not None and pks:
+        backend.delete_many([_get_key(model, pk) for pk in pks])
+
+
+def invalidate_instance(instance):
+    """
+    Removes cached `to_dict()` output of the instance and of the objects embedding it as a related object,
+    including the objects it was embedded in before a foreign key of it was changed
+    (see `remember_previous_dependents`).
+    """
+    model = type(instance)
+    invalidate(model, [instance.pk])
+    for dependent_model, get_pks in _get_dependencies().get(model, ()):
+        if get_backend(dependent_model) is not None:
+            invalidate(dependent_model, get_pks(instance))
+    for dependent_model, pks in get_previous_dependents(instance):
+        if get_backend(dependent_model) is not None:
+            invalidate(dependent_model, pks)
+
+
+def remember_previous_dependents(sender, instance, raw=False, **kwargs):
+    """
+    `pre_save` receiver reading the foreign keys the instance holds to the objects embedding it as they are
+    stored before the save, so that the objects it's moved away from (e.g. the `Order` an `OrderPosition`
+    used to belong to) are refreshed along with the new ones. Costs a query per save of such an instance,
+    unless none of the embedding models is tracked (see `is_tracked`).
+    """
+    dependents = [(dependent_model, get_pks.attname) for dependent_model, get_pks in
+                  _get_dependencies().get(sender, ()) if hasattr(get_pks, 'attname') and is_tracked(dependent_model)]
+    previous_dependents = []
+    if dependents and not raw and not instance._state.adding and instance.pk is not None:
+        row = sender._base_manager.filter(pk=instance.pk).values_list(*(a for _, a in dependents)).first()
+        for (dependent_model, attname), pk in zip(dependents, row or ()):
+            if pk is not None and pk != getattr(instance, attname):
+                previous_dependents.append((dependent_model, [pk]))
+    instance.__dict__[PREVIOUS_DEPENDENTS_ATTRIBUTE] = previous_dependents
+
+
+def get_previous_dependents(instance):
+    """Returns (model, pks) pairs of the objects which embedded the instance before its last save"""
+    return instance.__dict__.get(PREVIOUS_DEPENDENTS_ATTRIBUTE, ())
+
+
+def remember_cleared_objects(sender, instance, action, reverse, model, **kwargs):
+    """
+    `m2m_changed` receiver reading the objects a many-to-many relation is about to be cleared of on `pre_clear`,
+    as `post_clear` doesn't tell them (and auto-created through models send no `post_delete`).
+    Costs a query per `clear()` of a relation to a tracked model (see `is_tracked`).
+    """
+    if action != 'pre_clear' or not is_tracked(model):
+        return
+    rf = _get_many_to_many_field(type(instance), sender, reverse)
+    if rf is None:
+        return
+    through, source_name, target_name = get_many_to_many_through(rf)
+    pks = list(through._base_manager.filter(**{source_name: instance.pk}).values_list(target_name, flat=True))
+    instance.__dict__.setdefault(CLEARED_OBJECTS_ATTRIBUTE, {})[sender] = pks
+
+
+def get_cleared_pks(instance, through):
+    """Returns the pks of the objects the instance's relation with the through model was last cleared of"""
+    return instance.__dict__.get(CLEARED_OBJECTS_ATTRIBUTE, {}).get(through)
+
+
+def _get_many_to_many_field(model, through, reverse):
+    for rf in model._meta.get_fields():
+        if rf.many_to_many and isinstance(rf, ForeignObjectRel) == reverse and \
+                get_many_to_many_through(rf)[0] is through:
+            return rf
+    return None
+
+
+def _get_key(model, pk):
+    version = getattr(model, 'TO_DICT_CACHE_VERSION', TO_DICT_CACHE_VERSION)
+    return 'to_dict:%s:%s:%s' % (version, model._meta.label_lower, pk)
+
+
+def _get_dependencies():
+    """
+    Maps every model to the `ToDictMixin` models embedding it through `_default_related_fields_strategy`,
+    along with functions returning the pks of the embedding objects for an instance.
+    """
+    global _dependencies
+    if _dependencies is not None:
+        return _dependencies
+
+    from .mixins import ToDictMixin
+    dependencies = {}
+    for model in apps.get_models():
+        if not issubclass(model, ToDictMixin) or hasattr(model, '_to_dict_related_fields_strategy'):
+            continue
+        for rf in model._get_to_dict_plan().related_fields:
+            if (rf.one_to_many and rf.related_name) or (rf.one_to_one and not rf.concrete):
+                # the embedded object holds the foreign key to the embedding one
+                get_pks = _get_pks_from_attribute(rf.field.attname)
+            elif rf.many_to_one or rf.one_to_one:
+                # the embedding objects hold foreign keys to the embedded one
+                get_pks = _get_pks_from_query(model, rf.attname)
+            elif rf.many_to_many and get_related_key(rf):
+                # the through table links the embedding objects to the embedded one
+                through, source_name, target_name = get_many_to_many_through(rf)
+                if not through._meta.auto_created:
+                    # through model instances are saved and deleted directly, see TO_DICT_THROUGH_FIELDS
+                    dependencies.setdefault(through, []).append(
+                        (model, _get_pks_from_attribute(through._meta.get_field(source_name).attname)))
+                get_pks = _get_pks_from_query(model, rf.name)
+            else:
+                continue
+            dependencies.setdefault(rf.related_model, []).append((model, get_pks))
+    _dependencies = dependencies
+    return dependencies
+
+
+def _get_pks_from_attribute(attname):
+    def get_pks(instance):
+        pk = getattr(instance, attname)
+        return [pk] if pk is not None else []
+    # the foreign key may change, see `remember_previous_dependents`
+    get_pks.attname = attname
+    return get_pks
+
+
+def _get_pks_from_query(model, attname):
+    def get_pks(instance):
+        return list(model._default_manager.filter(**{attname: instance.pk}).values_list('pk', flat=True))
+    return get_pks
+
+
+def connect_signals():
+    """Connects the invalidation receivers, see `DjangoModelToDictConfig.ready()`"""
+    global _signals_connected
+    if _signals_connected:
+        return
+    pre_save.connect(remember_previous_dependents, dispatch_uid='django_model_to_dict.cache.pre_save')
+    m2m_changed.connect(remember_cleared_objects, dispatch_uid='django_model_to_dict.cache.pre_clear')
+    post_save.connect(_on_change, dispatch_uid='django_model_to_dict.cache.post_save')
+    post_delete.connect(_on_change, dispatch_uid='django_model_to_dict.cache.post_delete')
+    m2m_changed.connect(_on_m2m_change, dispatch_uid='django_model_to_dict.cache.m2m_changed')
+    _signals_connected = True
+
+
+def _on_change(sender, instance, **kwargs):
+    if hasattr(instance, 'to_dict') or sender in _get_dependencies():
+        invalidate_instance(instance)
+
+
+def _on_m2m_change(sender, instance, action, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    _on_change(type(instance), instance)
+    if action == 'post_clear':
+        pk_set = get_cleared_pks(instance, sender)
+    if pk_set:
+        invalidate(model, pk_set)
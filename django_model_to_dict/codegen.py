@@ -0,0 +1,206 @@
+"""
+Code generation of specialized serializer functions.
+
+For every serialization plan and combination of the compression arguments of `to_dict`, a straight-line python
+function is generated: field values are loaded right from instance attributes (or from `values_list()` rows)
+into a dictionary literal, with the compressed keys inserted conditionally, so there are no loops over the plan
+and no checks of compression arguments left at runtime. Functions are compiled once and cached on the plan.
+
+The generated code covers the fields of the model only: related objects, `_to_dict_related_fields_strategy`,
+`_to_dict_pre_finish_hook` and output caching are handled by `to_dict` as usual, and instrumented calls
+(see `django_model_to_dict.instrumentation`) go through the generic code. So do projections
+(see `to_dict`): they are client-defined and unbounded, so serializers are only generated for the full plan
+of a model. Disable code generation with `TO_DICT_CODEGEN = False` (globally or per model).
+
+The generated source may be inspected with `get_source()`, and written out ahead of time with `write_module()`
+(or the `to_dict_codegen` management command), so that no code is compiled on startup:
+
+```
+# settings.py
+TO_DICT_CODEGEN_MODULE = 'myproject.to_dict_serializers'
+```
+"""
+import hashlib
+import keyword
+from collections import OrderedDict
+from importlib import import_module
+
+from django.apps import apps
+from django.db.models import Field
+
+from .settings import TO_DICT_CODEGEN_MODULE
+
+# compression arguments of `to_dict` calls with the default arguments, and of uncompressed output
+DEFAULT_COMPRESSION = (True, True, True, True, False)
+NO_COMPRESSION = (False, False, False, False, False)
+
+FACTORY_NAME = 'make_serializer'
+
+_precompiled = None
+
+
+def generate_source(plan, compression=DEFAULT_COMPRESSION, values=False, name=FACTORY_NAME):
+    """
+    Returns the source of a serializer factory for a plan: a function accepting `plan.fields`
+    and returning the serializer function.
+
+    :param compression: `to_dict` compression arguments, (compress_fields, compress_groups, compress_prefixes,
+        compress_postfixes, compress_empty_groups)
+    :param values: generate a serializer of `values_list()` rows (ordered as `plan.attnames`)
+        instead of model instances
+    :param name: name of the factory function
+    """
+    compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups = compression
+    if values and plan.plugin_fields:
+        raise ValueError('values_list() rows of %s cannot be serialized with plugins' % plan.model.__name__)
+
+    bindings = []
+
+    def get_value(index):
+        if values:
+            return 'row[%d]' % index
+        field, bucket, key, plugin = plan.fields[index]
+        attname = field.attname
+        if type(field).value_from_object is Field.value_from_object and attname.isidentifier() and \
+                not keyword.iskeyword(attname):
+            value = 'obj.%s' % attname
+        else:
+            bindings.append('f%d = fields[%d].field' % (index, index))
+            value = 'f%d.value_from_object(obj)' % index
+        if plugin is not None:
+            if value.startswith('obj.'):
+                bindings.append('f%d = fields[%d].field' % (index, index))
+            bindings.append('p%d = fields[%d].plugin' % (index, index))
+            value = 'p%d.serialize_field(f%d, obj) or %s' % (index, index, value)
+        return value
+
+    # statements computing the values of the compressed keys, and (key, value, condition) items of the result
+    statements = []
+    items = []
+    for bucket_index, (bucket, entries, is_group, is_prefix, is_postfix) in enumerate(plan._bucket_entries):
+        if compress_fields and not entries:
+            continue
+        compress = (is_group and compress_groups) or (is_prefix and compress_prefixes) or \
+            (is_postfix and compress_postfixes)
+        if not compress:
+            if entries or not compress_empty_groups:
+                items.append((bucket, '{%s}' % ', '.join(
+                    '%r: %s' % (key, get_value(index)) for index, key in entries), None))
+            continue
+        variable = 'b%d' % bucket_index
+        statements.append('%s = {}' % variable)
+        for index, key in entries:
+            statements.append('v%d = %s' % (index, get_value(index)))
+            statements.append('if v%d:' % index)
+            statements.append('    %s[%r] = v%d' % (variable, key, index))
+        items.append((bucket, variable, variable if compress_empty_groups else None))
+
+    for index, key in plan._root_entries:
+        if compress_fields:
+            statements.append('v%d = %s' % (index, get_value(index)))
+            items.append((key, 'v%d' % index, 'v%d' % index))
+        elif compress_empty_groups:
+            statements.append('v%d = %s' % (index, get_value(index)))
+            items.append((key, 'v%d' % index, 'v{0} or not isinstance(v{0}, dict)'.format(index)))
+        else:
+            items.append((key, get_value(index), None))
+
+    # the leading unconditional items go right into the dictionary literal
+    literal = []
+    for key, value, condition in items:
+        if condition is not None:
+            break
+        literal.append('%r: %s' % (key, value))
+    statements.append('result = {%s}' % ', '.join(literal))
+    for key, value, condition in items[len(literal):]:
+        if condition is None:
+            statements.append('result[%r] = %s' % (key, value))
+        else:
+            statements.append('if %s:' % condition)
+            statements.append('    result[%r] = %s' % (key, value))
+    statements.append('return result')
+
+    lines = ['def %s(fields):' % name]
+    lines.extend('    ' + binding for binding in OrderedDict.fromkeys(bindings))
+    lines.append('')
+    lines.append('    def serialize(%s):' % ('row' if values else 'obj'))
+    lines.extend('        ' + statement for statement in statements)
+    lines.append('')
+    lines.append('    return serialize')
+    return '\n'.join(lines) + '\n'
+
+
+def get_source(model, compression=DEFAULT_COMPRESSION, values=False, fields=None):
+    """
+    Returns the source of the serializer of a `ToDictMixin` model (see `generate_source`).
+
+    :param fields: projection, see `to_dict`
+    """
+    return generate_source(model._get_to_dict_plan(fields), compression, values)
+
+
+def get_serializer(plan, compression, values=False):
+    """
+    Returns the serializer function of a plan for the compression arguments, compiled once and cached on the plan.
+
+    Serializers of model instances accept an instance, serializers of `values` accept a `values_list()` row,
+    both return the same dictionary as `plan.build()` does.
+    """
+    key = (compression, values)
+    serializer = plan._serializers.get(key)
+    if serializer is None:
+        source = generate_source(plan, compression, values)
+        factory = _get_precompiled().get(_get_digest(source))
+        if factory is None:
+            namespace = {}
+            exec(compile(source, '<to_dict %s serializer>' % plan.model._meta.label, 'exec'), namespace)
+            factory = namespace[FACTORY_NAME]
+        serializer = plan._serializers[key] = factory(plan.fields)
+    return serializer
+
+
+def write_module(path, models=None, compressions=(DEFAULT_COMPRESSION,)):
+    """
+    Writes the serializers of models to a python module, to be loaded with `TO_DICT_CODEGEN_MODULE`
+    instead of being compiled on startup.
+
+    Serializers are looked up by their source, so a module which got out of date with the models
+    is never used for the changed serializers.
+
+    :param models: `ToDictMixin` models (all the installed ones by default)
+    :param compressions: compression arguments (see `generate_source`) to write serializers for
+    :return: the number of written serializers
+    """
+    from .mixins import ToDictMixin
+    if models is None:
+        models = [model for model in apps.get_models() if issubclass(model, ToDictMixin)]
+
+    sources = {}
+    for model in models:
+        plan = model._get_to_dict_plan()
+        for compression in compressions:
+            for values in (False, True) if not plan.plugin_fields else (False,):
+                source = generate_source(plan, compression, values)
+                sources.setdefault(_get_digest(source), (model, compression, values))
+
+    parts = ['"""Serializers generated by `django_model_to_dict.codegen`, do not edit"""\n']
+    for digest, (model, compression, values) in sorted(sources.items()):
+        parts.append('\n# %s, compression=%r%s' % (model._meta.label, compression, ', values' if values else ''))
+        parts.append(generate_source(model._get_to_dict_plan(), compression, values, name='make_' + digest))
+    parts.append('\nSERIALIZERS = {\n%s}\n' % ''.join(
+        "    '%s': make_%s,\n" % (digest, digest) for digest in sorted(sources)))
+    with open(path, 'w') as f:
+        f.write('\n'.join(parts))
+    return len(sources)
+
+
+def _get_digest(source):
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def _get_precompiled():
+    """Returns serializer factories of `TO_DICT_CODEGEN_MODULE`, by the digest of their source"""
+    global _precompiled
+    if _precompiled is None:
+        _precompiled = import_module(TO_DICT_CODEGEN_MODULE).SERIALIZERS if TO_DICT_CODEGEN_MODULE else {}
+    return _precompiled
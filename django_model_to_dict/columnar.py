@@ -0,0 +1,86 @@
+"""
+Columnar serialization of querysets for analytics exports.
+
+Instead of a list of nested dictionaries, `to_columns` returns a single list (or NumPy array) of values
+per output path, like `address.city`, following the same skipping, grouping and projection configuration
+as `to_dict`. The columns are built right out of `values_list()` rows, chunk by chunk, so no model instances
+and no per-object dictionaries are built (unless the model has serialization plugins).
+
+Values are never compressed, so every column holds a value for every object, in the same order.
+Related objects aren't inspected: foreign keys are emitted as their column values.
+"""
+from collections import OrderedDict
+from itertools import islice
+
+from .plan import parse_projection
+from .plugins.serialization import get_plugin_value
+from .querysets import _iter_instances, _iterator
+from .settings import TO_DICT_STREAMING_CHUNK_SIZE
+
+# NumPy dtypes of the columns of non-nullable fields, by internal field type; other columns hold python objects
+NUMPY_DTYPES = {
+    'AutoField': 'int64',
+    'BigAutoField': 'int64',
+    'BigIntegerField': 'int64',
+    'IntegerField': 'int64',
+    'PositiveIntegerField': 'int64',
+    'PositiveSmallIntegerField': 'int64',
+    'SmallIntegerField': 'int64',
+    'FloatField': 'float64',
+    'BooleanField': 'bool',
+}
+
+
+def to_columns(queryset, fields=None, numpy=False, separator='.', chunk_size=TO_DICT_STREAMING_CHUNK_SIZE):
+    """
+    Serializes a queryset of a `ToDictMixin` model into columns.
+
+    :param queryset: queryset of a `ToDictMixin` model
+    :param fields: projection (see `to_dict`), only the projected columns are fetched
+    :param numpy: return NumPy arrays instead of lists (NumPy is required then); non-nullable integer, float
+        and boolean fields get native dtypes (nullable float fields too, with `None` converted to NaN)
+    :param separator: separator of the keys of output paths
+    :param chunk_size: number of rows fetched and transposed at once
+
+    :return: ordered dictionary of output paths and their columns, in the order of `to_dict` output keys
+    """
+    if numpy:
+        import numpy
+
+    plan = queryset.model._get_to_dict_plan(parse_projection(fields) if fields is not None else None)
+    columns = [[] for _ in plan.fields]
+    if columns:
+        rows = _iter_rows(queryset, plan, chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            for column, values in zip(columns, zip(*chunk)):
+                column.extend(values)
+
+    result = OrderedDict()
+    for i, path in plan.get_paths(separator):
+        result[path] = _to_array(numpy, columns[i], plan.fields[i]) if numpy else columns[i]
+    return result
+
+
+def _iter_rows(queryset, plan, chunk_size):
+    if not plan.plugin_fields:
+        return _iterator(queryset.values_list(*plan.attnames), chunk_size)
+    # plugins serialize model instances
+    return (tuple(plugin and get_plugin_value(plugin, field, obj) or field.value_from_object(obj)
+                  for field, bucket, key, plugin in plan.fields)
+            for obj in _iter_instances(queryset, plan, False, chunk_size))
+
+
+def _to_array(numpy, values, plan_field):
+    field = plan_field.field
+    dtype = None
+    if not plan_field.plugin:
+        internal_type = (field.target_field if field.is_relation else field).get_internal_type()
+        dtype = NUMPY_DTYPES.get(internal_type)
+        if field.null and dtype != 'float64':
+            dtype = None
+    if dtype == 'float64':
+        values = [numpy.nan if value is None else value for value in values]
+    return numpy.array(values, dtype=dtype or object)
@@ -0,0 +1,370 @@
+"""
+Database-side JSON construction.
+
+The serialization plan of a `ToDictMixin` model is turned into a single SQL expression building the JSON payload
+of every row right in the database: groups, prefixes and postfixes become nested JSON objects, related objects
+become correlated subqueries (aggregated into JSON arrays for reverse and many-to-many relations), and compressed
+keys are removed by the database too. Python only passes the ready-made JSON text through:
+
+```
+payloads = iter_db_json(Customer.objects.filter(...))  # JSON text per customer
+response = HttpResponse(to_db_json(Customer.objects.all()), content_type='application/json')
+```
+
+or, with the output backends, `queryset.to_output('django_model_to_dict.output.DatabaseJSONBackend')`.
+
+SQLite (`json_object`, `json_group_array`, `json_patch`) and PostgreSQL (`jsonb_build_object`, `jsonb_agg`)
+are supported. Values are emitted in the database's own JSON representation, e.g. SQLite stores dates as text
+in the `YYYY-MM-DD HH:MM:SS` form rather than the ISO 8601 one of `DjangoJSONEncoder`, and reverse related objects
+are ordered by their primary keys.
+
+Whatever the database can't build falls back to serialization in python (see `django_model_to_dict.encoding`),
+namely:
+
+* unsupported database vendors
+* models with fields handled by serialization plugins (or binary fields), which can't be built by the database
+* models with a `_to_dict_pre_finish_hook` or a custom related fields strategy, among the nested models as well
+* `depth` greater than 1
+* nested objects of models with plugin fields, or of models which aren't `ToDictMixin` models
+* many-to-many relations with through fields (`TO_DICT_THROUGH_FIELDS`)
+"""
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Expression, TextField
+
+from .encoding import _iter_json
+from .plan import get_related_key, get_many_to_many_through, parse_projection, RELATED_MODE_PK, RELATED_MODE_SKIP
+from .querysets import _iterator
+from .settings import TO_DICT_DEPTH
+
+# compression of nested related objects, which are serialized with the default `to_dict` arguments
+NESTED_COMPRESSION = (True, True, True, True, False)
+
+# the name of the annotation the payloads are selected as
+ANNOTATION = '_to_dict_json'
+
+TEXT_TYPES = {
+    'CharField', 'TextField', 'SlugField', 'FileField', 'ImageField', 'FilePathField', 'GenericIPAddressField',
+    'IPAddressField', 'CommaSeparatedIntegerField',
+}
+NUMBER_TYPES = {
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveSmallIntegerField', 'PositiveBigIntegerField', 'FloatField', 'DecimalField',
+}
+BOOLEAN_TYPES = {'BooleanField', 'NullBooleanField'}
+PYTHON_TYPES = {'BinaryField'}
+
+
+def _literal(value):
+    """SQL string literal, escaped for the DB-API parameters style as well"""
+    return "'%s'" % value.replace("'", "''").replace('%', '%%')
+
+
+def _get_internal_type(field):
+    if field.is_relation:
+        field = field.target_field
+    return field.get_internal_type()
+
+
+def _needs_python(plan_field):
+    return plan_field.plugin is not None or _get_internal_type(plan_field.field) in PYTHON_TYPES
+
+
+class SQLiteDialect:
+    """JSON functions of SQLite (the JSON1 extension, built in since SQLite 3.38)"""
+
+    def value(self, field, column):
+        if _get_internal_type(field) in BOOLEAN_TYPES:
+            # booleans are stored as integers
+            return "CASE WHEN {0} IS NULL THEN NULL WHEN {0} THEN json('true') ELSE json('false') END".format(column)
+        return column
+
+    def object(self, items):
+        base = 'json_object(%s)' % ', '.join('%s, %s' % (_literal(key), value) for key, (value, _, _) in items.items())
+        conditional = [(key, item) for key, item in items.items() if item[1] is not None]
+        if not conditional:
+            return base
+        # null values of a merge patch remove the keys, objects (an empty one in particular) are merged into objects
+        patch = 'json_object(%s)' % ', '.join(
+            "%s, CASE WHEN %s THEN NULL ELSE %s END" % (_literal(key), condition, "json('{}')" if is_object else value)
+            for key, (value, condition, is_object) in conditional)
+        return 'json_patch(%s, %s)' % (base, patch)
+
+    def subquery(self, sql):
+        # a subquery result is plain text, not JSON
+        return 'json((%s))' % sql
+
+    def array(self, value, source, order_by, objects):
+        return "json((SELECT json_group_array(%s) FROM (SELECT %s AS value FROM %s ORDER BY %s)))" % (
+            'json(value)' if objects else 'value', value, source, order_by)
+
+    def text(self, sql):
+        return sql
+
+
+class PostgreSQLDialect:
+    """JSON functions of PostgreSQL (9.5+)"""
+
+    def value(self, field, column):
+        return column
+
+    def object(self, items):
+        base = 'jsonb_build_object(%s)' % ', '.join(
+            '%s, %s' % (_literal(key), value) for key, (value, _, _) in items.items())
+        conditional = [(key, item) for key, item in items.items() if item[1] is not None]
+        if not conditional:
+            return base
+        return '(%s - ARRAY_REMOVE(ARRAY[%s]::text[], NULL))' % (base, ', '.join(
+            'CASE WHEN %s THEN %s END' % (condition, _literal(key)) for key, (_, condition, _) in conditional))
+
+    def subquery(self, sql):
+        return '(%s)' % sql
+
+    def array(self, value, source, order_by, objects):
+        return "(SELECT COALESCE(jsonb_agg(%s ORDER BY %s), '[]'::jsonb) FROM %s)" % (value, order_by, source)
+
+    def text(self, sql):
+        return '(%s)::text' % sql
+
+
+DIALECTS = {
+    'sqlite': SQLiteDialect(),
+    'postgresql': PostgreSQLDialect(),
+}
+
+
+class ToDictJSON(Expression):
+    """
+    SQL expression building the JSON payload of a `ToDictMixin` model's row, the same as `to_dict` output
+    (see the module docs), as text:
+
+    ```
+    Customer.objects.annotate(payload=ToDictJSON(Customer, fields='name,orders'))
+    ```
+
+    The arguments are the same as for `to_dict`, `depth` is either 0 or 1.
+    Plugin (and binary) fields are left out, `iter_db_json` serializes such models in python instead.
+    """
+
+    def __init__(self, model, compress_fields=True, compress_groups=True, compress_prefixes=True,
+                 compress_postfixes=True, compress_empty_groups=False, inspect_related_objects=True, fields=None,
+                 depth=None, related_modes=None):
+        super(ToDictJSON, self).__init__(output_field=TextField())
+        if depth is None:
+            depth = getattr(model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+        if depth > 1:
+            raise ValueError('JSON is only built by the database one level of related objects deep')
+        self.model = model
+        self.plan = model._get_to_dict_plan(parse_projection(fields) if fields is not None else None)
+        self.compression = (compress_fields, compress_groups, compress_prefixes, compress_postfixes,
+                            compress_empty_groups)
+        self.depth = depth if inspect_related_objects else 0
+        self.related_modes = related_modes
+
+    def as_sql(self, compiler, connection):
+        if connection.vendor not in DIALECTS:
+            raise NotImplementedError('JSON is not built by %s databases' % connection.vendor)
+        builder = _Builder(DIALECTS[connection.vendor], compiler.quote_name_unless_alias)
+        sql = builder.build_object(self.plan, compiler.query.get_initial_alias(), self.compression, self.depth,
+                                   self.related_modes)
+        return builder.dialect.text(sql), []
+
+
+class _Builder:
+    """Builds the SQL of JSON objects out of serialization plans, see `ToDictJSON`"""
+
+    def __init__(self, dialect, quote_name):
+        self.dialect = dialect
+        self.quote_name = quote_name
+        self.aliases = 0
+
+    def get_alias(self):
+        self.aliases += 1
+        return 'to_dict_%d' % self.aliases
+
+    def column(self, alias, column):
+        return '%s.%s' % (self.quote_name(alias), self.quote_name(column))
+
+    def table(self, model, alias):
+        return '%s %s' % (self.quote_name(model._meta.db_table), self.quote_name(alias))
+
+    def is_falsy(self, field, column):
+        internal_type = _get_internal_type(field)
+        if internal_type in TEXT_TYPES:
+            return "(%s IS NULL OR %s = '')" % (column, column)
+        if internal_type in NUMBER_TYPES:
+            return '(%s IS NULL OR %s = 0)' % (column, column)
+        if internal_type in BOOLEAN_TYPES:
+            return '(%s IS NULL OR NOT %s)' % (column, column)
+        return '%s IS NULL' % column
+
+    def build_object(self, plan, alias, compression, depth, related_modes):
+        """Returns the SQL of the JSON object of a row of the table under `alias`"""
+        compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups = compression
+        # key: (value, condition of the key's removal or `None`, whether the value is a JSON object)
+        items = OrderedDict()
+
+        for bucket, entries, is_group, is_prefix, is_postfix in plan._bucket_entries:
+            if compress_fields and not entries:
+                continue
+            compress = (is_group and compress_groups) or (is_prefix and compress_prefixes) or \
+                (is_postfix and compress_postfixes)
+            bucket_items = OrderedDict()
+            for index, key in entries:
+                if _needs_python(plan.fields[index]):
+                    continue
+                field = plan.fields[index].field
+                column = self.column(alias, field.column)
+                bucket_items[key] = (self.dialect.value(field, column),
+                                     self.is_falsy(field, column) if compress else None, False)
+            condition = None
+            if compress and compress_empty_groups:
+                condition = ' AND '.join(condition for _, condition, _ in bucket_items.values()) or '1 = 1'
+            items[bucket] = (self.dialect.object(bucket_items), condition, True)
+
+        for index, key in plan._root_entries:
+            if _needs_python(plan.fields[index]):
+                continue
+            field = plan.fields[index].field
+            column = self.column(alias, field.column)
+            items[key] = (self.dialect.value(field, column),
+                          self.is_falsy(field, column) if compress_fields else None, False)
+
+        if depth > 0:
+            for rf in plan.related_fields:
+                key = get_related_key(rf)
+                if key is None:
+                    continue
+                mode = plan.get_related_mode(rf, related_modes)
+                if mode == RELATED_MODE_SKIP:
+                    items.pop(key, None)
+                    continue
+                projection = plan.projection and plan.projection[key] or None
+                related_plan = rf.related_model._get_to_dict_plan(projection) if mode != RELATED_MODE_PK else None
+                self.add_related_items(items, rf, key, related_plan, alias)
+
+        return self.dialect.object(items)
+
+    def add_related_items(self, items, rf, key, related_plan, alias):
+        """Puts the objects of a related field into the items, see `_default_related_fields_strategy`"""
+        related_model = rf.related_model
+        related_alias = self.get_alias()
+        related_pk = self.column(related_alias, related_model._meta.pk.column)
+        if related_plan is not None:
+            value = self.build_object(related_plan, related_alias, NESTED_COMPRESSION, 0, None)
+        else:
+            value = related_pk
+
+        if rf.one_to_many:
+            source = '%s WHERE %s = %s' % (
+                self.table(related_model, related_alias), self.column(related_alias, rf.field.column),
+                self.column(alias, rf.field.target_field.column))
+            items[key] = (self.dialect.array(value, source, related_pk, related_plan is not None), None, False)
+
+        if rf.many_to_one or rf.one_to_one:
+            if rf.concrete:
+                column = self.column(alias, rf.column)
+                if related_plan is None:
+                    # the primary key is the value of the foreign key column, which is there already unless skipped
+                    if key not in items:
+                        items[key] = (column, '%s IS NULL' % column, False)
+                    return
+                subquery = self.dialect.subquery('SELECT %s FROM %s WHERE %s = %s' % (
+                    value, self.table(related_model, related_alias),
+                    self.column(related_alias, rf.target_field.column), column))
+                condition = items[key][1] if key in items else '%s IS NULL' % column
+                items[key] = (subquery, condition, True)
+            else:
+                source = '%s WHERE %s = %s' % (
+                    self.table(related_model, related_alias), self.column(related_alias, rf.field.column),
+                    self.column(alias, rf.field.target_field.column))
+                items[key] = (self.dialect.subquery('SELECT %s FROM %s' % (value, source)),
+                              'NOT EXISTS (SELECT 1 FROM %s)' % source, related_plan is not None)
+
+        if rf.many_to_many:
+            through, source_name, target_name = get_many_to_many_through(rf)
+            source_field = through._meta.get_field(source_name)
+            target_field = through._meta.get_field(target_name)
+            through_alias = self.get_alias()
+            through_column = self.column(through_alias, target_field.column)
+            source = self.table(through, through_alias)
+            if related_plan is None:
+                value = through_column
+            else:
+                source = '%s INNER JOIN %s ON %s = %s' % (
+                    source, self.table(related_model, related_alias),
+                    self.column(related_alias, target_field.target_field.column), through_column)
+            source += ' WHERE %s = %s' % (self.column(through_alias, source_field.column),
+                                          self.column(alias, source_field.target_field.column))
+            order_by = self.column(through_alias, through._meta.pk.column)
+            items[key] = (self.dialect.array(value, source, order_by, related_plan is not None), None, False)
+
+
+def can_build_in_database(queryset, plan, inspect_related_objects=True, depth=1, related_modes=None):
+    """Whether the JSON of a queryset is built by the database, see the module docs"""
+    model = queryset.model
+    if connections[queryset.db].vendor not in DIALECTS or hasattr(model, '_to_dict_pre_finish_hook'):
+        return False
+    if any(_needs_python(f) for f in plan.fields):
+        return False
+    if not inspect_related_objects:
+        return True
+    if depth > 1 or hasattr(model, '_to_dict_related_fields_strategy'):
+        return False
+    for rf in plan.related_fields:
+        key = get_related_key(rf)
+        if key is None:
+            continue
+        mode = plan.get_related_mode(rf, related_modes)
+        if rf.many_to_many and mode != RELATED_MODE_SKIP and plan.through_fields.get(key):
+            return False
+        if mode == RELATED_MODE_PK or mode == RELATED_MODE_SKIP:
+            continue
+        related_model = rf.related_model
+        if not hasattr(related_model, '_get_to_dict_plan') or hasattr(related_model, '_to_dict_pre_finish_hook'):
+            return False
+        related_plan = related_model._get_to_dict_plan(plan.projection and plan.projection[key] or None)
+        if any(_needs_python(f) for f in related_plan.fields):
+            return False
+    return True
+
+
+def iter_db_json(queryset, compress_fields=True, compress_groups=True, compress_prefixes=True,
+                 compress_postfixes=True, compress_empty_groups=False, inspect_related_objects=True,
+                 compress_empty_related_objects=False, chunk_size=None, fields=None, depth=None,
+                 repeated_objects=None, related_modes=None):
+    """
+    Yields the JSON (text) of every object of a queryset, built by the database whenever possible
+    (see the module docs). Accepts the same arguments as `to_dicts`.
+    """
+    model = queryset.model
+    if fields is not None:
+        fields = parse_projection(fields)
+    plan = model._get_to_dict_plan(fields)
+    compression = (compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups)
+    if depth is None:
+        depth = getattr(model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+    inspect_related_objects = inspect_related_objects and depth > 0
+
+    if not can_build_in_database(queryset, plan, inspect_related_objects, depth, related_modes):
+        for payload in _iter_json(queryset, *compression, inspect_related_objects=inspect_related_objects,
+                                  compress_empty_related_objects=compress_empty_related_objects,
+                                  chunk_size=chunk_size, fields=fields, depth=depth,
+                                  repeated_objects=repeated_objects, related_modes=related_modes):
+            yield payload
+        return
+
+    queryset = queryset.annotate(**{ANNOTATION: ToDictJSON(
+        model, *compression, inspect_related_objects=inspect_related_objects, fields=fields, depth=depth,
+        related_modes=related_modes)})
+    for payload in _iterator(queryset.values_list(ANNOTATION, flat=True), chunk_size):
+        yield payload
+
+
+def to_db_json(queryset, **kwargs):
+    """
+    Returns the JSON array of the objects of a queryset as bytes, built by the database whenever possible
+    (see `iter_db_json`).
+    """
+    return ('[' + ','.join(iter_db_json(queryset, **kwargs)) + ']').encode('utf-8')
@@ -0,0 +1,193 @@
+"""
+Incremental serialization for change feeds.
+
+A `ChangeTracker` keeps the last serialized form of every tracked object (flattened into output paths,
+like `address.city`) and returns only the paths changed since then:
+
+```
+tracker = ChangeTracker(compress_empty_groups=True)
+tracker.connect(Order, lambda instance, delta: push(instance.pk, delta._asdict()))
+```
+
+Paths are root-level keys and keys inside groups, prefixes and postfixes; related objects are compared
+as a whole, under their root-level keys. Paths of compressed (empty) values are reported as removed.
+
+Objects saved with `update_fields` go through a fast path: only the updated fields are read and compared,
+with no `to_dict()` call at all, unless the object is serialized with a `_to_dict_pre_finish_hook`,
+a custom related fields strategy, or one of the updated fields is an inspected relation.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.db.models.signals import post_delete, post_save
+
+from .cache import LRUCacheBackend
+from .encoding import encode_value
+from .plan import get_related_key, RELATED_MODE_SKIP
+from .settings import TO_DICT_DEPTH
+
+
+class Delta(namedtuple('Delta', ('changed', 'removed'))):
+    """
+    Changes of a serialized object: `changed` maps the changed (or new) paths to their values,
+    `removed` lists the paths which are no longer present. An empty delta is falsy.
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return bool(self.changed or self.removed)
+
+
+_missing = object()
+
+
+class ChangeTracker:
+    """
+    Keeps the last serialized form of objects and returns their changes, see the module docs.
+
+    :param backend: `django_model_to_dict.cache` backend storing the serialized forms
+        (an in-process `LRUCacheBackend` by default)
+    :param hashes: store a hash per path instead of the value itself
+    :param separator: separator of the keys of output paths
+    :param prefix: prefix of the backend keys, for trackers sharing a backend
+    :param to_dict_kwargs: `to_dict` arguments
+    """
+
+    def __init__(self, backend=None, hashes=False, separator='.', prefix='to_dict:delta', **to_dict_kwargs):
+        self.backend = backend if backend is not None else LRUCacheBackend(max_size=10000)
+        self.hashes = hashes
+        self.separator = separator
+        self.prefix = prefix
+        self.to_dict_kwargs = to_dict_kwargs
+        self._receivers = {}
+
+    def delta(self, instance, update_fields=None):
+        """
+        Returns the changes of the instance since its last call (every path is new for the first call).
+
+        :param update_fields: names of the only fields changed since the last call, if known (see `post_save`)
+        :return: `Delta`
+        """
+        key = self._get_key(instance)
+        snapshot = self.backend.get(key)
+        changes = None
+        if snapshot is not None and update_fields is not None:
+            changes = self._get_updated_paths(instance, update_fields)
+        if changes is None:
+            result = instance.to_dict(**self.to_dict_kwargs)
+            changes = self._flatten(result, instance._get_to_dict_plan(self.to_dict_kwargs.get('fields')))
+            if snapshot is not None:
+                # the paths missing from the full output have been removed
+                changes.update((path, _missing) for path in snapshot if path not in changes)
+
+        snapshot = dict(snapshot or {})
+        changed, removed = {}, []
+        for path, value in changes.items():
+            if value is _missing:
+                if snapshot.pop(path, _missing) is not _missing:
+                    removed.append(path)
+                continue
+            stored = self._hash(value) if self.hashes else value
+            if snapshot.get(path, _missing) != stored:
+                snapshot[path] = stored
+                changed[path] = value
+
+        if changed or removed or update_fields is None:
+            self.backend.set(key, snapshot)
+        return Delta(changed, removed)
+
+    def forget(self, instance):
+        """Removes the stored serialized form of the instance"""
+        self.backend.delete_many([self._get_key(instance)])
+
+    def connect(self, model, callback):
+        """
+        Calls `callback(instance, delta)` whenever an object of the model is saved with its output changed.
+        Deleted objects are forgotten.
+        """
+        def on_save(sender, instance, update_fields=None, **kwargs):
+            delta = self.delta(instance, update_fields)
+            if delta:
+                callback(instance, delta)
+
+        def on_delete(sender, instance, **kwargs):
+            self.forget(instance)
+
+        self.disconnect(model)
+        self._receivers[model] = (on_save, on_delete)
+        post_save.connect(on_save, sender=model, weak=False)
+        post_delete.connect(on_delete, sender=model, weak=False)
+
+    def disconnect(self, model):
+        """Stops tracking the objects of the model saved and deleted, see `connect`"""
+        receivers = self._receivers.pop(model, None)
+        if receivers is not None:
+            post_save.disconnect(receivers[0], sender=model)
+            post_delete.disconnect(receivers[1], sender=model)
+
+    def _get_key(self, instance):
+        return '%s:%s:%s' % (self.prefix, instance._meta.label_lower, instance.pk)
+
+    def _hash(self, value):
+        return hashlib.sha1(encode_value(value).encode('utf-8')).hexdigest()
+
+    def _flatten(self, result, plan):
+        """Maps the output paths of a `to_dict` result to their values"""
+        paths = {}
+        for key, value in result.items():
+            if key in plan.buckets and isinstance(value, dict):
+                for bucket_key, bucket_value in value.items():
+                    paths[key + self.separator + bucket_key] = bucket_value
+            else:
+                paths[key] = value
+        return paths
+
+    def _get_updated_paths(self, instance, update_fields):
+        """
+        Returns the output paths of the updated fields, mapped to their values (or to `_missing` when compressed),
+        or `None` if the whole object has to be serialized.
+        """
+        model = type(instance)
+        kwargs = self.to_dict_kwargs
+        if hasattr(model, '_to_dict_pre_finish_hook'):
+            return None
+        plan = instance._get_to_dict_plan(kwargs.get('fields'))
+        depth = kwargs.get('depth')
+        if depth is None:
+            depth = getattr(model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+        # keys of skipped relations, never present in the output (even for foreign keys)
+        skipped = set()
+        if kwargs.get('inspect_related_objects', True) and depth > 0:
+            if hasattr(model, '_to_dict_related_fields_strategy'):
+                return None
+            related_modes = kwargs.get('related_modes')
+            for rf in plan.related_fields:
+                if not rf.concrete or (rf.name not in update_fields and rf.attname not in update_fields):
+                    continue
+                if plan.get_related_mode(rf, related_modes) != RELATED_MODE_SKIP:
+                    return None
+                skipped.add(get_related_key(rf))
+
+        compress_fields = kwargs.get('compress_fields', True)
+        compress_empty_groups = kwargs.get('compress_empty_groups', False)
+        compress_buckets = {}
+        for bucket in plan.buckets:
+            compress_buckets[bucket] = (bucket in plan.groups and kwargs.get('compress_groups', True)) or \
+                (bucket in plan.prefixes and kwargs.get('compress_prefixes', True)) or \
+                (bucket in plan.postfixes and kwargs.get('compress_postfixes', True))
+
+        paths = {}
+        for field, bucket, key, plugin in plan.fields:
+            if field.name not in update_fields and field.attname not in update_fields:
+                continue
+            if bucket is None and key in skipped:
+                continue
+            value = plugin and plugin.serialize_field(field, instance) or field.value_from_object(instance)
+            if bucket is None:
+                compressed = (compress_fields and not value) or \
+                    (compress_empty_groups and isinstance(value, dict) and not value)
+                paths[key] = _missing if compressed else value
+            else:
+                compressed = compress_buckets[bucket] and not value
+                paths[bucket + self.separator + key] = _missing if compressed else value
+        return paths
@@ -0,0 +1,314 @@
+"""
+Direct JSON encoding of `to_dict` output.
+
+Encoding `to_dict` output with `json.dumps(result, cls=DjangoJSONEncoder)` walks the whole structure a second
+time and calls the encoder's `default()` for every datetime, Decimal and UUID value. Instead, `to_json_bytes`
+and `to_json_lines` write JSON right out of the compiled serialization plan: every field gets an encoder
+chosen once per field class (strings, integers, booleans, decimals, dates...), and keys are encoded once per plan.
+With the bulk values path (see `querysets.to_dicts`), neither model instances nor dictionaries are built at all.
+
+Related objects, serialization plugin output and values of unknown types are encoded with the generic
+encoder: orjson when it is installed, the standard `json` module otherwise. Either way, the output
+is the same as the output of `DjangoJSONEncoder`, only without whitespace and with non-ASCII characters kept.
+"""
+import datetime
+import decimal
+import json
+import math
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import cache
+from .plan import parse_projection
+from .plugins.serialization import get_plugin_value
+from .querysets import _can_serialize_values, _get_loaded_fields, _iter_instances, _iterator, _with_identity_maps
+from .settings import TO_DICT_DEPTH, TO_DICT_REPEATED_OBJECTS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_django_default = DjangoJSONEncoder().default
+_encode_string = json.encoder.encode_basestring
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def encode_value(value):
+        """Encodes any `to_dict` output value into JSON text"""
+        return orjson.dumps(value, default=_django_default, option=_ORJSON_OPTIONS).decode('utf-8')
+else:
+    encode_value = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+
+def _encode_float(value):
+    if type(value) is float and math.isfinite(value):
+        return float.__repr__(value)
+    return encode_value(value)
+
+
+def _encode_boolean(value):
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return encode_value(value)
+
+
+def _encode_decimal(value):
+    return '"' + decimal.Decimal.__str__(value) + '"'
+
+
+def _encode_uuid(value):
+    if type(value) is uuid.UUID:
+        return '"' + str(value) + '"'
+    return encode_value(value)
+
+
+def _encode_temporal(value):
+    # the same formatting as `DjangoJSONEncoder`'s
+    if isinstance(value, (datetime.date, datetime.time)):
+        return _encode_string(_django_default(value))
+    return encode_value(value)
+
+
+# encoders of field values by internal field type, values of other fields are encoded with `encode_value`;
+# model fields may be assigned values of other types until they are reloaded, so the encoders either
+# fall back to `encode_value` or raise `TypeError` for them (see `JSONPlan.encode_values`);
+# `int.__repr__` is the fastest way to encode integers, but booleans are encoded with it as integers too
+FIELD_ENCODERS = {
+    'AutoField': int.__repr__,
+    'BigAutoField': int.__repr__,
+    'BigIntegerField': int.__repr__,
+    'IntegerField': int.__repr__,
+    'PositiveIntegerField': int.__repr__,
+    'PositiveSmallIntegerField': int.__repr__,
+    'SmallIntegerField': int.__repr__,
+    'FloatField': _encode_float,
+    'BooleanField': _encode_boolean,
+    'NullBooleanField': _encode_boolean,
+    'CharField': _encode_string,
+    'TextField': _encode_string,
+    'SlugField': _encode_string,
+    'EmailField': _encode_string,
+    'URLField': _encode_string,
+    'DecimalField': _encode_decimal,
+    'UUIDField': _encode_uuid,
+    'DateTimeField': _encode_temporal,
+    'DateField': _encode_temporal,
+    'TimeField': _encode_temporal,
+}
+
+_field_class_encoders = {}
+
+
+def get_field_encoder(field):
+    """Returns the encoder of (non-None) field values, resolved once per field class"""
+    if field.is_relation:
+        # foreign keys hold values of their target fields
+        return get_field_encoder(field.target_field)
+    field_class = type(field)
+    encoder = _field_class_encoders.get(field_class)
+    if encoder is None:
+        encoder = _field_class_encoders[field_class] = FIELD_ENCODERS.get(field.get_internal_type(), encode_value)
+    return encoder
+
+
+class _Encoded(str):
+    """Already encoded JSON value in a result dictionary"""
+
+
+class JSONPlan:
+    """
+    Field encoders and encoded keys of a `ToDictPlan`.
+
+    Use `get_json_plan()` to get the (cached) JSON plan of a serialization plan.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.encoders = tuple(encode_value if f.plugin else get_field_encoder(f.field) for f in plan.fields)
+        self._keys = {}
+        self._root_entries = tuple((i, self.encode_key(key)) for i, key in plan._root_entries)
+        self._bucket_entries = tuple(
+            (self.encode_key(bucket), tuple((i, self.encode_key(key)) for i, key in entries),
+             is_group, is_prefix, is_postfix)
+            for bucket, entries, is_group, is_prefix, is_postfix in plan._bucket_entries)
+
+    def encode_key(self, key):
+        """Returns JSON text of a key, followed by a colon"""
+        encoded = self._keys.get(key)
+        if encoded is None:
+            encoded = self._keys[key] = _encode_string(key) + ':'
+        return encoded
+
+    def encode_values(self, values):
+        """Encodes field values, ordered as the fields of the plan"""
+        try:
+            return ['null' if value is None else encoder(value) for encoder, value in zip(self.encoders, values)]
+        except TypeError:
+            return [encode_value(value) for value in values]
+
+    def encode(self, values, compress_fields=True, compress_groups=True, compress_prefixes=True,
+               compress_postfixes=True, compress_empty_groups=False):
+        """The same as `ToDictPlan.build`, but returns JSON text"""
+        encoded = self.encode_values(values)
+        parts = []
+        for bucket, entries, is_group, is_prefix, is_postfix in self._bucket_entries:
+            if compress_fields and not entries:
+                continue
+            compress = (is_group and compress_groups) or (is_prefix and compress_prefixes) or \
+                (is_postfix and compress_postfixes)
+            bucket_parts = [key + encoded[index] for index, key in entries if values[index] or not compress]
+            if bucket_parts or not compress_empty_groups:
+                parts.append(bucket + '{' + ','.join(bucket_parts) + '}')
+
+        for index, key in self._root_entries:
+            value = values[index]
+            if compress_fields and not value:
+                continue
+            if compress_empty_groups and isinstance(value, dict) and not value:
+                continue
+            parts.append(key + encoded[index])
+        return '{' + ','.join(parts) + '}'
+
+    def build(self, values, compress_fields=True, compress_groups=True, compress_prefixes=True,
+              compress_postfixes=True, compress_empty_groups=False):
+        """
+        The same as `ToDictPlan.build`, but every root-level value (or bucket) of the result is already encoded,
+        so related objects may be added to the result before it's encoded with `join()`.
+        """
+        encoded = self.encode_values(values)
+        result = {}
+        for bucket, (_, entries, is_group, is_prefix, is_postfix) in zip(self.plan.buckets, self._bucket_entries):
+            if compress_fields and not entries:
+                continue
+            compress = (is_group and compress_groups) or (is_prefix and compress_prefixes) or \
+                (is_postfix and compress_postfixes)
+            bucket_parts = [key + encoded[index] for index, key in entries if values[index] or not compress]
+            if bucket_parts or not compress_empty_groups:
+                result[bucket] = _Encoded('{' + ','.join(bucket_parts) + '}')
+
+        for index, key in self.plan._root_entries:
+            value = values[index]
+            if compress_fields and not value:
+                continue
+            if compress_empty_groups and isinstance(value, dict) and not value:
+                continue
+            result[key] = _Encoded(encoded[index])
+        return result
+
+    def join(self, result):
+        """Returns JSON text of a `build()` result"""
+        return '{' + ','.join(
+            self.encode_key(key) + (value if isinstance(value, _Encoded) else encode_value(value))
+            for key, value in result.items()) + '}'
+
+
+def get_json_plan(plan):
+    """Returns the JSON plan of a `ToDictPlan`, built once per plan"""
+    json_plan = plan.__dict__.get('_json_plan')
+    # projected plans are copies of their base plan
+    if json_plan is None or json_plan.plan is not plan:
+        json_plan = plan._json_plan = JSONPlan(plan)
+    return json_plan
+
+
+def to_json_bytes(instance, compress_fields=True, compress_groups=True, compress_prefixes=True,
+                  compress_postfixes=True, compress_empty_groups=False, inspect_related_objects=True,
+                  compress_empty_related_objects=False, fields=None, depth=None, repeated_objects=None,
+                  related_modes=None, identity_map=None):
+    """
+    Serializes an instance of a `ToDictMixin` model into JSON bytes, accepting the same arguments as `to_dict`.
+
+    Models with a custom related fields strategy, a `_to_dict_pre_finish_hook` or output caching
+    work with the resulting dictionary, so their `to_dict` output is encoded as a whole.
+    """
+    return _to_json(instance, compress_fields, compress_groups, compress_prefixes, compress_postfixes,
+                    compress_empty_groups, inspect_related_objects, compress_empty_related_objects, fields, depth,
+                    repeated_objects, related_modes, identity_map).encode('utf-8')
+
+
+def to_json_lines(queryset, compress_fields=True, compress_groups=True, compress_prefixes=True,
+                  compress_postfixes=True, compress_empty_groups=False, inspect_related_objects=True,
+                  compress_empty_related_objects=False, chunk_size=None, fields=None, depth=None,
+                  repeated_objects=None, related_modes=None):
+    """
+    Serializes a queryset of a `ToDictMixin` model into JSON Lines, accepting the same arguments as `to_dicts`.
+
+    :return: JSON bytes, one serialized object per line (every line is terminated with a newline)
+    """
+    return ''.join(line + '\n' for line in _iter_json(
+        queryset, compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups,
+        inspect_related_objects, compress_empty_related_objects, chunk_size, fields, depth, repeated_objects,
+        related_modes)).encode('utf-8')
+
+
+def iter_json(queryset, **kwargs):
+    """The same as `querysets.iter_dicts`, but yields JSON bytes instead of dictionaries"""
+    for line in _iter_json(queryset, **kwargs):
+        yield line.encode('utf-8')
+
+
+def _to_json(instance, compress_fields, compress_groups, compress_prefixes, compress_postfixes,
+             compress_empty_groups, inspect_related_objects, compress_empty_related_objects, fields, depth,
+             repeated_objects, related_modes, identity_map):
+    model = type(instance)
+    if hasattr(model, '_to_dict_related_fields_strategy') or hasattr(model, '_to_dict_pre_finish_hook') or \
+            cache.get_backend(instance) is not None:
+        return encode_value(instance.to_dict(
+            compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups,
+            inspect_related_objects, compress_empty_related_objects, fields=fields, depth=depth,
+            repeated_objects=repeated_objects, related_modes=related_modes, identity_map=identity_map))
+
+    plan = instance._get_to_dict_plan(fields)
+    json_plan = get_json_plan(plan)
+    if depth is None:
+        depth = getattr(model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+    if repeated_objects is None:
+        repeated_objects = getattr(model, 'TO_DICT_REPEATED_OBJECTS', TO_DICT_REPEATED_OBJECTS)
+
+    values = [plugin and get_plugin_value(plugin, field, instance) or field.value_from_object(instance)
+              for field, bucket, key, plugin in plan.fields]
+    compression = (compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups)
+    if not (inspect_related_objects and depth > 0):
+        return json_plan.encode(values, *compression)
+
+    # related objects are added (and keys of skipped relations removed) by the default strategy as usual
+    result = json_plan.build(values, *compression)
+    instance._default_related_fields_strategy(result, plan, depth, repeated_objects, identity_map, (),
+                                              related_modes)
+    return json_plan.join(result)
+
+
+def _iter_json(queryset, compress_fields=True, compress_groups=True, compress_prefixes=True,
+               compress_postfixes=True, compress_empty_groups=False, inspect_related_objects=True,
+               compress_empty_related_objects=False, chunk_size=None, fields=None, depth=None,
+               repeated_objects=None, related_modes=None):
+    model = queryset.model
+    if fields is not None:
+        fields = parse_projection(fields)
+    plan = model._get_to_dict_plan(fields)
+    compression = (compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups)
+    if depth is None:
+        depth = getattr(model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+    if repeated_objects is None:
+        repeated_objects = getattr(model, 'TO_DICT_REPEATED_OBJECTS', TO_DICT_REPEATED_OBJECTS)
+    inspect_related_objects = inspect_related_objects and depth > 0
+
+    if not _can_serialize_values(model, plan, inspect_related_objects, related_modes):
+        if fields is not None:
+            queryset = queryset.only(*_get_loaded_fields(model, plan, inspect_related_objects))
+        instances = _iter_instances(queryset, plan, inspect_related_objects, chunk_size, depth, related_modes)
+        for obj, identity_map in _with_identity_maps(instances, repeated_objects, chunk_size):
+            yield _to_json(obj, compress_fields, compress_groups, compress_prefixes, compress_postfixes,
+                           compress_empty_groups, inspect_related_objects, compress_empty_related_objects, fields,
+                           depth, repeated_objects, related_modes, identity_map)
+        return
+
+    json_plan = get_json_plan(plan)
+    rows = queryset.values_list(*plan.attnames) if plan.attnames else queryset.values_list('pk')
+    for row in _iterator(rows, chunk_size):
+        yield json_plan.encode(row, *compression)
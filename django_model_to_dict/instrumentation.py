@@ -0,0 +1,207 @@
+"""
+Instrumentation of `to_dict` serialization.
+
+Within an `instrument()` block, every `to_dict` call (and every `to_dicts` row) of the current thread records:
+
+* `objects`: the number of serialized objects
+* `phases`: time spent in field extraction (`fields`), serialization plugins (`plugins`), building the compressed
+  result (`compression`), related objects expansion (`related`, including the nested objects) and
+  `_to_dict_pre_finish_hook` (`pre_finish_hook`)
+* `plugins`: time spent in every serialization plugin, by plugin class name
+* `relations`: calls, queries and time spent on every relation, by `'<app_label>.<Model>.<related key>'`
+* `queries` and `time`: the total number of queries and time spent within the block
+
+```
+with instrument() as stats:
+    data = to_dicts(Order.objects.all())
+logger.info('to_dicts stats: %s', stats.as_dict())
+```
+
+The collected stats are also sent with the `to_dict_instrumented` signal when the block exits, and passed to
+`callback`, if any. With `sample_rate`, only a random share of the blocks is instrumented (`stats` is `None`
+for the others), so instrumentation may stay on in production. When no block is active, the overhead
+of `to_dict` is a single check of a module-level counter.
+
+Queries are counted with `connection.execute_wrapper()` (Django 2.0+), or with the debug cursor
+on older Django versions.
+"""
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import connections
+from django.dispatch import Signal
+
+from .plugins.serialization import get_plugin_value
+
+# sent when an `instrument()` block exits, with the collected `stats`
+to_dict_instrumented = Signal()
+
+# the number of `instrument()` blocks active in all the threads
+active = 0
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class RelationStats:
+    """Calls, queries and time spent on a relation by the default related fields strategy"""
+    __slots__ = ('calls', 'queries', 'time')
+
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+        self.time = 0.0
+
+    def as_dict(self):
+        return {'calls': self.calls, 'queries': self.queries, 'time': self.time}
+
+
+class Stats:
+    """Statistics collected within an `instrument()` block"""
+
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self.objects = 0
+        self.queries = 0
+        self.time = 0.0
+        self.phases = defaultdict(float)
+        self.plugins = defaultdict(float)
+        self.relations = defaultdict(RelationStats)
+        self._query_counter = None
+
+    def extract_values(self, instance, plan):
+        """The same as the field values extraction of `to_dict`, timing every serialization plugin"""
+        clock = self.clock
+        started = clock()
+        plugins_time = 0.0
+        values = []
+        for field, bucket, key, plugin in plan.fields:
+            if plugin is None:
+                values.append(field.value_from_object(instance))
+                continue
+            plugin_started = clock()
+            value = get_plugin_value(plugin, field, instance)
+            elapsed = clock() - plugin_started
+            self.plugins[plugin.__name__] += elapsed
+            plugins_time += elapsed
+            values.append(value or field.value_from_object(instance))
+        self.phases['fields'] += clock() - started - plugins_time
+        if plan.plugin_fields:
+            self.phases['plugins'] += plugins_time
+        return values
+
+    def add_phase(self, phase, started):
+        """Adds the time elapsed since `started` (see `clock`) to a phase"""
+        self.phases[phase] += self.clock() - started
+
+    def measure_relation(self, relation, func, *args):
+        """Calls `func`, recording the queries and time it takes to a relation"""
+        relation_stats = self.relations[relation]
+        queries = self._query_counter.count
+        started = self.clock()
+        try:
+            return func(*args)
+        finally:
+            relation_stats.time += self.clock() - started
+            relation_stats.queries += self._query_counter.count - queries
+            relation_stats.calls += 1
+
+    def as_dict(self):
+        """Returns the statistics as a plain dictionary, e.g. for logging"""
+        return {
+            'objects': self.objects,
+            'queries': self.queries,
+            'time': self.time,
+            'phases': dict(self.phases),
+            'plugins': dict(self.plugins),
+            'relations': {relation: stats.as_dict() for relation, stats in self.relations.items()},
+        }
+
+
+def get_stats():
+    """Returns the stats collected by the `instrument()` block active in the current thread, or `None`"""
+    return getattr(_local, 'stats', None)
+
+
+@contextmanager
+def instrument(sample_rate=1.0, callback=None):
+    """
+    Collects `to_dict` statistics of the current thread within the block, see the module docs.
+
+    :param sample_rate: share of the blocks to instrument, from 0 to 1
+    :param callback: function called with the collected stats when the block exits
+
+    :return: context manager (or decorator) yielding `Stats`, or `None` when the block isn't sampled
+    """
+    if sample_rate < 1 and random.random() >= sample_rate:
+        yield None
+        return
+
+    global active
+    stats = Stats()
+    outer_stats = get_stats()
+    _local.stats = stats
+    with _lock:
+        active += 1
+    started = stats.clock()
+    try:
+        with _QueryCounter() as stats._query_counter:
+            yield stats
+    finally:
+        stats.time = stats.clock() - started
+        stats.queries = stats._query_counter.count
+        _local.stats = outer_stats
+        with _lock:
+            active -= 1
+
+    if callback is not None:
+        callback(stats)
+    to_dict_instrumented.send(sender=None, stats=stats)
+
+
+class _QueryCounter:
+    """Counts queries run within the block by the current thread, over all the database connections"""
+
+    def __init__(self):
+        self.connections = connections.all()
+        self._count = 0
+        self._wrappers = []
+        self._initial = None
+
+    @property
+    def count(self):
+        if self._initial is None:
+            return self._count
+        # the debug cursor logs a limited number of queries, so the count is only precise up to `queries_log.maxlen`
+        return sum(len(connection.queries_log) for connection in self.connections) - self._initial
+
+    def __enter__(self):
+        if all(hasattr(connection, 'execute_wrapper') for connection in self.connections):
+            for connection in self.connections:
+                wrapper = connection.execute_wrapper(self._count_query)
+                wrapper.__enter__()
+                self._wrappers.append(wrapper)
+        else:
+            self._force_debug_cursor = [connection.force_debug_cursor for connection in self.connections]
+            for connection in self.connections:
+                connection.force_debug_cursor = True
+            self._initial = sum(len(connection.queries_log) for connection in self.connections)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._initial is not None:
+            self._count = self.count
+            self._initial = None
+            for connection, force_debug_cursor in zip(self.connections, self._force_debug_cursor):
+                connection.force_debug_cursor = force_debug_cursor
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(*exc_info)
+        return False
+
+    def _count_query(self, execute, sql, params, many, context):
+        self._count += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,20 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from django_model_to_dict.codegen import DEFAULT_COMPRESSION, NO_COMPRESSION, write_module
+
+
+class Command(BaseCommand):
+    help = 'Writes generated `to_dict` serializers to a python module, see `TO_DICT_CODEGEN_MODULE`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='path of the python module to write')
+        parser.add_argument('models', nargs='*', metavar='app_label.Model',
+                            help='models to write serializers for (all the ToDictMixin models by default)')
+        parser.add_argument('--uncompressed', action='store_true',
+                            help='write serializers of uncompressed output too')
+
+    def handle(self, path, models, uncompressed, **options):
+        compressions = (DEFAULT_COMPRESSION, NO_COMPRESSION) if uncompressed else (DEFAULT_COMPRESSION,)
+        count = write_module(path, [apps.get_model(model) for model in models] or None, compressions)
+        self.stdout.write('Wrote %d serializers to %s' % (count, path))
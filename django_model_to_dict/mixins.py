@@ -1,5 +1,14 @@
+import functools
+
+from . import cache, codegen, instrumentation
+from .plan import ToDictPlan, parse_projection, freeze_projection, get_related_key, REPEATED_OBJECTS_REUSE,\
+    REPEATED_OBJECTS_REFERENCE, RELATED_MODE_PK, RELATED_MODE_NESTED, RELATED_MODE_SKIP, IdentityMap,\
+    get_nested_related_modes, freeze_related_modes
+from .plugins.serialization import get_field_plugin, get_plugin_value, BATCH_ATTRIBUTE
+from .querysets import load_many_to_many
 from .settings import TO_DICT_PREFIXES, TO_DICT_PREFIX_SEPARATOR, TO_DICT_GROUPING,\
-    TO_DICT_SERIALIZATION_PLUGINS, TO_DICT_SKIP, TO_DICT_POSTFIXES, TO_DICT_POSTFIX_SEPARATOR
+    TO_DICT_SERIALIZATION_PLUGINS, TO_DICT_POSTFIXES, TO_DICT_POSTFIX_SEPARATOR, TO_DICT_DEPTH,\
+    TO_DICT_REPEATED_OBJECTS
 
 
 class ToDictMixin:
@@ -19,7 +28,12 @@ class ToDictMixin:
     * postfix-based field grouping
     * serialization plugins for particular field types
     * related fields output
+    * many-to-many relations
+    * graph serialization
     * output compression
+    * field projection
+    * output caching
+    * bulk serialization
 
 
     ## Skipping Fields
@@ -108,12 +122,22 @@ class ToDictMixin:
     image versions:
 
     ```
-    TO_DICT_SERIALIZATION_PLUGINS = ('django_model_to_dict.plugins.serialization.FilebrowserFieldSerializationPlugin',)
+    TO_DICT_SERIALIZATION_PLUGINS = (
+        'django_model_to_dict.plugins.serialization.filebrowser_field.FilebrowserFieldSerializationPlugin',
+    )
     ```
 
     `TO_DICT_SERIALIZATION_PLUGINS` may be set in global settings or as a model property. It's empty by default.
+    Plugins may be given either as classes or as dotted paths. A plugin handles fields of its `field_type`
+    and its subclasses (the most specific `field_type` wins); override `check_field` for custom matching.
+    Plugins are resolved once per model field, so fields without a plugin don't pay for plugin lookups.
 
-    This feature is not covered with unit tests yet.
+    Bulk serialization (`to_dicts`, `iter_dicts`, JSON and columnar output, snapshots) calls the plugin's
+    `prepare(field, queryset)` hook on the queryset first, so it may add the prefetches or annotations it needs,
+    and `serialize_field_batch(field, instances)`, if overridden, once per field per chunk of instances instead of
+    `serialize_field` per instance. Plugins implementing `serialize_field` only keep working as they are.
+    Batching covers the fields of the serialized model itself: the fields of related objects embedded
+    in the output are serialized with `serialize_field`, per related object.
 
 
     ## Related Fields Output
@@ -121,6 +145,77 @@ class ToDictMixin:
     With `inspect_related_objects` argument specified to `True` (which is the default value), the serializer will
     also include information from `to_dict`-enabled related models. **Warning**: `related_name` is currently required.
 
+    When serializing querysets, use `to_dicts` or `prefetch_for_to_dict(queryset)`
+    from `django_model_to_dict.querysets` to load the related objects with `select_related()` / `prefetch_related()`
+    instead of one query per object.
+
+    Related objects may be emitted in one of the following modes, set per related key with `TO_DICT_RELATED_MODES`
+    (in global settings or as a model property) or with the `related_modes` argument of a particular call:
+
+    * `'nested'`: the related objects are serialized. This is the default (except for many-to-many relations).
+    * `'pk'`: primary keys of the related objects are emitted. Foreign key values are taken right from their
+      columns, so the related rows are never fetched.
+    * `'skip'`: nothing is emitted at all.
+
+    Any other mode raises `ValueError` when the related objects are serialized.
+
+    ```
+    TO_DICT_RELATED_MODES = {'customer': 'pk', 'order_positions': 'skip'}
+
+    customer.to_dict(depth=2, related_modes={'orders': 'nested', 'orders.order_positions': 'pk'})
+    ```
+
+    Dotted keys of `related_modes` apply to the related objects further down the graph.
+
+
+    ## Many-To-Many Relations
+
+    Objects related through many-to-many relations (in both directions, `related_name` is required for reverse ones)
+    are emitted as lists of their primary keys. Set `TO_DICT_MANY_TO_MANY = 'nested'` to serialize them instead
+    (or set the mode of a particular relation, see above).
+    Through model fields may be included with `TO_DICT_THROUGH_FIELDS`, under the `through` key:
+
+    ```
+    TO_DICT_MANY_TO_MANY = 'nested'
+    TO_DICT_THROUGH_FIELDS = {'tags': ('weight',)}
+    ```
+
+    ```
+    {
+        'name': 'Apple',
+        'tags': [{'id': 1, 'name': 'fruit', 'through': {'weight': 2}}]
+    }
+    ```
+
+    With `'pk'` output and through fields, the items look like `{'pk': 1, 'through': {'weight': 2}}`.
+    Both settings may be set in global settings or as model properties. The through table is read directly
+    (with a second query for the related objects when they are nested); `to_dicts` does it once per relation
+    for the whole queryset.
+
+
+    ## Graph Serialization
+
+    By default, only a single level of related objects is inspected. Use the `depth` argument (or `TO_DICT_DEPTH`
+    in global settings or as a model property) to go deeper:
+
+    ```
+    customer.to_dict(depth=3)  # customer -> orders -> order positions -> products
+    ```
+
+    Objects up the graph are never serialized again: a related object leading back to one of them (like
+    the customer of each of the customer's orders) is emitted as its primary key, so cycles are cut.
+
+    Objects met more than once within a graph are only fetched and serialized once, using an identity map.
+    `TO_DICT_REPEATED_OBJECTS` (or the `repeated_objects` argument) controls what is emitted for repetitions:
+
+    * `'reuse'`: the same dictionary is emitted again (mind it's the same object when modifying the output).
+      This is the default.
+    * `'reference'`: the primary key of the object is emitted instead.
+
+    Bulk serialization with `to_dicts` loads the whole graph with nested lookups, and reuses the identity map
+    across the queryset, so a product referenced by 500 order positions is serialized once.
+    `depth=0` is the same as `inspect_related_objects=False`. Graphs deeper than a single level are never cached.
+
 
     ## Output Compression
 
@@ -137,11 +232,130 @@ class ToDictMixin:
     Not used yet:
     * `compress_empty_related_objects`: ignore empty or None values in related objects. Default: `False`.
 
+
+    ## Field Projection
+
+    `TO_DICT_SKIP` is a static blacklist. To limit a particular serialization to some keys, pass a projection
+    with the `fields` argument: a comma-separated string of dotted paths (or a list of them).
+
+    ```
+    customer.to_dict(fields='nickname,address.city,orders.id')
+    ```
+
+    Root keys select root-level fields, whole groups, prefix and postfix groups, and related objects;
+    nested keys select fields inside groups or inside related objects. Related objects not mentioned
+    in the projection aren't inspected at all. Bulk serialization pushes projections down to the database,
+    fetching only the projected columns and related objects.
+
+    Plans restricted to projections are compiled once and cached per model; only the
+    `TO_DICT_PROJECTION_CACHE_SIZE` (128 by default) most recently used projections of a model are kept.
+
+
+    ## Output Caching
+
+    Serialization output of rarely changing models may be cached. Set `TO_DICT_CACHE` to a cache backend instance
+    (or a dotted path to a backend class) to enable it:
+
+    ```
+    TO_DICT_CACHE = LRUCacheBackend(max_size=10000)  # or DjangoCacheBackend('default')
+    TO_DICT_CACHE_VERSION = 2  # bump whenever the serialization layout changes
+    ```
+
+    Cached output is invalidated on `post_save`, `post_delete` and `m2m_changed`, including the output of
+    the objects embedding the changed one through the default related fields strategy (both the current ones
+    and the ones it was moved away from by changing a foreign key). The receivers are connected when the app
+    is ready, so keep `django_model_to_dict` in `INSTALLED_APPS` of every process saving cached objects.
+    The backends are defined in `django_model_to_dict.cache`. Caching is disabled by default.
+
+
+    ## Bulk Serialization
+
+    Use `django_model_to_dict.querysets.to_dicts(queryset)` (or `ToDictQuerySet.to_dicts()`) instead of
+    `[o.to_dict() for o in queryset]`. It accepts the same arguments as `to_dict` and reads the rows with
+    `values_list()` whenever the model configuration allows it, so no model instances are built.
+
+    To stream a queryset as JSON without building the whole list in memory, use `stream_json(queryset, chunk_size)`
+    or `streaming_json_response(queryset)` from `django_model_to_dict.streaming`.
+
+    To get JSON right away, use `to_json_bytes()` and `django_model_to_dict.encoding.to_json_lines(queryset)`
+    (or `ToDictQuerySet.to_json_lines()`): JSON is written right out of the field values, with no intermediate
+    dictionaries and no second pass of a JSON encoder (orjson is used when installed).
+
+    Read-heavy list endpoints may have the JSON built right by the database (SQLite or PostgreSQL) with
+    `django_model_to_dict.dbjson.to_db_json(queryset)` (or `ToDictQuerySet.to_db_json()`): groups, prefixes and
+    postfixes become nested JSON objects and related objects become subqueries, so python only passes the text
+    through. Plugin fields are merged in python, and whatever the database can't build falls back to python.
+
+    Analytics exports may use `django_model_to_dict.columnar.to_columns(queryset)`, returning a list
+    (or a NumPy array) of values per output path, like `address.city`, instead of a list of dictionaries.
+
+    Large result sets held in memory (caches, batch pipelines) may use
+    `django_model_to_dict.records.to_records(queryset)` (or `ToDictQuerySet.to_records()`): the same output
+    as read-only mappings, holding a tuple of field values each, with the keys and compression rules shared
+    by a record class per model layout. `record.to_dict()` returns a plain dictionary.
+
+    ASGI views may use `await instance.ato_dict()` and `await ato_dicts(queryset)` from `django_model_to_dict.aio`,
+    loading related objects with Django's async ORM when it's available (that code path isn't verified
+    by the test suite yet, see the module docs).
+
+    Offline exports of whole tables may be parallelized with `django_model_to_dict.parallel.export(queryset)`,
+    serializing primary key ranges in a pool of processes (or threads, for I/O-bound plugins).
+
+
+    ## Output Backends
+
+    `to_output()` (and `ToDictQuerySet.to_output()`) emit serialized objects with the output backend set
+    with `TO_DICT_OUTPUT_BACKEND` (or passed as the `backend` argument): python dictionaries by default,
+    JSON or MessagePack bytes for service-to-service payloads:
+
+    ```
+    TO_DICT_OUTPUT_BACKEND = MessagePackBackend(intern_keys=True)  # or 'django_model_to_dict.output.JSONBackend'
+    ```
+
+    With `intern_keys`, every distinct key is packed only once per payload. The backends are defined in
+    `django_model_to_dict.output`, their `loads()` reads the output back.
+
+
+    ## Snapshots
+
+    Read-mostly models may pay the serialization cost at write time: with `'django_model_to_dict.snapshots'`
+    installed and `TO_DICT_SNAPSHOTS = True`, the JSON of every object is stored in a snapshot table whenever
+    the object (or an object it embeds) is saved, and `django_model_to_dict.snapshots.store.iter_snapshots(queryset)`
+    reads the payloads along with the objects in a single query. Snapshots are versioned with
+    `TO_DICT_SNAPSHOT_VERSION` and rebuilt with `python manage.py to_dict_rebuild_snapshots`.
+
+
+    ## Change Feeds
+
+    `django_model_to_dict.delta.ChangeTracker` keeps the last serialized form of objects and returns only
+    the output paths (like `address.city`) changed since then, e.g. to push object updates over websockets.
+    Objects saved with `update_fields` are compared by the updated fields only, without calling `to_dict()`.
+
+
+    ## Instrumentation
+
+    To find out where serialization time goes, wrap the code in `django_model_to_dict.instrumentation.instrument()`:
+    it collects per-phase (field extraction, plugins, compression, related objects, `_to_dict_pre_finish_hook`)
+    and per-plugin timings, queries and time per relation, and the number of serialized objects, sending them with
+    the `to_dict_instrumented` signal in the end. `instrument(sample_rate=0.01)` only instruments a random share
+    of the blocks, and there's virtually no overhead outside of instrumented blocks.
+
+
+    ## Generated Serializers
+
+    Fields are serialized by straight-line functions generated once per model and combination of compression
+    arguments (see `django_model_to_dict.codegen`): no loops over the fields and no compression checks at runtime.
+    `codegen.get_source(Model)` shows the generated code, `python manage.py to_dict_codegen <path>` writes it
+    to a module loaded with `TO_DICT_CODEGEN_MODULE` instead of compiling it on startup.
+    Set `TO_DICT_CODEGEN = False` to serialize the fields with the generic code, which is always used
+    for projections (the `fields` argument).
+
     """
 
     def to_dict(self, compress_fields=True, compress_groups=True, compress_prefixes=True, compress_postfixes=True,
                 compress_empty_groups=False, inspect_related_objects=True, compress_empty_related_objects=False,
-                __ive_been_there_already=tuple()):
+                fields=None, depth=None, repeated_objects=None, related_modes=None, identity_map=None,
+                _ive_been_there_already=tuple()):
         """
         Serializes model's fields into a python dictionary.
 
@@ -152,200 +366,295 @@ class ToDictMixin:
         :param compress_empty_groups: ignore empty groups as a whole
         :param inspect_related_objects: inspect related objects
         :param compress_empty_related_objects: ignore empty or None values in related objects
-        :param __ive_been_there_already: private param to prevent infinite recursion
+        :param fields: projection limiting the output to particular keys, e.g. `'name,address.city,orders.price'`
+        :param depth: levels of related objects to inspect (`TO_DICT_DEPTH` by default)
+        :param repeated_objects: `'reuse'` or `'reference'` (`TO_DICT_REPEATED_OBJECTS` by default)
+        :param related_modes: `'pk'`, `'nested'` or `'skip'` by related key, overriding `TO_DICT_RELATED_MODES`;
+            dotted keys like `'orders.customer'` apply to nested related objects
+        :param identity_map: `IdentityMap` of the related objects serialized so far, may be shared by several calls
+        :param _ive_been_there_already: private param to prevent infinite recursion: objects up the graph
 
         :return: python dictionary representing serialized fields of the model
         """
 
-        # the resulting dictionary
-        result = {}
-
-        fields_to_skip = getattr(self, 'TO_DICT_SKIP', TO_DICT_SKIP)
-
-        # initializing manually specified field grouping
-        self._init_grouping(result)
-
-        # initializing prefix-based field grouping
-        self._init_prefixes(result)
-
-        # initializing postfix-based field grouping
-        self._init_postfixes(result)
-
-        # iterating over model's fields
-        for field in self._meta.concrete_fields:
-
-            # skipping explicitly specified fields
-            if field.name in fields_to_skip:
-                continue
-
-            # handling prefixed fields grouping
-            prefix = self._get_prefix(field.name)
-            if prefix:
-                prefix_key = self._clean_prefix(prefix)
-                result[prefix_key][self._remove_prefix(field.name, prefix)] = self._handle_nontrivial_field(field) or field.value_from_object(self)
-                continue
-
-            # handling postfixed fields grouping
-            postfix = self._get_postfix(field.name)
-            if postfix:
-                postfix_key = self._clean_postfix(postfix)
-                result[postfix_key][self._remove_postfix(field.name, postfix)] = self._handle_nontrivial_field(field) or field.value_from_object(self)
-                continue
-
-            # handling manually specified field grouping
-            group = self._get_group(field.name)
-            if group:
-                result[group][field.name] = self._handle_nontrivial_field(field) or field.value_from_object(self)
-                continue
-            # TODO: custom mapping
-
-            result[field.name] = self._handle_nontrivial_field(field) or field.value_from_object(self)
-
-        # setup empty values for None-valued fields
-        if compress_fields:
-            self._compress_fields(result)
-        if compress_groups:
-            self._compress_groups(result)
-        if compress_prefixes:
-            self._compress_prefixes(result)
-        if compress_postfixes:
-            self._compress_postfixes(result)
-        if compress_empty_groups:
-            self._compress_empty_groups(result)
+        # the compiled serialization plan of the model, resolved once per model class (and projection)
+        plan = self._get_to_dict_plan(fields)
+
+        # statistics collected within `instrumentation.instrument()` blocks, if any
+        stats = instrumentation.active and instrumentation.get_stats()
+        if stats:
+            stats.objects += 1
+
+        if depth is None:
+            depth = getattr(self, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+        if repeated_objects is None:
+            repeated_objects = getattr(self, 'TO_DICT_REPEATED_OBJECTS', TO_DICT_REPEATED_OBJECTS)
+        inspect_related_objects = inspect_related_objects and depth > 0
+
+        # looking for a cached result first, if caching is enabled for the model;
+        # graph serialization output depends on the objects around, so it's never cached
+        cacheable = self.pk is not None and (not inspect_related_objects or (
+            depth == 1 and repeated_objects == REPEATED_OBJECTS_REUSE and not _ive_been_there_already))
+        cache_backend = cache.get_backend(self) if cacheable else None
+        if cache_backend is not None:
+            cache_arguments = (compress_fields, compress_groups, compress_prefixes, compress_postfixes,
+                               compress_empty_groups, inspect_related_objects, compress_empty_related_objects,
+                               freeze_projection(plan.projection), freeze_related_modes(related_modes))
+            result = cache.get_cached(cache_backend, self, cache_arguments)
+            if result is not None:
+                return result
+
+        # the resulting dictionary, built out of model's non-skipped fields and compressed on the fly
+        compression = (compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups)
+        if stats:
+            values = stats.extract_values(self, plan)
+            started = stats.clock()
+            result = plan.build(values, *compression)
+            stats.add_phase('compression', started)
+        elif plan.codegen and BATCH_ATTRIBUTE not in self.__dict__:
+            # a straight-line function generated for the plan and the compression arguments
+            result = codegen.get_serializer(plan, compression)(self)
+        else:
+            values = [plugin and get_plugin_value(plugin, field, self) or field.value_from_object(self)
+                      for field, bucket, key, plugin in plan.fields]
+            result = plan.build(values, *compression)
 
         if inspect_related_objects:
+            started = stats and stats.clock()
             # there's a posibility to redefine the related fields strategy
             if hasattr(self, '_to_dict_related_fields_strategy'):
                 self._to_dict_related_fields_strategy(result)
+                if plan.projection is not None:
+                    for key in [key for key in result if key not in plan.projection]:
+                        del result[key]
             else:
-                self._default_related_fields_strategy(result)
+                self._default_related_fields_strategy(result, plan, depth, repeated_objects, identity_map,
+                                                      _ive_been_there_already, related_modes)
+            if stats:
+                stats.add_phase('related', started)
 
         # calling pre_finish_hook if there is one
         if hasattr(self, '_to_dict_pre_finish_hook'):
+            started = stats and stats.clock()
             self._to_dict_pre_finish_hook(result)
+            if stats:
+                stats.add_phase('pre_finish_hook', started)
+
+        if cache_backend is not None:
+            cache.set_cached(cache_backend, self, cache_arguments, result)
 
         return result
 
-    def _init_grouping(self, result):
-        for prefix in getattr(self, 'TO_DICT_GROUPING', TO_DICT_GROUPING):
-            result[prefix] = {}
+    def ato_dict(self, **kwargs):
+        """
+        Asynchronous counterpart of `to_dict`, for ASGI views (see `django_model_to_dict.aio`).
 
-    def _init_prefixes(self, result):
-        for prefix in getattr(self, 'TO_DICT_PREFIXES', TO_DICT_PREFIXES):
-            result[self._clean_prefix(prefix)] = {}
+        :return: coroutine returning python dictionary representing serialized fields of the model
+        """
+        from .aio import ato_dict
+        return ato_dict(self, **kwargs)
 
-    def _init_postfixes(self, result):
-        for postfix in getattr(self, 'TO_DICT_POSTFIXES', TO_DICT_POSTFIXES):
-            result[self._clean_postfix(postfix)] = {}
+    def to_json_bytes(self, **kwargs):
+        """
+        Serializes model's fields right into JSON bytes, accepting the same arguments as `to_dict`
+        (see `django_model_to_dict.encoding`).
+        """
+        from .encoding import to_json_bytes
+        return to_json_bytes(self, **kwargs)
 
-    def _handle_nontrivial_field(self, field):
+    def to_output(self, backend=None, **kwargs):
+        """
+        Serializes model's fields with an output backend (see `django_model_to_dict.output`),
+        accepting the same arguments as `to_dict`.
 
-        serialization_plugins = getattr(self, 'TO_DICT_SERIALIZATION_PLUGINS', TO_DICT_SERIALIZATION_PLUGINS)
+        :param backend: output backend instance or dotted path, `TO_DICT_OUTPUT_BACKEND` by default
+        """
+        from .output import get_backend
+        return get_backend(self, backend).dumps(self, **kwargs)
+
+    @classmethod
+    def _get_to_dict_plan(cls, fields=None):
+        # the plan is stored in the class' own __dict__, so subclasses never reuse their parent's plan
+        plan = cls.__dict__.get('_to_dict_plan')
+        if plan is None:
+            plan = ToDictPlan(cls)
+            cls._to_dict_plan = plan
+        if fields is not None:
+            plan = plan.project(parse_projection(fields))
+        return plan
 
-        for plugin in serialization_plugins:            
-            if plugin.check_field(field):
-                return plugin.serialize_field(field, self)
+    def _handle_nontrivial_field(self, field):
+        plugin = self._get_serialization_plugin(field)
+        if plugin:
+            return plugin.serialize_field(field, self)
         return None
 
-    def _default_related_fields_strategy(self, result):
+    @classmethod
+    def _get_serialization_plugin(cls, field):
+        return get_field_plugin(field, getattr(cls, 'TO_DICT_SERIALIZATION_PLUGINS', TO_DICT_SERIALIZATION_PLUGINS))
+
+    def _default_related_fields_strategy(self, result, plan=None, depth=1, repeated_objects=REPEATED_OBJECTS_REUSE,
+                                         identity_map=None, ancestors=(), related_modes=None):
         # TODO: better tests
+        plan = plan or self._get_to_dict_plan()
+        if identity_map is None:
+            identity_map = IdentityMap()
+        ancestors = ancestors + ((self._meta.concrete_model, self.pk),)
+        stats = instrumentation.active and instrumentation.get_stats()
 
         # before Django 1.10
         # related_fields = [f for f in self._meta.get_all_related_objects() if f.is_relation and f.multiple]
         # for rf in related_fields:
         #     result[rf.name] = [i.to_dict() for i in getattr(self, rf.name).all()]
 
-        related_fields = [rf for rf in self._meta.get_fields() if rf.is_relation]
-        for rf in related_fields:
-            # TODO recursion using __ive_been_there_already to prevent stack overflow
-            if rf.one_to_many:
-                if not rf.related_name:
+        for rf in plan.related_fields:
+            key = get_related_key(rf)
+            if key is None:
+                continue
+            mode = plan.get_related_mode(rf, related_modes)
+            if mode == RELATED_MODE_SKIP:
+                result.pop(key, None)
+                continue
+            # the related objects are limited to the nested projection, if any
+            projection = plan.projection and plan.projection[key] or None
+            nested = (projection, get_nested_related_modes(related_modes, key), depth, repeated_objects,
+                      identity_map, ancestors)
+            if stats:
+                stats.measure_relation('%s.%s' % (self._meta.label, key), self._related_field_to_dict, result, rf,
+                                       key, mode, plan, nested)
+            else:
+                self._related_field_to_dict(result, rf, key, mode, plan, nested)
+
+    def _related_field_to_dict(self, result, rf, key, mode, plan, nested):
+        """Puts the objects of a related field into the result, see `_default_related_fields_strategy`"""
+        if rf.one_to_many:
+            if mode == RELATED_MODE_PK:
+                result[key] = [i.pk for i in getattr(self, key).all()]
+            else:
+                result[key] = [self._related_object_to_dict(rf.related_model, i.pk, lambda i=i: i, *nested)
+                               for i in getattr(self, key).all()]
+        if rf.many_to_one or rf.one_to_one:
+            if rf.concrete:
+                # the identity of a forward related object is known without fetching it
+                pk = getattr(self, rf.attname)
+                if mode == RELATED_MODE_PK:
+                    if pk is not None:
+                        result[key] = pk
+                    return
+                if not rf.target_field.primary_key:
+                    related_object = getattr(self, rf.name)
+                    pk = related_object and related_object.pk
+            else:
+                related_object = getattr(self, rf.name, None)
+                pk = related_object and related_object.pk
+                if mode == RELATED_MODE_PK:
+                    if pk is not None:
+                        result[key] = pk
+                    return
+            if pk is not None and hasattr(rf.related_model, 'to_dict'):
+                result[key] = self._related_object_to_dict(
+                    rf.related_model, pk, functools.partial(getattr, self, rf.name), *nested)
+        if rf.many_to_many:
+            # the objects may have been loaded for a whole batch of instances by `to_dicts`
+            related_items = self.__dict__.get('_to_dict_many_to_many', {}).get(key)
+            if related_items is None:
+                related_items = load_many_to_many([self], rf, plan, mode=mode).get(self.pk, [])
+            result[key] = self._many_to_many_to_dicts(rf, related_items, mode, *nested)
+
+    def _many_to_many_to_dicts(self, rf, related_items, mode, projection, related_modes, depth, repeated_objects,
+                               identity_map, ancestors):
+        """Serializes objects related through a many-to-many relation, see `querysets.load_many_to_many`"""
+        results = []
+        for pk, related_object, through in related_items:
+            if mode == RELATED_MODE_NESTED:
+                if related_object is None:
                     continue
-                result[rf.related_name] = [
-                    i.to_dict(inspect_related_objects=False) for i in getattr(self, rf.related_name).all()]
-            if rf.many_to_one or rf.one_to_one:
-                related_object = getattr(self, rf.name)
-                if hasattr(related_object, 'to_dict'):
-                    result[rf.name] = related_object.to_dict(inspect_related_objects=False)
-            if rf.many_to_many:
-                print('many_to_many', rf.name, rf)
-
-
-    def _get_prefix(self, field_name):
-        for prefix in getattr(self, 'TO_DICT_PREFIXES', TO_DICT_PREFIXES):
+                value = self._related_object_to_dict(rf.related_model, pk, lambda o=related_object: o, projection,
+                                                     related_modes, depth, repeated_objects, identity_map, ancestors)
+            else:
+                value = pk
+            if through is not None:
+                # serialized related objects may be reused, so they are copied rather than modified
+                value = dict(value, through=through) if isinstance(value, dict) else {'pk': value, 'through': through}
+            results.append(value)
+        return results
+
+    def _related_object_to_dict(self, model, pk, get_object, projection, related_modes, depth, repeated_objects,
+                                identity_map, ancestors):
+        """
+        Serializes a related object `depth - 1` levels deep, unless it was met before:
+        objects up the graph are emitted as their primary keys to break cycles, other repeated objects are
+        either reused from the identity map or emitted as their primary keys, depending on `repeated_objects`.
+
+        :param get_object: callable returning the related object, only called if it's to be serialized
+        """
+        identity = (model._meta.concrete_model, pk)
+        if identity in ancestors:
+            level = ancestors.index(identity)
+            if identity_map.referenced_level is None or level < identity_map.referenced_level:
+                identity_map.referenced_level = level
+            return pk
+        serialized = identity_map.get(identity)
+        if serialized is not None and repeated_objects == REPEATED_OBJECTS_REFERENCE:
+            return pk
+
+        key = (model, freeze_projection(projection), freeze_related_modes(related_modes), depth)
+        if serialized is not None and key in serialized:
+            return serialized[key]
+
+        outer_referenced_level, identity_map.referenced_level = identity_map.referenced_level, None
+        result = get_object().to_dict(fields=projection, depth=depth - 1, repeated_objects=repeated_objects,
+                                      related_modes=related_modes, identity_map=identity_map,
+                                      _ive_been_there_already=ancestors)
+        referenced_level = identity_map.referenced_level
+        if referenced_level is None or referenced_level >= len(ancestors):
+            # only the output referencing nothing up the graph from the object itself may be reused
+            identity_map.setdefault(identity, {})[key] = result
+        elif outer_referenced_level is None or referenced_level < outer_referenced_level:
+            outer_referenced_level = referenced_level
+        identity_map.referenced_level = outer_referenced_level
+        return result
+
+    @classmethod
+    def _get_prefix(cls, field_name):
+        for prefix in getattr(cls, 'TO_DICT_PREFIXES', TO_DICT_PREFIXES):
             if field_name.startswith(prefix):
                 return prefix
 
-    def _clean_prefix(self, prefix):
-        separator = getattr(self, 'TO_DICT_PREFIX_SEPARATOR', TO_DICT_PREFIX_SEPARATOR)
+    @classmethod
+    def _clean_prefix(cls, prefix):
+        separator = getattr(cls, 'TO_DICT_PREFIX_SEPARATOR', TO_DICT_PREFIX_SEPARATOR)
         if prefix.endswith(separator):
             return prefix[:-len(separator)]
         return prefix
 
-    def _get_postfix(self, field_name):
-        for postfix in getattr(self, 'TO_DICT_POSTFIXES', TO_DICT_POSTFIXES):
+    @classmethod
+    def _get_postfix(cls, field_name):
+        for postfix in getattr(cls, 'TO_DICT_POSTFIXES', TO_DICT_POSTFIXES):
             if field_name.endswith(postfix):
                 return postfix
 
-    def _clean_postfix(self, postfix):
-        separator = getattr(self, 'TO_DICT_POSTFIX_SEPARATOR', TO_DICT_POSTFIX_SEPARATOR)
+    @classmethod
+    def _clean_postfix(cls, postfix):
+        separator = getattr(cls, 'TO_DICT_POSTFIX_SEPARATOR', TO_DICT_POSTFIX_SEPARATOR)
         if postfix.startswith(separator):
             return postfix[len(separator):]
         return postfix
 
-    def _get_group(self, field_name):
-        for group, group_cfg in (getattr(self, 'TO_DICT_GROUPING', TO_DICT_GROUPING)).items():
+    @classmethod
+    def _get_group(cls, field_name):
+        for group, group_cfg in (getattr(cls, 'TO_DICT_GROUPING', TO_DICT_GROUPING)).items():
             if field_name in group_cfg:
                 return group
 
-    def _compress_fields(self, result):
-        to_clear = []
-        for field_name, field_value in result.items():
-            if not field_value:
-                to_clear.append(field_name)
-        for field_name in to_clear:
-            del result[field_name]
-
-    def _compress_groups(self, result):
-        for group in (getattr(self, 'TO_DICT_GROUPING', TO_DICT_GROUPING)).keys():
-            to_clear = []
-            for field_name, field_value in result[group].items():
-                if not field_value:
-                    to_clear.append(field_name)
-            for field_name in to_clear:
-                del result[group][field_name]
-
-    def _compress_prefixes(self, result):
-        for prefix in getattr(self, 'TO_DICT_PREFIXES', TO_DICT_PREFIXES):
-            prefix_key = self._clean_prefix(prefix)
-            to_clear = []
-            for field_name, field_value in result[prefix_key].items():
-                if not field_value:
-                    to_clear.append(field_name)
-            for field_name in to_clear:
-                del result[prefix_key][field_name]
-
-    def _compress_postfixes(self, result):
-        for postfix in getattr(self, 'TO_DICT_POSTFIXES', TO_DICT_POSTFIXES):
-            postfix_key = self._clean_postfix(postfix)
-            to_clear = []
-            for field_name, field_value in result[postfix_key].items():
-                if not field_value:
-                    to_clear.append(field_name)
-            for field_name in to_clear:
-                del result[postfix_key][field_name]
-
-    def _compress_empty_groups(self, result):
-        # TODO: actually iterate over groups
-        for k in [k for k in result if result[k] == {}]:
-            del result[k]
-
-    def _remove_prefix(self, field_name, prefix):
+    @classmethod
+    def _remove_prefix(cls, field_name, prefix):
         if field_name.startswith(prefix):
             return field_name[len(prefix):]
         return field_name
 
-    def _remove_postfix(self, field_name, postfix):
+    @classmethod
+    def _remove_postfix(cls, field_name, postfix):
         if field_name.endswith(postfix):
             return field_name[:-len(postfix)]
         return field_name
\ No newline at end of file
@@ -122,6 +122,30 @@ class Product(models.Model, ToDictMixin):
 
     name = models.CharField(max_length=100, verbose_name=_('name'))
     price = models.PositiveIntegerField(verbose_name=_('price'))
+    tags = models.ManyToManyField(to='Tag', through='ProductTag', blank=True, verbose_name=_('tags'),
+                                  related_name='products')
+
+
+class Tag(models.Model, ToDictMixin):
+    """This model describes a product tag"""
+
+    class Meta:
+        verbose_name = _('Tag')
+        verbose_name_plural = _('Tags')
+
+    name = models.CharField(max_length=100, verbose_name=_('name'))
+
+
+class ProductTag(models.Model):
+    """This model links products to tags, see TO_DICT_THROUGH_FIELDS"""
+
+    class Meta:
+        verbose_name = _('Product Tag')
+        verbose_name_plural = _('Product Tags')
+
+    product = models.ForeignKey(to=Product, verbose_name=_('product'))
+    tag = models.ForeignKey(to=Tag, verbose_name=_('tag'))
+    weight = models.PositiveIntegerField(default=0, verbose_name=_('weight'))
 
 
 class Order(models.Model, ToDictMixin):
@@ -0,0 +1,182 @@
+"""
+Output backends: the formats serialized objects are emitted in.
+
+A backend serializes a single instance (`dumps`) or a whole queryset (`dumps_queryset`) of a `ToDictMixin`
+model, accepting the same arguments as `to_dict` and `to_dicts`, and reads its own output back (`loads`).
+`ToDictMixin.to_output()` and `ToDictQuerySet.to_output()` use the backend configured with
+`TO_DICT_OUTPUT_BACKEND` (python dictionaries by default).
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .encoding import _iter_json, to_json_bytes
+from .querysets import iter_dicts, to_dicts
+from .settings import TO_DICT_OUTPUT_BACKEND
+
+
+class OutputBackend:
+    """Base class for output backends"""
+
+    # MIME type of the output, for HTTP responses
+    content_type = None
+
+    def dumps(self, instance, **kwargs):
+        """Serializes an instance of a `ToDictMixin` model, accepting the same arguments as `to_dict`"""
+        raise NotImplementedError
+
+    def dumps_queryset(self, queryset, **kwargs):
+        """Serializes a queryset of a `ToDictMixin` model as a list, accepting the same arguments as `to_dicts`"""
+        raise NotImplementedError
+
+    def loads(self, data):
+        """Reads output of `dumps` or `dumps_queryset` back into python objects"""
+        raise NotImplementedError
+
+
+class DictBackend(OutputBackend):
+    """Python dictionaries, the output of `to_dict` itself"""
+
+    def dumps(self, instance, **kwargs):
+        return instance.to_dict(**kwargs)
+
+    def dumps_queryset(self, queryset, **kwargs):
+        return to_dicts(queryset, **kwargs)
+
+    def loads(self, data):
+        return data
+
+
+class JSONBackend(OutputBackend):
+    """JSON bytes, written right out of the serialization plan (see `django_model_to_dict.encoding`)"""
+
+    content_type = 'application/json'
+
+    def dumps(self, instance, **kwargs):
+        return to_json_bytes(instance, **kwargs)
+
+    def dumps_queryset(self, queryset, **kwargs):
+        return ('[' + ','.join(_iter_json(queryset, **kwargs)) + ']').encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data.decode('utf-8'))
+
+
+class DatabaseJSONBackend(JSONBackend):
+    """
+    JSON bytes, with querysets built right by the database whenever possible
+    (see `django_model_to_dict.dbjson`), e.g. for read-heavy list endpoints
+    """
+
+    def dumps_queryset(self, queryset, **kwargs):
+        from .dbjson import to_db_json
+        return to_db_json(queryset, **kwargs)
+
+
+class MessagePackBackend(OutputBackend):
+    """
+    MessagePack bytes, requires the `msgpack` package (1.0+).
+
+    Querysets are packed object by object into a single buffer, without building the list of dictionaries.
+
+    With `intern_keys` enabled, every distinct key (like `address` or `contacts` of every object) is packed
+    just once: keys of the packed dictionaries are replaced with indexes into a table of keys,
+    and `[data, keys]` is packed instead of the data itself. Use `loads` to restore the keys.
+    """
+
+    content_type = 'application/msgpack'
+
+    def __init__(self, intern_keys=False):
+        import msgpack
+        self.msgpack = msgpack
+        self.intern_keys = intern_keys
+
+    def _get_packer(self):
+        # values msgpack has no types for are packed the same way as with `DjangoJSONEncoder`
+        return self.msgpack.Packer(use_bin_type=True, autoreset=False, default=DjangoJSONEncoder().default)
+
+    def dumps(self, instance, **kwargs):
+        data = instance.to_dict(**kwargs)
+        packer = self._get_packer()
+        if self.intern_keys:
+            keys = {}
+            data = intern_keys(data, keys)
+            packer.pack_array_header(2)
+            packer.pack(data)
+            packer.pack(get_key_table(keys))
+        else:
+            packer.pack(data)
+        return packer.bytes()
+
+    def dumps_queryset(self, queryset, **kwargs):
+        packer = self._get_packer()
+        keys = {} if self.intern_keys else None
+        count = 0
+        for data in iter_dicts(queryset, **kwargs):
+            packer.pack(data if keys is None else intern_keys(data, keys))
+            count += 1
+
+        # the number of objects is only known in the end, so the headers are packed separately
+        header = self._get_packer()
+        if keys is not None:
+            header.pack_array_header(2)
+        header.pack_array_header(count)
+        parts = [header.bytes(), packer.getbuffer()]
+        if keys is not None:
+            table = self._get_packer()
+            table.pack(get_key_table(keys))
+            parts.append(table.bytes())
+        return b''.join(parts)
+
+    def loads(self, data):
+        data = self.msgpack.unpackb(data, raw=False, strict_map_key=False)
+        if self.intern_keys:
+            data, keys = data
+            data = restore_keys(data, keys)
+        return data
+
+
+def intern_keys(value, keys):
+    """
+    Replaces dictionary keys (at any level) with their indexes in `keys`, a dictionary of keys seen so far.
+    """
+    if isinstance(value, dict):
+        return {keys.setdefault(key, len(keys)): intern_keys(item, keys) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [intern_keys(item, keys) for item in value]
+    return value
+
+
+def get_key_table(keys):
+    """Returns the list of keys interned by `intern_keys`, ordered by their indexes"""
+    return sorted(keys, key=keys.__getitem__)
+
+
+def restore_keys(value, table):
+    """Restores dictionary keys replaced by `intern_keys`, given the table of keys (see `get_key_table`)"""
+    if isinstance(value, dict):
+        return {table[key]: restore_keys(item, table) for key, item in value.items()}
+    if isinstance(value, list):
+        return [restore_keys(item, table) for item in value]
+    return value
+
+
+_backends = {}
+
+
+def get_backend(model, backend=None):
+    """
+    Returns an output backend: `backend` if given, or the one configured for the model
+    with `TO_DICT_OUTPUT_BACKEND`.
+
+    Either is an `OutputBackend` instance or a dotted path to an `OutputBackend` class.
+    Backends specified with a dotted path are instantiated once and shared between models.
+    """
+    if backend is None:
+        backend = getattr(model, 'TO_DICT_OUTPUT_BACKEND', TO_DICT_OUTPUT_BACKEND)
+    if isinstance(backend, str):
+        if backend not in _backends:
+            _backends[backend] = import_string(backend)()
+        backend = _backends[backend]
+    return backend
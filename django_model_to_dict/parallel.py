@@ -0,0 +1,125 @@
+"""
+Parallel serialization of whole tables for offline exports.
+
+The queryset is split into primary key ranges, which are serialized with `to_dicts` by a pool of worker
+processes (for CPU-bound serialization) or threads (for I/O-bound serialization plugins).
+Every worker uses its own database connection. Chunks are merged in primary key order, so the output
+is the same as the output of the single-process `to_dicts(queryset.order_by('pk'))`.
+"""
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+from .querysets import to_dicts
+from .settings import TO_DICT_STREAMING_CHUNK_SIZE
+
+MODE_PROCESS = 'process'
+MODE_THREAD = 'thread'
+
+
+def export(queryset, output=None, workers=None, mode=MODE_PROCESS, chunk_size=TO_DICT_STREAMING_CHUNK_SIZE,
+           encoder_class=DjangoJSONEncoder, **kwargs):
+    """
+    Serializes a queryset of a `ToDictMixin` model in parallel.
+
+    :param queryset: queryset of a `ToDictMixin` model (not sliced), exported in primary key order
+    :param output: path or text file object to write JSON Lines to; a list of dictionaries is returned if omitted
+    :param workers: number of worker processes or threads (the number of CPUs by default), 1 to export in-process
+    :param mode: `MODE_PROCESS` or `MODE_THREAD`
+    :param chunk_size: number of objects serialized by a worker at once
+    :param encoder_class: JSON encoder class for JSON Lines output
+    :param kwargs: `to_dict` arguments
+
+    :return: list of python dictionaries, or number of exported objects when writing to `output`
+    """
+    if mode not in (MODE_PROCESS, MODE_THREAD):
+        raise ValueError('Unknown export mode: %s' % mode)
+    if not queryset.query.can_filter():
+        raise ValueError('Sliced querysets can not be split into primary key ranges, filter them instead')
+
+    tasks = [(queryset.model._meta.label, queryset.query, first, last, kwargs, output and encoder_class)
+             for first, last in _get_pk_ranges(queryset, chunk_size)]
+
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1 or len(tasks) <= 1:
+        chunks = map(_serialize_chunk, tasks)
+        return _collect(chunks, output)
+
+    if mode == MODE_THREAD:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return _collect(executor.map(_serialize_chunk_in_thread, tasks), output)
+
+    # forked workers must not share the parent's database connections
+    connections.close_all()
+    with multiprocessing.Pool(workers, initializer=_init_process) as pool:
+        return _collect(pool.imap(_serialize_chunk, tasks), output)
+
+
+def _get_pk_ranges(queryset, chunk_size):
+    """
+    Returns (first, last) primary key ranges of at most `chunk_size` objects each.
+
+    Only the boundaries of the ranges are queried, walking the primary key index: a single query per range
+    fetches the last primary key of the range along with the first one of the next range.
+    """
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    first = pks.first()
+    ranges = []
+    while first is not None:
+        boundaries = list(pks.filter(pk__gte=first)[chunk_size - 1:chunk_size + 1])
+        if not boundaries:
+            # the rest of the queryset is shorter than a chunk
+            ranges.append((first, pks.filter(pk__gte=first).last()))
+            break
+        ranges.append((first, boundaries[0]))
+        first = boundaries[1] if len(boundaries) > 1 else None
+    return ranges
+
+
+def _collect(chunks, output):
+    if output is None:
+        result = []
+        for chunk in chunks:
+            result.extend(chunk)
+        return result
+
+    if isinstance(output, str):
+        with open(output, 'w') as f:
+            return _collect(chunks, f)
+
+    count = 0
+    for chunk in chunks:
+        for line in chunk:
+            output.write(line)
+            output.write('\n')
+        count += len(chunk)
+    return count
+
+
+def _init_process():
+    # workers started with the 'spawn' method need to set Django up themselves
+    if not apps.ready:
+        django.setup()
+
+
+def _serialize_chunk(task):
+    model_label, query, first, last, kwargs, encoder_class = task
+    model = apps.get_model(model_label)
+    queryset = model._default_manager.all()
+    queryset.query = query
+    results = to_dicts(queryset.filter(pk__gte=first, pk__lte=last).order_by('pk'), **kwargs)
+    if encoder_class is None:
+        return results
+    encode = encoder_class(separators=(',', ':')).encode
+    return [encode(result) for result in results]
+
+
+def _serialize_chunk_in_thread(task):
+    try:
+        return _serialize_chunk(task)
+    finally:
+        connections.close_all()
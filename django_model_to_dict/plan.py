@@ -0,0 +1,307 @@
+import copy
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.db.models.fields.reverse_related import ForeignObjectRel
+
+from .settings import TO_DICT_GROUPING, TO_DICT_PREFIXES, TO_DICT_POSTFIXES, TO_DICT_SKIP, TO_DICT_MANY_TO_MANY,\
+    TO_DICT_THROUGH_FIELDS, TO_DICT_RELATED_MODES, TO_DICT_CODEGEN, TO_DICT_PROJECTION_CACHE_SIZE
+
+
+PlanField = namedtuple('PlanField', ('field', 'bucket', 'key', 'plugin'))
+
+# the ways of emitting objects met more than once during a graph serialization, see `TO_DICT_REPEATED_OBJECTS`
+REPEATED_OBJECTS_REUSE = 'reuse'
+REPEATED_OBJECTS_REFERENCE = 'reference'
+
+# the ways of emitting related objects, see `TO_DICT_RELATED_MODES` and `TO_DICT_MANY_TO_MANY`
+RELATED_MODE_PK = 'pk'
+RELATED_MODE_NESTED = 'nested'
+RELATED_MODE_SKIP = 'skip'
+RELATED_MODES = (RELATED_MODE_PK, RELATED_MODE_NESTED, RELATED_MODE_SKIP)
+
+
+class ToDictPlan:
+    """
+    Compiled serialization layout of a `ToDictMixin` model.
+
+    The `TO_DICT_*` configuration of a model never changes at runtime, so there is no need to resolve
+    skipping, grouping, prefixes, postfixes and serialization plugins for every serialized instance.
+    A plan is built once per model class and maps every concrete field directly to its output path:
+
+    * `bucket`: the root key of the group, prefix or postfix the field belongs to (`None` for root-level fields)
+    * `key`: the (stripped) key of the field inside its bucket, or on root level
+    * `plugin`: the serialization plugin handling the field, if any
+
+    Use `ToDictMixin._get_to_dict_plan()` to get the (cached) plan of a model.
+    """
+
+    # the projection this plan is restricted to, see `project()`
+    projection = None
+
+    def __init__(self, model):
+        self.model = model
+        # the most recently used projected plans, see `project()`
+        self._projections = OrderedDict()
+        self._projections_lock = threading.Lock()
+        self.projection_cache_size = getattr(model, 'TO_DICT_PROJECTION_CACHE_SIZE', TO_DICT_PROJECTION_CACHE_SIZE)
+
+        # bucket keys in the order they appear in the resulting dictionary
+        self.groups = list(getattr(model, 'TO_DICT_GROUPING', TO_DICT_GROUPING))
+        self.prefixes = [
+            model._clean_prefix(prefix) for prefix in getattr(model, 'TO_DICT_PREFIXES', TO_DICT_PREFIXES)]
+        self.postfixes = [
+            model._clean_postfix(postfix) for postfix in getattr(model, 'TO_DICT_POSTFIXES', TO_DICT_POSTFIXES)]
+        self.buckets = tuple(OrderedDict.fromkeys(self.groups + self.prefixes + self.postfixes))
+
+        fields_to_skip = getattr(model, 'TO_DICT_SKIP', TO_DICT_SKIP)
+        fields = []
+        for field in model._meta.concrete_fields:
+
+            # skipping explicitly specified fields
+            if field.name in fields_to_skip:
+                continue
+
+            plugin = model._get_serialization_plugin(field)
+
+            # handling prefixed fields grouping
+            prefix = model._get_prefix(field.name)
+            if prefix:
+                fields.append(PlanField(
+                    field, model._clean_prefix(prefix), model._remove_prefix(field.name, prefix), plugin))
+                continue
+
+            # handling postfixed fields grouping
+            postfix = model._get_postfix(field.name)
+            if postfix:
+                fields.append(PlanField(
+                    field, model._clean_postfix(postfix), model._remove_postfix(field.name, postfix), plugin))
+                continue
+
+            # handling manually specified field grouping
+            group = model._get_group(field.name)
+            if group:
+                fields.append(PlanField(field, group, field.name, plugin))
+                continue
+
+            fields.append(PlanField(field, None, field.name, plugin))
+
+        self.fields = tuple(fields)
+
+        # relations inspected by the default related fields strategy
+        self.related_fields = tuple(rf for rf in model._meta.get_fields() if rf.is_relation)
+        self.many_to_many = getattr(model, 'TO_DICT_MANY_TO_MANY', TO_DICT_MANY_TO_MANY)
+        self.through_fields = getattr(model, 'TO_DICT_THROUGH_FIELDS', TO_DICT_THROUGH_FIELDS)
+        self.related_modes = getattr(model, 'TO_DICT_RELATED_MODES', TO_DICT_RELATED_MODES)
+
+        # whether the results are built by generated serializer functions, see `codegen`
+        self.codegen = getattr(model, 'TO_DICT_CODEGEN', TO_DICT_CODEGEN)
+        self._serializers = {}
+        # compact record classes by compression arguments, see `records`
+        self._records = {}
+
+        self._compile()
+
+    def _compile(self):
+        # database columns backing the fields, in the same order
+        self.attnames = tuple(f.field.attname for f in self.fields)
+        self.plugin_fields = tuple(f for f in self.fields if f.plugin)
+
+        # (value index, key) pairs of the root-level fields and of the fields of every bucket
+        self._root_entries = tuple((i, f.key) for i, f in enumerate(self.fields) if f.bucket is None)
+        self._bucket_entries = tuple(
+            (bucket, tuple((i, f.key) for i, f in enumerate(self.fields) if f.bucket == bucket),
+             bucket in self.groups, bucket in self.prefixes, bucket in self.postfixes)
+            for bucket in self.buckets)
+
+    def project(self, projection):
+        """
+        Returns a plan restricted to a projection (see `parse_projection`), cached per projection.
+
+        Root keys of the projection select root fields, whole buckets and related objects,
+        nested keys select particular fields inside buckets (or inside related objects, see `get_related_key`).
+        Projections usually come from API clients, so only the `TO_DICT_PROJECTION_CACHE_SIZE` most recently
+        used projected plans are kept.
+        """
+        key = freeze_projection(projection)
+        with self._projections_lock:
+            plan = self._projections.get(key)
+            if plan is not None:
+                self._projections.move_to_end(key)
+                return plan
+
+        plan = copy.copy(self)
+        plan.projection = projection
+        plan._projections = OrderedDict()
+        plan._projections_lock = threading.Lock()
+        # projections come in any number of combinations, so their results are built by `build()`
+        # instead of compiling code for every one of them, see `codegen`
+        plan.codegen = False
+        plan._serializers = {}
+        plan._records = {}
+        plan.fields = tuple(f for f in self.fields if _is_projected(f, projection))
+        plan.buckets = tuple(b for b in self.buckets if b in projection)
+        plan.groups = [b for b in self.groups if b in projection]
+        plan.prefixes = [b for b in self.prefixes if b in projection]
+        plan.postfixes = [b for b in self.postfixes if b in projection]
+        plan.related_fields = tuple(rf for rf in self.related_fields if get_related_key(rf) in projection)
+        plan._compile()
+
+        with self._projections_lock:
+            # another thread may have projected the plan meanwhile, its plan is as good as this one
+            plan = self._projections.setdefault(key, plan)
+            self._projections.move_to_end(key)
+            while len(self._projections) > self.projection_cache_size:
+                self._projections.popitem(last=False)
+        return plan
+
+    def get_paths(self, separator='.'):
+        """
+        Returns output paths of the fields, like `'address.city'` for the fields inside buckets,
+        as (field index, path) pairs in the order of the keys of `build()` results.
+        """
+        paths = [(i, bucket + separator + key) for bucket, entries, _, _, _ in self._bucket_entries
+                 for i, key in entries]
+        paths.extend(self._root_entries)
+        return paths
+
+    def get_related_mode(self, rf, related_modes=None):
+        """
+        Returns the way of emitting the objects of a related field: `related_modes` given for a particular call
+        take precedence over `TO_DICT_RELATED_MODES`; related objects are nested by default,
+        except for many-to-many relations (see `TO_DICT_MANY_TO_MANY`). Unknown modes raise `ValueError`.
+        """
+        key = get_related_key(rf)
+        if related_modes and key in related_modes:
+            return check_related_mode(related_modes[key])
+        if key in self.related_modes:
+            return check_related_mode(self.related_modes[key])
+        return check_related_mode(self.many_to_many) if rf.many_to_many else RELATED_MODE_NESTED
+
+    def build(self, values, compress_fields=True, compress_groups=True, compress_prefixes=True,
+              compress_postfixes=True, compress_empty_groups=False):
+        """
+        Builds a result dictionary out of field values, compressing it on the fly.
+
+        Compression arguments are the same as for `ToDictMixin.to_dict`. Values to be compressed are never
+        inserted and empty buckets are never created, instead of being cleared from the result afterwards:
+
+        * `compress_fields` skips falsy root-level values, and buckets which have no fields at all
+        * `compress_groups`, `compress_prefixes`, `compress_postfixes` skip falsy values inside buckets
+        * `compress_empty_groups` skips empty buckets (and root-level values equal to `{}`)
+
+        :param values: sequence of field values, ordered as `self.fields`
+        :return: python dictionary with the fields placed according to the plan
+        """
+        result = {}
+        for bucket, entries, is_group, is_prefix, is_postfix in self._bucket_entries:
+            if compress_fields and not entries:
+                continue
+            compress = (is_group and compress_groups) or (is_prefix and compress_prefixes) or \
+                (is_postfix and compress_postfixes)
+            bucket_result = {}
+            for index, key in entries:
+                value = values[index]
+                if value or not compress:
+                    bucket_result[key] = value
+            if bucket_result or not compress_empty_groups:
+                result[bucket] = bucket_result
+
+        for index, key in self._root_entries:
+            value = values[index]
+            if compress_fields and not value:
+                continue
+            if compress_empty_groups and isinstance(value, dict) and not value:
+                continue
+            result[key] = value
+        return result
+
+
+class IdentityMap(dict):
+    """
+    Related objects serialized within a graph (or several graphs), keyed by (concrete model, pk) pairs,
+    see `ToDictMixin._related_object_to_dict`.
+
+    Output embedding a reference to an object up the graph depends on the objects around, so it is never reused:
+    `referenced_level` is the index of the highest object up the graph referenced while serializing
+    the current subtree (`None` if there were no references).
+    """
+    referenced_level = None
+
+
+def get_related_key(rf):
+    """Returns the key the default related fields strategy puts a related field's objects under"""
+    if rf.one_to_many or (rf.many_to_many and isinstance(rf, ForeignObjectRel)):
+        return rf.related_name
+    return rf.name
+
+
+def check_related_mode(mode):
+    """Returns a related mode, raising `ValueError` for unknown ones"""
+    if mode not in RELATED_MODES:
+        raise ValueError('Unknown related mode: %s (expected one of: %s)' % (mode, ', '.join(RELATED_MODES)))
+    return mode
+
+
+def get_many_to_many_through(rf):
+    """
+    Returns the through model of a many-to-many relation (either forward or reverse), along with the names
+    of its foreign keys to the relation's model and to the related model.
+    """
+    if isinstance(rf, ForeignObjectRel):
+        return rf.through, rf.field.m2m_reverse_field_name(), rf.field.m2m_field_name()
+    return rf.remote_field.through, rf.m2m_field_name(), rf.m2m_reverse_field_name()
+
+
+def get_nested_related_modes(related_modes, key):
+    """Returns related modes given with dotted keys (like `'orders.customer'`) for the objects under a key"""
+    if not related_modes:
+        return None
+    prefix = key + '.'
+    nested = {k[len(prefix):]: mode for k, mode in related_modes.items() if k.startswith(prefix)}
+    return nested or None
+
+
+def freeze_related_modes(related_modes):
+    """Returns a hashable representation of related modes"""
+    if not related_modes:
+        return None
+    return tuple(sorted(related_modes.items()))
+
+
+def parse_projection(fields):
+    """
+    Parses a projection ("only these fields") into a tree of nested dictionaries.
+
+    Accepts a comma-separated string of dotted paths (`'name,address.city,orders.price'`), an iterable of
+    dotted paths, or an already parsed tree. An empty subtree means "everything under this key".
+
+    :return: projection tree, e.g. `{'name': {}, 'address': {'city': {}}, 'orders': {'price': {}}}`
+    """
+    if isinstance(fields, dict):
+        return fields
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    tree = {}
+    for path in fields:
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for key in path.split('.'):
+            node = node.setdefault(key, {})
+    return tree
+
+
+def freeze_projection(projection):
+    """Returns a hashable representation of a projection tree"""
+    if projection is None:
+        return None
+    return tuple(sorted((key, freeze_projection(subtree)) for key, subtree in projection.items()))
+
+
+def _is_projected(plan_field, projection):
+    if plan_field.bucket is None:
+        return plan_field.key in projection
+    subtree = projection.get(plan_field.bucket)
+    return subtree is not None and (not subtree or plan_field.key in subtree)
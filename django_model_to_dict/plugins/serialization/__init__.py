@@ -1,12 +1,133 @@
+from django.utils.module_loading import import_string
+
+from ... import instrumentation
+
+# instance attribute holding the values serialized by batch-capable plugins, by model field
+BATCH_ATTRIBUTE = '_to_dict_plugin_values'
+
+
 class SerializationPlugin:
+    """
+    Serializes model fields of `field_type` (or the fields accepted by `check_field`).
+
+    Bulk serialization (`to_dicts`, `iter_dicts`, `to_json` of querysets, etc.) may be sped up by overriding
+    the optional hooks:
+
+    * `prepare(field, queryset)` returns the queryset to serialize, e.g. with the prefetches or annotations
+      the plugin relies on
+    * `serialize_field_batch(field, model_instances)` serializes the field for a whole chunk of instances at once,
+      returning the values in the same order; it's called once per field per chunk instead of `serialize_field`
+      (for the fields of the serialized model only, related objects still go through `serialize_field`)
+    """
 
     field_type = None
 
     @classmethod
     def check_field(cls, field):
-        return type(field) == cls.field_type
+        return cls.field_type is not None and isinstance(field, cls.field_type)
 
     @staticmethod
     def serialize_field(field, model_instance):
         raise NotImplementedError
-        
\ No newline at end of file
+
+    @classmethod
+    def serialize_field_batch(cls, field, model_instances):
+        return [cls.serialize_field(field, model_instance) for model_instance in model_instances]
+
+    @classmethod
+    def prepare(cls, field, queryset):
+        return queryset
+
+
+class PluginDispatcher:
+    """
+    Finds serialization plugins for model fields.
+
+    Plugins relying on the default `check_field` are indexed by their `field_type`, so a field is matched
+    with a single lookup per class in its MRO, the most specific field class winning.
+    Plugins with a custom `check_field` are asked in the order they are listed, and take precedence over
+    the indexed plugins listed after them.
+    """
+
+    def __init__(self, plugins):
+        self.plugins = tuple(import_string(plugin) if isinstance(plugin, str) else plugin for plugin in plugins)
+        self.by_field_type = {}
+        self.custom_plugins = []
+        for index, plugin in enumerate(self.plugins):
+            if getattr(plugin.check_field, '__func__', None) is SerializationPlugin.check_field.__func__:
+                self.by_field_type.setdefault(plugin.field_type, (index, plugin))
+            else:
+                self.custom_plugins.append((index, plugin))
+
+    def get_plugin(self, field):
+        """Returns the plugin handling the field, or `None`"""
+        match_index, match = len(self.plugins), None
+        for field_class in type(field).__mro__:
+            if field_class in self.by_field_type:
+                match_index, match = self.by_field_type[field_class]
+                break
+        for index, plugin in self.custom_plugins:
+            if index > match_index:
+                break
+            if plugin.check_field(field):
+                return plugin
+        return match
+
+
+_dispatchers = {}
+
+
+def get_field_plugin(field, plugins):
+    """
+    Returns the first plugin handling the field, or `None`.
+
+    :param field: model field
+    :param plugins: iterable of `SerializationPlugin` subclasses or dotted paths to them
+    """
+    plugins = tuple(plugins)
+    dispatcher = _dispatchers.get(plugins)
+    if dispatcher is None:
+        dispatcher = _dispatchers[plugins] = PluginDispatcher(plugins)
+    return dispatcher.get_plugin(field)
+
+
+def is_batch_capable(plugin):
+    """Whether the plugin overrides `serialize_field_batch`"""
+    batch = getattr(plugin, 'serialize_field_batch', None)
+    default = SerializationPlugin.serialize_field_batch.__func__
+    return batch is not None and getattr(batch, '__func__', None) is not default
+
+
+def prepare_queryset(queryset, plan_fields):
+    """Returns the queryset prepared by the plugins of the plan fields for serialization, see `prepare`"""
+    for field, bucket, key, plugin in plan_fields:
+        if plugin is not None and hasattr(plugin, 'prepare'):
+            queryset = plugin.prepare(field, queryset)
+    return queryset
+
+
+def serialize_batch(instances, plan_fields):
+    """
+    Serializes the fields of batch-capable plugins for a chunk of instances, one `serialize_field_batch` call
+    per field, and keeps the values on the instances for `get_plugin_value`.
+    """
+    stats = instrumentation.active and instrumentation.get_stats()
+    for field, bucket, key, plugin in plan_fields:
+        if plugin is None or not is_batch_capable(plugin):
+            continue
+        started = stats and stats.clock()
+        values = plugin.serialize_field_batch(field, instances)
+        if stats:
+            elapsed = stats.clock() - started
+            stats.plugins[plugin.__name__] += elapsed
+            stats.phases['plugins'] += elapsed
+        for instance, value in zip(instances, values):
+            instance.__dict__.setdefault(BATCH_ATTRIBUTE, {})[field] = value
+
+
+def get_plugin_value(plugin, field, instance):
+    """Returns the field value serialized by the plugin, taken from the batch the instance was serialized in if any"""
+    batch = instance.__dict__.get(BATCH_ATTRIBUTE)
+    if batch is not None and field in batch:
+        return batch[field]
+    return plugin.serialize_field(field, instance)
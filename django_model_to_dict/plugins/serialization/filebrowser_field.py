@@ -1,20 +1,82 @@
 from . import SerializationPlugin
+from django.utils.module_loading import import_string
 from filebrowser.fields import FileBrowseField
 from filebrowser.settings import VERSIONS as FILEBROWSER_VERSIONS
+from ...settings import TO_DICT_FILEBROWSER_VERSIONS_CACHE, TO_DICT_FILEBROWSER_LAZY_VERSIONS
 
 
 class FilebrowserFieldSerializationPlugin(SerializationPlugin):
+    """
+    Serializes django-filebrowser's `FileBrowseField` into a dictionary of the original file URL
+    and URLs of its versions (see filebrowser's `VERSIONS` setting).
+
+    Generating versions touches the storage and may even render images, so version URL maps are cached
+    by file path and modification time in `TO_DICT_FILEBROWSER_VERSIONS_CACHE` (a `django_model_to_dict.cache`
+    backend instance or a dotted path to a backend class, `None` disables caching).
+
+    With `TO_DICT_FILEBROWSER_LAZY_VERSIONS` enabled, version URLs are emitted without generating
+    missing versions at all, leaving it to the storage (or to a separate job) to provide them.
+
+    Use `serialize_field_batch` to serialize the field for a page of objects at once:
+    every distinct file is only resolved once.
+    """
     field_type = FileBrowseField
 
-    @staticmethod
-    def serialize_field(field, model_instance):
+    @classmethod
+    def serialize_field(cls, field, model_instance):
         result = {}
         try:
             file_obj = field.value_from_object(model_instance)
             if file_obj:
                 result['original'] = file_obj.url
-                for version in FILEBROWSER_VERSIONS:
-                    result[version] = file_obj.version_generate(version).url
+                result.update(cls._get_versions(file_obj))
         except FileNotFoundError:
             result['error'] = 'file not found'
         return result
+
+    @classmethod
+    def serialize_field_batch(cls, field, model_instances):
+        """Serializes the field for every instance, resolving versions of every distinct file once"""
+        resolved = {}
+        results = []
+        for model_instance in model_instances:
+            file_obj = field.value_from_object(model_instance)
+            path = file_obj.path if file_obj else None
+            if path not in resolved:
+                resolved[path] = cls.serialize_field(field, model_instance)
+            results.append(dict(resolved[path]))
+        return results
+
+    @classmethod
+    def _get_versions(cls, file_obj):
+        if TO_DICT_FILEBROWSER_LAZY_VERSIONS:
+            storage = file_obj.site.storage
+            return {version: storage.url(file_obj.version_path(version)) for version in FILEBROWSER_VERSIONS}
+
+        cache = _get_versions_cache()
+        if cache is None:
+            return cls._generate_versions(file_obj)
+
+        key = 'to_dict:filebrowser:%s:%s' % (file_obj.path, file_obj.date)
+        versions = cache.get(key)
+        if versions is None:
+            versions = cls._generate_versions(file_obj)
+            cache.set(key, versions)
+        return versions
+
+    @staticmethod
+    def _generate_versions(file_obj):
+        return {version: file_obj.version_generate(version).url for version in FILEBROWSER_VERSIONS}
+
+
+_versions_cache = None
+
+
+def _get_versions_cache():
+    # backends specified with a dotted path are instantiated once
+    global _versions_cache
+    if not isinstance(TO_DICT_FILEBROWSER_VERSIONS_CACHE, str):
+        return TO_DICT_FILEBROWSER_VERSIONS_CACHE
+    if _versions_cache is None:
+        _versions_cache = import_string(TO_DICT_FILEBROWSER_VERSIONS_CACHE)()
+    return _versions_cache
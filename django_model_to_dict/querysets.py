@@ -0,0 +1,411 @@
+import django
+from django.db import models
+from django.db.models import Prefetch, prefetch_related_objects
+
+from . import codegen, instrumentation
+from .plan import get_related_key, get_many_to_many_through, get_nested_related_modes, parse_projection,\
+    REPEATED_OBJECTS_REUSE, RELATED_MODE_PK, RELATED_MODE_NESTED, RELATED_MODE_SKIP, IdentityMap
+from .plugins.serialization import is_batch_capable, prepare_queryset, serialize_batch
+from .settings import TO_DICT_DEPTH, TO_DICT_REPEATED_OBJECTS
+
+
+def to_dicts(queryset, compress_fields=True, compress_groups=True, compress_prefixes=True, compress_postfixes=True,
+             compress_empty_groups=False, inspect_related_objects=True, compress_empty_related_objects=False,
+             chunk_size=None, fields=None, depth=None, repeated_objects=None, related_modes=None):
+    """
+    Serializes every object of a queryset of a `ToDictMixin` model into a python dictionary.
+
+    The output is the same as `[o.to_dict() for o in queryset]`, yet whenever possible the rows are read
+    with `values_list()` over the non-skipped columns only, so no model instances are built at all.
+    Models with serialization plugins, `_to_dict_pre_finish_hook` or related objects to inspect
+    (other than foreign keys emitted as primary keys, see `TO_DICT_RELATED_MODES`) fall back to per-instance
+    `to_dict()` calls. In this case related objects inspected by the default related fields strategy are loaded
+    with `select_related()` and `prefetch_related()` beforehand, so the number of queries doesn't depend
+    on the number of serialized objects.
+
+    Arguments are the same as for `ToDictMixin.to_dict`, plus:
+
+    :param chunk_size: fetch model instances and prefetch their related objects in chunks of this size
+        instead of loading the whole queryset at once (one set of prefetch queries per chunk)
+    :param fields: projection (see `to_dict`), pushed down into the queries: only the projected columns
+        and related objects are fetched
+    :param depth: levels of related objects to inspect (see `to_dict`), all of them are loaded with nested lookups
+    :param repeated_objects: see `to_dict`; when related objects are reused, they are reused across the whole
+        queryset (or across a chunk, with `chunk_size`), so an object related to many serialized objects
+        is serialized once
+
+    :return: list of python dictionaries
+    """
+    return list(iter_dicts(queryset, compress_fields, compress_groups, compress_prefixes, compress_postfixes,
+                           compress_empty_groups, inspect_related_objects, compress_empty_related_objects,
+                           chunk_size, fields, depth, repeated_objects, related_modes))
+
+
+def iter_dicts(queryset, compress_fields=True, compress_groups=True, compress_prefixes=True, compress_postfixes=True,
+               compress_empty_groups=False, inspect_related_objects=True, compress_empty_related_objects=False,
+               chunk_size=None, fields=None, depth=None, repeated_objects=None, related_modes=None):
+    """The same as `to_dicts`, but yields the dictionaries one by one"""
+    model = queryset.model
+    if fields is not None:
+        fields = parse_projection(fields)
+    plan = model._get_to_dict_plan(fields)
+    compression = (compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups)
+    if depth is None:
+        depth = getattr(model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+    if repeated_objects is None:
+        repeated_objects = getattr(model, 'TO_DICT_REPEATED_OBJECTS', TO_DICT_REPEATED_OBJECTS)
+    inspect_related_objects = inspect_related_objects and depth > 0
+
+    if not _can_serialize_values(model, plan, inspect_related_objects, related_modes):
+        if fields is not None:
+            queryset = queryset.only(*_get_loaded_fields(model, plan, inspect_related_objects))
+        instances = _iter_instances(queryset, plan, inspect_related_objects, chunk_size, depth, related_modes)
+        for obj, identity_map in _with_identity_maps(instances, repeated_objects, chunk_size):
+            yield obj.to_dict(*compression, inspect_related_objects=inspect_related_objects,
+                              compress_empty_related_objects=compress_empty_related_objects, fields=fields,
+                              depth=depth, repeated_objects=repeated_objects, related_modes=related_modes,
+                              identity_map=identity_map)
+        return
+
+    # an empty values_list() would select every column
+    rows = queryset.values_list(*plan.attnames) if plan.attnames else queryset.values_list('pk')
+    stats = instrumentation.active and instrumentation.get_stats()
+    serialize = _get_row_serializer(plan, compression)
+    for row in _iterator(rows, chunk_size):
+        if stats:
+            stats.objects += 1
+        yield serialize(row)
+
+
+def prefetch_for_to_dict(queryset, fields=None, depth=None, related_modes=None):
+    """
+    Applies `select_related()` and `prefetch_related()` for the related objects
+    the default related fields strategy of the queryset's model is going to inspect.
+
+    :param fields: projection (see `to_dict`): only the projected related objects are prefetched,
+        loading only the projected fields
+    :param depth: levels of related objects to load (see `to_dict`)
+    :param related_modes: see `to_dict`: related objects emitted as primary keys are not loaded
+    """
+    if depth is None:
+        depth = getattr(queryset.model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+    plan = queryset.model._get_to_dict_plan(fields)
+    select_related, prefetch_related = _get_related_lookups(queryset.model, plan, depth, related_modes)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+def _get_related_lookups(model, plan, depth=1, related_modes=None, prefix='', parent_rf=None, joined=True):
+    """
+    Returns lookups for select_related() and prefetch_related() matching `_default_related_fields_strategy`,
+    nested `depth` levels deep.
+
+    :param related_modes: see `to_dict`
+    :param prefix: lookup path of the model, when nested
+    :param parent_rf: the relation the model was reached through, when nested
+    :param joined: whether the model is reached through `select_related()` joins only
+    """
+    if depth < 1 or hasattr(model, '_to_dict_related_fields_strategy'):
+        # custom strategies may access anything
+        return (), ()
+
+    select_related, prefetch_related = [], []
+    for rf in plan.related_fields:
+        if rf.one_to_many and not rf.related_name:
+            continue
+        if not (rf.one_to_many or rf.many_to_one or rf.one_to_one):
+            continue
+        if parent_rf is not None and not parent_rf.concrete and rf is parent_rf.field:
+            # a foreign key back to the parent object, emitted as a reference without fetching
+            continue
+        key = get_related_key(rf)
+        mode = plan.get_related_mode(rf, related_modes)
+        if mode == RELATED_MODE_SKIP or (mode == RELATED_MODE_PK and rf.concrete):
+            # foreign key values are emitted right from their columns
+            continue
+        lookup = prefix + key
+        if mode == RELATED_MODE_PK and rf.one_to_many:
+            related_model = rf.related_model
+            prefetch_related.append(Prefetch(lookup, queryset=related_model._default_manager.only(
+                related_model._meta.pk.name, rf.field.name)))
+            continue
+
+        projection = plan.projection[key] if plan.projection is not None else None
+        if plan.projection is not None:
+            # the related objects are only loaded with the fields of the nested projection
+            prefetch_related.append(_get_projected_prefetch(rf, projection, lookup, depth))
+        elif joined and (rf.many_to_one or rf.one_to_one):
+            select_related.append(lookup)
+        else:
+            prefetch_related.append(lookup)
+
+        if mode == RELATED_MODE_NESTED and depth > 1 and hasattr(rf.related_model, '_get_to_dict_plan'):
+            nested_select_related, nested_prefetch_related = _get_related_lookups(
+                rf.related_model, rf.related_model._get_to_dict_plan(projection or None), depth - 1,
+                get_nested_related_modes(related_modes, key), lookup + '__', rf, joined and lookup in select_related)
+            select_related.extend(nested_select_related)
+            prefetch_related.extend(nested_prefetch_related)
+    return tuple(select_related), tuple(prefetch_related)
+
+
+def prefetch_many_to_many(instances, plan, depth=1, related_modes=None, parent_rf=None):
+    """
+    Loads the objects related to a batch of instances through many-to-many relations, for every instance
+    of the graph `depth` levels deep, and stores them on the instances for `_default_related_fields_strategy`.
+
+    The other related objects of the graph are expected to be loaded already (see `_get_related_lookups`).
+    """
+    if not instances or depth < 1 or hasattr(plan.model, '_to_dict_related_fields_strategy'):
+        return
+
+    for rf in plan.related_fields:
+        key = get_related_key(rf)
+        if key is None:
+            continue
+        mode = plan.get_related_mode(rf, related_modes)
+        if mode == RELATED_MODE_SKIP:
+            continue
+        if rf.many_to_many:
+            related_items = load_many_to_many(instances, rf, plan, depth, mode, related_modes)
+            for instance in instances:
+                instance.__dict__.setdefault('_to_dict_many_to_many', {})[key] = related_items.get(instance.pk, [])
+            continue
+        if mode != RELATED_MODE_NESTED or depth < 2 or not hasattr(rf.related_model, '_get_to_dict_plan'):
+            continue
+        if parent_rf is not None and not parent_rf.concrete and rf is parent_rf.field:
+            continue
+
+        related_objects = []
+        for instance in instances:
+            if rf.one_to_many:
+                related_objects.extend(getattr(instance, key).all())
+            else:
+                related_object = getattr(instance, key, None)
+                if related_object is not None:
+                    related_objects.append(related_object)
+        projection = plan.projection[key] if plan.projection is not None else None
+        prefetch_many_to_many(related_objects, rf.related_model._get_to_dict_plan(projection or None), depth - 1,
+                              get_nested_related_modes(related_modes, key), rf)
+
+
+def load_many_to_many(instances, rf, plan, depth=1, mode=None, related_modes=None):
+    """
+    Loads the objects related to a batch of instances through a many-to-many relation:
+    with a single query on the through table, plus a single query for the related objects if they are nested.
+
+    :param mode: see `TO_DICT_RELATED_MODES`, resolved by the plan by default
+
+    :return: dictionary mapping primary keys of the instances to lists of
+        (related object pk, related object or `None`, through fields dictionary or `None`) tuples
+    """
+    key = get_related_key(rf)
+    through, source_name, target_name = get_many_to_many_through(rf)
+    source_attname = through._meta.get_field(source_name).attname
+    target_attname = through._meta.get_field(target_name).attname
+    through_fields = tuple(plan.through_fields.get(key, ()))
+
+    rows = through._base_manager.filter(**{source_attname + '__in': [i.pk for i in instances]})\
+        .order_by(through._meta.pk.name).values_list(source_attname, target_attname, *through_fields)
+
+    related_objects = {}
+    if mode is None:
+        mode = plan.get_related_mode(rf, related_modes)
+    if mode == RELATED_MODE_NESTED and hasattr(rf.related_model, '_get_to_dict_plan'):
+        rows = list(rows)
+        related_model = rf.related_model
+        projection = plan.projection[key] if plan.projection is not None else None
+        related_plan = related_model._get_to_dict_plan(projection or None)
+        queryset = related_model._default_manager.filter(pk__in={row[1] for row in rows})
+        if projection:
+            queryset = queryset.only(*_get_loaded_fields(related_model, related_plan, depth > 1))
+        nested_related_modes = get_nested_related_modes(related_modes, key)
+        if depth > 1:
+            # the related objects are serialized further, so the graph below them is loaded as well
+            select_related, prefetch_related = _get_related_lookups(
+                related_model, related_plan, depth - 1, nested_related_modes)
+            queryset = queryset.select_related(*select_related).prefetch_related(*prefetch_related)
+        related_objects = {o.pk: o for o in queryset}
+        prefetch_many_to_many(list(related_objects.values()), related_plan, depth - 1, nested_related_modes, rf)
+
+    related_items = {}
+    for row in rows:
+        related_items.setdefault(row[0], []).append(
+            (row[1], related_objects.get(row[1]), dict(zip(through_fields, row[2:])) if through_fields else None))
+    return related_items
+
+
+def _get_projected_prefetch(rf, projection, lookup=None, depth=1):
+    related_model = rf.related_model
+    if rf.concrete:
+        # forward relations are loaded with the base manager, just like related object descriptors do
+        queryset = related_model._base_manager.all()
+        loaded_fields = {related_model._meta.pk.name}
+    else:
+        queryset = related_model._default_manager.all()
+        loaded_fields = {related_model._meta.pk.name, rf.field.name}
+    if hasattr(related_model, '_get_to_dict_plan'):
+        related_plan = related_model._get_to_dict_plan(projection or None)
+        loaded_fields.update(f.field.name for f in related_plan.fields)
+        if depth > 1:
+            # foreign keys of the objects inspected further
+            loaded_fields.update(nested_rf.name for nested_rf in related_plan.related_fields if nested_rf.concrete)
+        queryset = queryset.only(*loaded_fields)
+    return Prefetch(lookup or get_related_key(rf), queryset=queryset)
+
+
+def _get_loaded_fields(model, plan, inspect_related_objects):
+    """Returns names of the fields to load for a projected plan"""
+    loaded_fields = {model._meta.pk.name}
+    loaded_fields.update(f.field.name for f in plan.fields)
+    if inspect_related_objects:
+        loaded_fields.update(rf.name for rf in plan.related_fields if rf.concrete)
+    return loaded_fields
+
+
+def _iter_instances(queryset, plan, inspect_related_objects, chunk_size, depth=1, related_modes=None):
+    """
+    Yields the instances of a queryset to serialize with a plan, with their related objects loaded
+    and the fields of batch-capable plugins serialized beforehand, chunk by chunk
+    """
+    if plan.plugin_fields:
+        queryset = prepare_queryset(queryset, plan.plugin_fields)
+    batch_fields = tuple(f for f in plan.plugin_fields if is_batch_capable(f.plugin))
+    if not inspect_related_objects and not batch_fields:
+        yield from _iterator(queryset, chunk_size)
+        return
+
+    select_related, prefetch_related = (), ()
+    if inspect_related_objects:
+        select_related, prefetch_related = _get_related_lookups(queryset.model, plan, depth, related_modes)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+
+    def prepare_chunk(chunk, prefetched=False):
+        if inspect_related_objects:
+            if not prefetched:
+                prefetch_related_objects(chunk, *prefetch_related)
+            prefetch_many_to_many(chunk, plan, depth, related_modes)
+        if batch_fields:
+            serialize_batch(chunk, batch_fields)
+
+    if not chunk_size:
+        objects = list(queryset.prefetch_related(*prefetch_related))
+        prepare_chunk(objects, prefetched=True)
+        yield from objects
+        return
+
+    # iterator() ignores prefetch_related(), so the related objects are prefetched chunk by chunk
+    chunk = []
+    for obj in _iterator(queryset, chunk_size):
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            prepare_chunk(chunk)
+            yield from chunk
+            chunk = []
+    if chunk:
+        prepare_chunk(chunk)
+        yield from chunk
+
+
+def _with_identity_maps(instances, repeated_objects, chunk_size):
+    """
+    Yields (instance, identity map) pairs: the related objects serialized for the instances are reused
+    across the whole queryset, or across a chunk when streaming, so the map never outgrows a chunk
+    """
+    # references only make sense within a single object's graph
+    if repeated_objects != REPEATED_OBJECTS_REUSE:
+        for obj in instances:
+            yield obj, None
+        return
+
+    identity_map = IdentityMap()
+    for i, obj in enumerate(instances):
+        if chunk_size and i and not i % chunk_size:
+            identity_map = IdentityMap()
+        yield obj, identity_map
+
+
+def _iterator(queryset, chunk_size):
+    # iterator(chunk_size=...) is only available since Django 2.0
+    if chunk_size and django.VERSION >= (2, 0):
+        return queryset.iterator(chunk_size=chunk_size)
+    return queryset.iterator()
+
+
+def _get_row_serializer(plan, compression):
+    """Returns a function building results out of `values_list()` rows of the plan's attnames"""
+    if plan.codegen:
+        return codegen.get_serializer(plan, compression, values=True)
+    return lambda row: plan.build(row, *compression)
+
+
+def _can_serialize_values(model, plan, inspect_related_objects, related_modes=None):
+    if plan.plugin_fields or hasattr(model, '_to_dict_pre_finish_hook'):
+        return False
+    if not inspect_related_objects:
+        return True
+    if hasattr(model, '_to_dict_related_fields_strategy'):
+        return False
+
+    # foreign keys emitted as primary keys are read from their columns, just like any other field
+    root_keys = {f.key for f in plan.fields if f.bucket is None}
+    for rf in plan.related_fields:
+        key = get_related_key(rf)
+        if key is None:
+            continue
+        mode = plan.get_related_mode(rf, related_modes)
+        if mode == RELATED_MODE_PK and rf.concrete and key in root_keys:
+            continue
+        if mode == RELATED_MODE_SKIP and key not in root_keys:
+            continue
+        return False
+    return True
+
+
+class ToDictQuerySet(models.QuerySet):
+    """
+    QuerySet adding bulk serialization methods for `ToDictMixin` models:
+
+    ```
+    class YourModel(models.Model, ToDictMixin):
+        objects = ToDictQuerySet.as_manager()
+
+    YourModel.objects.filter(...).to_dicts()
+    ```
+    """
+
+    def to_dicts(self, **kwargs):
+        return to_dicts(self, **kwargs)
+
+    def iter_dicts(self, **kwargs):
+        return iter_dicts(self, **kwargs)
+
+    def ato_dicts(self, **kwargs):
+        from .aio import ato_dicts
+        return ato_dicts(self, **kwargs)
+
+    def to_records(self, **kwargs):
+        from .records import to_records
+        return to_records(self, **kwargs)
+
+    def to_columns(self, **kwargs):
+        from .columnar import to_columns
+        return to_columns(self, **kwargs)
+
+    def to_json_lines(self, **kwargs):
+        from .encoding import to_json_lines
+        return to_json_lines(self, **kwargs)
+
+    def to_db_json(self, **kwargs):
+        from .dbjson import to_db_json
+        return to_db_json(self, **kwargs)
+
+    def to_output(self, backend=None, **kwargs):
+        from .output import get_backend
+        return get_backend(self.model, backend).dumps_queryset(self, **kwargs)
+
+    def prefetch_for_to_dict(self, fields=None, depth=None, related_modes=None):
+        return prefetch_for_to_dict(self, fields, depth, related_modes)
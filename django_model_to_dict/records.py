@@ -0,0 +1,258 @@
+"""
+Compact records for large result sets held in memory.
+
+Every `to_dicts` result is a fresh dictionary, with a nested dictionary per bucket (group, prefix or postfix),
+though all the objects of a model share the same keys. `to_records` returns the same output as `to_dicts`
+as `Record` objects instead: read-only mappings holding a single tuple of field values each, with the keys,
+buckets and compression rules kept once, on a record class generated per serialization plan and compression
+arguments. Compressed keys are skipped and buckets are built (as read-only views) when they are accessed.
+
+```
+records = to_records(OrderPosition.objects.all(), inspect_related_objects=False)
+records[0]['price'], records[0].get('order'), dict(records[0])
+cache.set('positions', records)  # records are picklable
+data = [record.to_dict() for record in records]  # plain dictionaries, e.g. to be modified
+```
+
+Records of `values_list()` rows (see `to_dicts`) keep the rows themselves, so they cost a small, fixed-size
+object per serialized object on top of them. Objects serialized with `to_dict()` (models with plugins,
+related objects to inspect, etc.) keep their related objects, and whatever differs from the plan
+(e.g. the changes of `_to_dict_pre_finish_hook`), in a dictionary alongside the values.
+"""
+from collections.abc import Mapping
+
+from django.apps import apps
+
+from . import instrumentation
+from .plan import parse_projection
+from .querysets import _can_serialize_values, _iterator, iter_dicts
+from .settings import TO_DICT_DEPTH
+
+
+class _Missing:
+    """Marks the keys removed from records, pickled as the module-level `MISSING`"""
+
+    def __reduce__(self):
+        return 'MISSING'
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+class BucketView(Mapping):
+    """Read-only view of a bucket (group, prefix or postfix) of a record"""
+    __slots__ = ('_values', '_entries', '_compress')
+
+    def __init__(self, values, entries, compress):
+        self._values = values
+        self._entries = entries
+        self._compress = compress
+
+    def __getitem__(self, key):
+        for index, entry_key in self._entries:
+            if entry_key == key:
+                value = self._values[index]
+                if value or not self._compress:
+                    return value
+                break
+        raise KeyError(key)
+
+    def __iter__(self):
+        values, compress = self._values, self._compress
+        return (key for index, key in self._entries if values[index] or not compress)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self):
+        values, compress = self._values, self._compress
+        return {key: values[index] for index, key in self._entries if values[index] or not compress}
+
+
+class Record(Mapping):
+    """
+    Read-only mapping with the same items as the `to_dict` result of an object, see the module docs.
+
+    Record classes are generated per plan and compression arguments with `get_record_class`.
+    """
+    __slots__ = ('_values', '_extra')
+
+    # layout of the generated classes: the plan and compression arguments, the keys of the plan
+    # in the order of `plan.build()` results, and the value index (root-level fields) or
+    # (entries, compress) pair (buckets) by key
+    _plan = None
+    _compression = None
+    _keys = ()
+    _slots = {}
+
+    def __init__(self, values, extra=None):
+        """
+        :param values: field values, ordered as the plan's fields (e.g. a `values_list()` row of `plan.attnames`)
+        :param extra: root-level items overriding (or removing, with `MISSING` values) the items of the values
+        """
+        self._values = values
+        self._extra = extra
+
+    @classmethod
+    def from_dict(cls, result):
+        """Returns the record of a `to_dict` result of the record class's plan and compression arguments"""
+        values = [None] * len(cls._plan.fields)
+        for key, slot in cls._slots.items():
+            value = result.get(key)
+            if isinstance(slot, int):
+                values[slot] = value
+            elif isinstance(value, dict):
+                for index, entry_key in slot[0]:
+                    values[index] = value.get(entry_key)
+        record = cls(tuple(values))
+
+        # whatever the values don't reproduce, e.g. related objects
+        extra = {}
+        for key in cls._keys:
+            value = record._get(key)
+            if key not in result:
+                if value is not MISSING:
+                    extra[key] = MISSING
+            elif value is MISSING or value != result[key]:
+                extra[key] = result[key]
+        extra.update((key, value) for key, value in result.items() if key not in cls._slots)
+        if extra:
+            record._extra = extra
+        return record
+
+    def _get(self, key):
+        """Returns the value of a key of the plan built out of the values, or `MISSING`"""
+        slot = self._slots.get(key)
+        if slot is None:
+            return MISSING
+        compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups = \
+            self._compression
+        if isinstance(slot, int):
+            value = self._values[slot]
+            if (compress_fields and not value) or (compress_empty_groups and isinstance(value, dict) and not value):
+                return MISSING
+            return value
+        entries, compress = slot
+        bucket = BucketView(self._values, entries, compress)
+        if compress_empty_groups and not bucket:
+            return MISSING
+        return bucket
+
+    def __getitem__(self, key):
+        extra = self._extra
+        value = extra[key] if extra is not None and key in extra else self._get(key)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        extra = self._extra
+        for key in self._keys:
+            if (extra is None or key not in extra) and self._get(key) is not MISSING:
+                yield key
+        if extra is not None:
+            for key, value in extra.items():
+                if value is not MISSING:
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '<%s %r>' % (type(self).__name__, self.to_dict())
+
+    def __reduce__(self):
+        # generated classes can't be imported, so they are looked up again by their plan
+        plan = self._plan
+        return _restore_record, (plan.model._meta.label, plan.projection, self._compression, self._values,
+                                 self._extra)
+
+    def to_dict(self):
+        """Returns the same dictionary as `to_dict` does"""
+        return {key: value.to_dict() if isinstance(value, BucketView) else value for key, value in self.items()}
+
+
+def get_record_class(plan, compression):
+    """
+    Returns the record class of a plan and compression arguments of `to_dict` (compress_fields, compress_groups,
+    compress_prefixes, compress_postfixes, compress_empty_groups), generated once and cached on the plan.
+    """
+    record_class = plan._records.get(compression)
+    if record_class is None:
+        compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups = compression
+        keys, slots = [], {}
+        for bucket, entries, is_group, is_prefix, is_postfix in plan._bucket_entries:
+            if compress_fields and not entries:
+                continue
+            compress = (is_group and compress_groups) or (is_prefix and compress_prefixes) or \
+                (is_postfix and compress_postfixes)
+            keys.append(bucket)
+            slots[bucket] = (entries, compress)
+        for index, key in plan._root_entries:
+            keys.append(key)
+            slots[key] = index
+        record_class = plan._records[compression] = type('%sRecord' % plan.model.__name__, (Record,), {
+            '__slots__': (),
+            '_plan': plan,
+            '_compression': compression,
+            '_keys': tuple(keys),
+            '_slots': slots,
+        })
+    return record_class
+
+
+def to_record(instance, compress_fields=True, compress_groups=True, compress_prefixes=True, compress_postfixes=True,
+              compress_empty_groups=False, fields=None, **kwargs):
+    """Returns the `to_dict` result of an instance as a record, accepting the same arguments"""
+    if fields is not None:
+        fields = parse_projection(fields)
+    compression = (compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups)
+    result = instance.to_dict(*compression, fields=fields, **kwargs)
+    return get_record_class(instance._get_to_dict_plan(fields), compression).from_dict(result)
+
+
+def to_records(queryset, **kwargs):
+    """The same as `querysets.to_dicts`, but returns a list of records, see the module docs"""
+    return list(iter_records(queryset, **kwargs))
+
+
+def iter_records(queryset, compress_fields=True, compress_groups=True, compress_prefixes=True,
+                 compress_postfixes=True, compress_empty_groups=False, inspect_related_objects=True,
+                 compress_empty_related_objects=False, chunk_size=None, fields=None, depth=None,
+                 repeated_objects=None, related_modes=None):
+    """The same as `querysets.iter_dicts`, but yields records, see the module docs"""
+    model = queryset.model
+    if fields is not None:
+        fields = parse_projection(fields)
+    plan = model._get_to_dict_plan(fields)
+    compression = (compress_fields, compress_groups, compress_prefixes, compress_postfixes, compress_empty_groups)
+    record_class = get_record_class(plan, compression)
+    if depth is None:
+        depth = getattr(model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+
+    if not _can_serialize_values(model, plan, inspect_related_objects and depth > 0, related_modes):
+        for result in iter_dicts(queryset, *compression, inspect_related_objects=inspect_related_objects,
+                                 compress_empty_related_objects=compress_empty_related_objects,
+                                 chunk_size=chunk_size, fields=fields, depth=depth,
+                                 repeated_objects=repeated_objects, related_modes=related_modes):
+            yield record_class.from_dict(result)
+        return
+
+    # the rows are the values of the records, as they are
+    rows = queryset.values_list(*plan.attnames) if plan.attnames else queryset.values_list('pk')
+    stats = instrumentation.active and instrumentation.get_stats()
+    for row in _iterator(rows, chunk_size):
+        if stats:
+            stats.objects += 1
+        yield record_class(row)
+
+
+def _restore_record(label, projection, compression, values, extra):
+    plan = apps.get_model(label)._get_to_dict_plan(projection)
+    return get_record_class(plan, compression)(values, extra)
@@ -7,6 +7,24 @@ DEFAULT_PREFIXES = tuple()
 DEFAULT_PREFIX_SEPARATOR = '_'
 DEFAULT_POSTFIXES = tuple()
 DEFAULT_POSTFIX_SEPARATOR = '_'
+DEFAULT_STREAMING_CHUNK_SIZE = 2000
+DEFAULT_CACHE = None
+DEFAULT_CACHE_VERSION = 1
+DEFAULT_FILEBROWSER_VERSIONS_CACHE = 'django_model_to_dict.cache.LRUCacheBackend'
+DEFAULT_FILEBROWSER_LAZY_VERSIONS = False
+DEFAULT_ASYNC_CONCURRENCY = None
+DEFAULT_DEPTH = 1
+DEFAULT_REPEATED_OBJECTS = 'reuse'
+DEFAULT_MANY_TO_MANY = 'pk'
+DEFAULT_THROUGH_FIELDS = {}
+DEFAULT_RELATED_MODES = {}
+DEFAULT_OUTPUT_BACKEND = 'django_model_to_dict.output.DictBackend'
+DEFAULT_CODEGEN = True
+DEFAULT_CODEGEN_MODULE = None
+DEFAULT_PROJECTION_CACHE_SIZE = 128
+DEFAULT_SNAPSHOTS = False
+DEFAULT_SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_ARGUMENTS = {}
 
 TO_DICT_SERIALIZATION_PLUGINS = getattr(settings, 'TO_DICT_SERIALIZATION_PLUGINS', DEFAULT_SERIALIZATION_PLUGINS)
 TO_DICT_SKIP = getattr(settings, 'TO_DICT_SKIP', DEFAULT_SKIP)
@@ -14,4 +32,24 @@ TO_DICT_GROUPING = getattr(settings, 'TO_DICT_GROUPING', DEFAULT_GROUPING)
 TO_DICT_PREFIXES = getattr(settings, 'TO_DICT_PREFIXES', DEFAULT_PREFIXES)
 TO_DICT_PREFIX_SEPARATOR = getattr(settings, 'TO_DICT_PREFIX_SEPARATOR', DEFAULT_PREFIX_SEPARATOR)
 TO_DICT_POSTFIXES = getattr(settings, 'TO_DICT_POSTFIXES', DEFAULT_POSTFIXES)
-TO_DICT_POSTFIX_SEPARATOR = getattr(settings, 'TO_DICT_POSTFIX_SEPARATOR', DEFAULT_POSTFIX_SEPARATOR)
\ No newline at end of file
+TO_DICT_POSTFIX_SEPARATOR = getattr(settings, 'TO_DICT_POSTFIX_SEPARATOR', DEFAULT_POSTFIX_SEPARATOR)
+TO_DICT_STREAMING_CHUNK_SIZE = getattr(settings, 'TO_DICT_STREAMING_CHUNK_SIZE', DEFAULT_STREAMING_CHUNK_SIZE)
+TO_DICT_CACHE = getattr(settings, 'TO_DICT_CACHE', DEFAULT_CACHE)
+TO_DICT_CACHE_VERSION = getattr(settings, 'TO_DICT_CACHE_VERSION', DEFAULT_CACHE_VERSION)
+TO_DICT_FILEBROWSER_VERSIONS_CACHE = getattr(settings, 'TO_DICT_FILEBROWSER_VERSIONS_CACHE',
+                                             DEFAULT_FILEBROWSER_VERSIONS_CACHE)
+TO_DICT_FILEBROWSER_LAZY_VERSIONS = getattr(settings, 'TO_DICT_FILEBROWSER_LAZY_VERSIONS',
+                                            DEFAULT_FILEBROWSER_LAZY_VERSIONS)
+TO_DICT_ASYNC_CONCURRENCY = getattr(settings, 'TO_DICT_ASYNC_CONCURRENCY', DEFAULT_ASYNC_CONCURRENCY)
+TO_DICT_DEPTH = getattr(settings, 'TO_DICT_DEPTH', DEFAULT_DEPTH)
+TO_DICT_REPEATED_OBJECTS = getattr(settings, 'TO_DICT_REPEATED_OBJECTS', DEFAULT_REPEATED_OBJECTS)
+TO_DICT_MANY_TO_MANY = getattr(settings, 'TO_DICT_MANY_TO_MANY', DEFAULT_MANY_TO_MANY)
+TO_DICT_THROUGH_FIELDS = getattr(settings, 'TO_DICT_THROUGH_FIELDS', DEFAULT_THROUGH_FIELDS)
+TO_DICT_RELATED_MODES = getattr(settings, 'TO_DICT_RELATED_MODES', DEFAULT_RELATED_MODES)
+TO_DICT_OUTPUT_BACKEND = getattr(settings, 'TO_DICT_OUTPUT_BACKEND', DEFAULT_OUTPUT_BACKEND)
+TO_DICT_CODEGEN = getattr(settings, 'TO_DICT_CODEGEN', DEFAULT_CODEGEN)
+TO_DICT_CODEGEN_MODULE = getattr(settings, 'TO_DICT_CODEGEN_MODULE', DEFAULT_CODEGEN_MODULE)
+TO_DICT_PROJECTION_CACHE_SIZE = getattr(settings, 'TO_DICT_PROJECTION_CACHE_SIZE', DEFAULT_PROJECTION_CACHE_SIZE)
+TO_DICT_SNAPSHOTS = getattr(settings, 'TO_DICT_SNAPSHOTS', DEFAULT_SNAPSHOTS)
+TO_DICT_SNAPSHOT_VERSION = getattr(settings, 'TO_DICT_SNAPSHOT_VERSION', DEFAULT_SNAPSHOT_VERSION)
+TO_DICT_SNAPSHOT_ARGUMENTS = getattr(settings, 'TO_DICT_SNAPSHOT_ARGUMENTS', DEFAULT_SNAPSHOT_ARGUMENTS)
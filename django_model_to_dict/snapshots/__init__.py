@@ -0,0 +1,7 @@
+"""
+Snapshot store: `to_dict` payloads of `ToDictMixin` models, precomputed as JSON when the objects are saved.
+
+Add `'django_model_to_dict.snapshots'` to `INSTALLED_APPS` and enable snapshots for a model
+with `TO_DICT_SNAPSHOTS = True`, see `django_model_to_dict.snapshots.store`.
+"""
+default_app_config = 'django_model_to_dict.snapshots.apps.SnapshotsConfig'
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.db.models.signals import class_prepared
+
+
+class SnapshotsConfig(AppConfig):
+    name = 'django_model_to_dict.snapshots'
+    label = 'to_dict_snapshots'
+    verbose_name = 'to_dict snapshots'
+
+    def ready(self):
+        # saving objects costs nothing extra unless some model keeps snapshots
+        from . import store
+        if store.is_used():
+            store.connect_signals()
+        class_prepared.connect(store.on_class_prepared, dispatch_uid='django_model_to_dict.snapshots.class_prepared')
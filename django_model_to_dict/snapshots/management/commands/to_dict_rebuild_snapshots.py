@@ -0,0 +1,22 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from django_model_to_dict.settings import TO_DICT_STREAMING_CHUNK_SIZE
+from django_model_to_dict.snapshots.store import is_enabled, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds `to_dict` snapshots, see `TO_DICT_SNAPSHOTS`'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', metavar='app_label.Model',
+                            help='models to rebuild snapshots of (all the models with snapshots by default)')
+        parser.add_argument('--chunk-size', type=int, default=TO_DICT_STREAMING_CHUNK_SIZE,
+                            help='number of objects serialized at once')
+
+    def handle(self, models, chunk_size, **options):
+        models = [apps.get_model(model) for model in models] or [model for model in apps.get_models()
+                                                                 if is_enabled(model)]
+        for model in models:
+            count = rebuild(model, chunk_size)
+            self.stdout.write('Rebuilt %d snapshots of %s' % (count, model._meta.label))
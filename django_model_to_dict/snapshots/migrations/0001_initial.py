@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Snapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='model')),
+                ('version', models.PositiveIntegerField(verbose_name='version')),
+                ('object_pk', models.CharField(max_length=255, verbose_name='object pk')),
+                ('payload', models.TextField(verbose_name='payload')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+            ],
+            options={
+                'verbose_name': 'Snapshot',
+                'verbose_name_plural': 'Snapshots',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='snapshot',
+            unique_together=set([('model', 'version', 'object_pk')]),
+        ),
+    ]
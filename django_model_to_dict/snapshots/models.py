@@ -0,0 +1,17 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+
+class Snapshot(models.Model):
+    """Precomputed `to_dict` payload of an object, as JSON, see `django_model_to_dict.snapshots.store`"""
+
+    class Meta:
+        verbose_name = _('Snapshot')
+        verbose_name_plural = _('Snapshots')
+        unique_together = ('model', 'version', 'object_pk')
+
+    model = models.CharField(max_length=100, verbose_name=_('model'))
+    version = models.PositiveIntegerField(verbose_name=_('version'))
+    object_pk = models.CharField(max_length=255, verbose_name=_('object pk'))
+    payload = models.TextField(verbose_name=_('payload'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('updated at'))
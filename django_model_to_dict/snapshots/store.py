@@ -0,0 +1,204 @@
+"""
+Snapshots: `to_dict` payloads precomputed when the objects are saved, for read-mostly models.
+
+With `TO_DICT_SNAPSHOTS = True` (globally or per model), the JSON of every object of a `ToDictMixin` model
+is kept in the `Snapshot` table, per primary key and `TO_DICT_SNAPSHOT_VERSION`. Snapshots are refreshed
+by `post_save`, `post_delete` and `m2m_changed` signals, along with the snapshots of the objects embedding
+the changed one as a related object (e.g. saving a `Product` refreshes the `OrderPosition` objects pointing to it,
+and moving an `OrderPosition` to another `Order` refreshes both orders),
+and rebuilt in bulk by the `to_dict_rebuild_snapshots` management command.
+
+Reading them is a single query, with the payloads selected by an indexed subquery right along the objects:
+
+```
+payloads = iter_snapshots(Product.objects.filter(...))  # JSON text per product
+response = HttpResponse(to_snapshot_json(Product.objects.all()), content_type='application/json')
+```
+
+Payloads are built with `TO_DICT_SNAPSHOT_ARGUMENTS`, the `to_dict` arguments (none by default).
+Bump `TO_DICT_SNAPSHOT_VERSION` whenever the serialization of a model changes, and rebuild its snapshots.
+Objects saved in bulk, bypassing the signals (`QuerySet.update()`, `bulk_create()`), aren't refreshed,
+and missing snapshots are built on the fly when read.
+Payloads are always serialized afresh, bypassing the `TO_DICT_CACHE` output cache.
+
+The receivers are only connected once a model keeps snapshots (on app ready, or when such a model is defined
+later), so saving objects costs nothing extra otherwise.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Expression, TextField
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .. import cache
+from ..cache import _get_dependencies, get_cleared_pks, get_previous_dependents, remember_cleared_objects, \
+    remember_previous_dependents
+from ..encoding import to_json_bytes
+from ..querysets import _iter_instances, _iterator
+from ..settings import TO_DICT_DEPTH, TO_DICT_SNAPSHOTS, TO_DICT_SNAPSHOT_ARGUMENTS, TO_DICT_SNAPSHOT_VERSION,\
+    TO_DICT_STREAMING_CHUNK_SIZE
+from .models import Snapshot
+
+# the name of the annotation snapshots are selected as
+ANNOTATION = '_to_dict_snapshot'
+
+# types primary keys are cast to, to be compared with `Snapshot.object_pk`
+CAST_TYPES = {
+    'postgresql': 'varchar',
+    'mysql': 'char',
+}
+
+_signals_connected = False
+
+
+def is_enabled(model):
+    """Whether snapshots are kept for the model, see `TO_DICT_SNAPSHOTS`"""
+    return hasattr(model, 'to_dict') and getattr(model, 'TO_DICT_SNAPSHOTS', TO_DICT_SNAPSHOTS)
+
+
+def is_used():
+    """Whether snapshots are enabled for any of the installed models"""
+    return any(is_enabled(model) for model in apps.get_models())
+
+
+def get_version(model):
+    return getattr(model, 'TO_DICT_SNAPSHOT_VERSION', TO_DICT_SNAPSHOT_VERSION)
+
+
+class SnapshotPayload(Expression):
+    """SQL expression selecting the snapshot of a row of a model (`NULL` if there's none), as text"""
+
+    def __init__(self, model):
+        super(SnapshotPayload, self).__init__(output_field=TextField())
+        self.model = model
+
+    def as_sql(self, compiler, connection):
+        quote_name = compiler.quote_name_unless_alias
+        opts = Snapshot._meta
+        column = '%s.%s' % (quote_name(compiler.query.get_initial_alias()), quote_name(self.model._meta.pk.column))
+        sql = '(SELECT %s FROM %s WHERE %s = %%s AND %s = %%s AND %s = CAST(%s AS %s))' % (
+            quote_name(opts.get_field('payload').column), quote_name(opts.db_table),
+            quote_name(opts.get_field('model').column), quote_name(opts.get_field('version').column),
+            quote_name(opts.get_field('object_pk').column), column, CAST_TYPES.get(connection.vendor, 'text'))
+        return sql, [self.model._meta.label_lower, get_version(self.model)]
+
+
+def refresh(model, pks, chunk_size=None):
+    """
+    Builds and stores the snapshots of the model's objects, deleting the snapshots of the objects which don't exist.
+
+    :return: dictionary mapping primary keys of the existing objects to their payloads
+    """
+    pks = list(pks)
+    if not pks:
+        return {}
+    label, version = model._meta.label_lower, get_version(model)
+    arguments = dict(getattr(model, 'TO_DICT_SNAPSHOT_ARGUMENTS', TO_DICT_SNAPSHOT_ARGUMENTS))
+    depth = arguments.get('depth')
+    if depth is None:
+        depth = getattr(model, 'TO_DICT_DEPTH', TO_DICT_DEPTH)
+    plan = model._get_to_dict_plan(arguments.get('fields'))
+    inspect_related_objects = arguments.get('inspect_related_objects', True) and depth > 0
+
+    queryset = model._default_manager.filter(pk__in=pks)
+    payloads = {}
+    # the output cache may still hold the objects' previous output, as the snapshot and cache receivers
+    # of the same signal run in no particular order
+    with cache.bypass():
+        for obj in _iter_instances(queryset, plan, inspect_related_objects, chunk_size, depth,
+                                   arguments.get('related_modes')):
+            payloads[obj.pk] = to_json_bytes(obj, **arguments).decode('utf-8')
+
+    with transaction.atomic(using=Snapshot.objects.db):
+        Snapshot.objects.filter(model=label, version=version, object_pk__in=[str(pk) for pk in pks]).delete()
+        Snapshot.objects.bulk_create([
+            Snapshot(model=label, version=version, object_pk=str(pk), payload=payload)
+            for pk, payload in payloads.items()])
+    return payloads
+
+
+def refresh_instance(instance):
+    """Refreshes the snapshot of the instance, and the snapshots of the objects embedding it"""
+    model = type(instance)
+    if is_enabled(model):
+        refresh(model, [instance.pk])
+    for dependent_model, get_pks in _get_dependencies().get(model, ()):
+        if is_enabled(dependent_model):
+            refresh(dependent_model, get_pks(instance))
+    # the objects the instance was moved away from (e.g. the previous order of an order position)
+    for dependent_model, pks in get_previous_dependents(instance):
+        if is_enabled(dependent_model):
+            refresh(dependent_model, pks)
+
+
+def rebuild(model, chunk_size=TO_DICT_STREAMING_CHUNK_SIZE):
+    """
+    Rebuilds the snapshots of all the objects of the model, chunk by chunk,
+    deleting the snapshots of the other versions and of the objects which don't exist anymore.
+
+    :return: the number of built snapshots
+    """
+    started = timezone.now()
+    pks = list(model._default_manager.order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(pks), chunk_size):
+        refresh(model, pks[i:i + chunk_size])
+    Snapshot.objects.filter(model=model._meta.label_lower, updated_at__lt=started).delete()
+    return len(pks)
+
+
+def iter_snapshots(queryset, chunk_size=None):
+    """
+    Yields the JSON (text) of every object of a queryset, read from its snapshot with the objects themselves.
+    Missing snapshots are built and stored on the fly.
+    """
+    model = queryset.model
+    rows = queryset.annotate(**{ANNOTATION: SnapshotPayload(model)}).values_list('pk', ANNOTATION)
+    for pk, payload in _iterator(rows, chunk_size):
+        if payload is None:
+            payload = refresh(model, [pk]).get(pk)
+            if payload is None:
+                continue
+        yield payload
+
+
+def to_snapshot_json(queryset, **kwargs):
+    """Returns the JSON array of the objects of a queryset as bytes, read from their snapshots"""
+    return ('[' + ','.join(iter_snapshots(queryset, **kwargs)) + ']').encode('utf-8')
+
+
+def connect_signals():
+    """Connects the refreshing receivers, see `SnapshotsConfig.ready()`"""
+    global _signals_connected
+    if _signals_connected:
+        return
+    # shared with the output cache, connected once by whichever connects it first
+    pre_save.connect(remember_previous_dependents, dispatch_uid='django_model_to_dict.cache.pre_save')
+    m2m_changed.connect(remember_cleared_objects, dispatch_uid='django_model_to_dict.cache.pre_clear')
+    post_save.connect(_on_change, dispatch_uid='django_model_to_dict.snapshots.post_save')
+    post_delete.connect(_on_change, dispatch_uid='django_model_to_dict.snapshots.post_delete')
+    m2m_changed.connect(_on_m2m_change, dispatch_uid='django_model_to_dict.snapshots.m2m_changed')
+    _signals_connected = True
+
+
+def on_class_prepared(sender, **kwargs):
+    """`class_prepared` receiver connecting the signals for models with snapshots defined after the apps are ready"""
+    if not _signals_connected and is_enabled(sender):
+        connect_signals()
+
+
+def _on_change(sender, instance, raw=False, **kwargs):
+    # fixtures are loaded as they are, without the related objects possibly loaded after them
+    if raw or sender is Snapshot:
+        return
+    if is_enabled(sender) or sender in _get_dependencies():
+        refresh_instance(instance)
+
+
+def _on_m2m_change(sender, instance, action, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    _on_change(type(instance), instance)
+    if action == 'post_clear':
+        pk_set = get_cleared_pks(instance, sender)
+    if pk_set and is_enabled(model):
+        refresh(model, pk_set)
@@ -0,0 +1,49 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .querysets import iter_dicts
+from .settings import TO_DICT_STREAMING_CHUNK_SIZE
+
+
+def stream_json(queryset, chunk_size=TO_DICT_STREAMING_CHUNK_SIZE, encoder_class=DjangoJSONEncoder, **kwargs):
+    """
+    Serializes a queryset of a `ToDictMixin` model into a JSON array, yielding it as text chunks.
+
+    The objects are fetched and serialized `chunk_size` at a time (see `querysets.iter_dicts`),
+    so at most a single chunk of objects is kept in memory.
+
+    :param queryset: queryset of a `ToDictMixin` model
+    :param chunk_size: number of objects per yielded chunk
+    :param encoder_class: JSON encoder class
+    :param kwargs: `to_dict` arguments
+
+    :return: generator of JSON text chunks
+    """
+    opening = '['
+    for chunk in _iter_encoded_chunks(queryset, chunk_size, encoder_class, kwargs):
+        yield opening + ','.join(chunk)
+        opening = ','
+    yield '[]' if opening == '[' else ']'
+
+
+def stream_json_lines(queryset, chunk_size=TO_DICT_STREAMING_CHUNK_SIZE, encoder_class=DjangoJSONEncoder, **kwargs):
+    """The same as `stream_json`, but yields JSON Lines (one serialized object per line) instead of an array"""
+    for chunk in _iter_encoded_chunks(queryset, chunk_size, encoder_class, kwargs):
+        yield '\n'.join(chunk) + '\n'
+
+
+def streaming_json_response(queryset, chunk_size=TO_DICT_STREAMING_CHUNK_SIZE, **kwargs):
+    """Returns a `StreamingHttpResponse` with a JSON array of serialized queryset objects"""
+    return StreamingHttpResponse(stream_json(queryset, chunk_size, **kwargs), content_type='application/json')
+
+
+def _iter_encoded_chunks(queryset, chunk_size, encoder_class, to_dict_kwargs):
+    encode = encoder_class(separators=(',', ':')).encode
+    chunk = []
+    for result in iter_dicts(queryset, chunk_size=chunk_size, **to_dict_kwargs):
+        chunk.append(encode(result))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -18,6 +18,7 @@ try:
             "django.contrib.contenttypes",
             "django.contrib.sites",
             "django_model_to_dict",
+            "django_model_to_dict.snapshots",
         ],
         SITE_ID=1,
         MIDDLEWARE_CLASSES=(),
@@ -53,6 +53,14 @@ setup(
     url='https://github.com/gbezyuk/django-model-to-dict',
     packages=[
         'django_model_to_dict',
+        'django_model_to_dict.management',
+        'django_model_to_dict.management.commands',
+        'django_model_to_dict.snapshots',
+        'django_model_to_dict.snapshots.migrations',
+        'django_model_to_dict.snapshots.management',
+        'django_model_to_dict.snapshots.management.commands',
+        'django_model_to_dict.plugins',
+        'django_model_to_dict.plugins.serialization',
     ],
     include_package_data=True,
     install_requires=[],
@@ -69,7 +77,7 @@ setup(
         'Programming Language :: Python :: 2',
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.6',
     ],
 )
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_aio
+------------
+
+Tests for `django-model-to-dict` asynchronous serialization.
+"""
+
+import asyncio
+
+from django.test import TransactionTestCase
+from django_model_to_dict.aio import ato_dicts
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product
+from django_model_to_dict.querysets import to_dicts
+
+
+class AsyncSerializationTestCase(TransactionTestCase):
+    def setUp(self):
+        customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                           email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+                                           address_country="Ukraine", address_street="Tarasa Shevchenko")
+        product = Product.objects.create(name='Apple', price=10)
+        for i in range(3):
+            order = Order.objects.create(customer=customer)
+            OrderPosition.objects.create(order=order, product=product, price=product.price, quantity=i + 1)
+
+    def run_async(self, coroutine):
+        return asyncio.get_event_loop().run_until_complete(coroutine)
+
+    def test_ato_dict(self):
+        order = Order.objects.first()
+        self.assertEqual(self.run_async(order.ato_dict()), order.to_dict())
+        self.assertEqual(self.run_async(order.ato_dict(fields='customer.name')), order.to_dict(fields='customer.name'))
+
+    def test_ato_dicts(self):
+        self.assertEqual(self.run_async(ato_dicts(Order.objects.all())), to_dicts(Order.objects.all()))
+        self.assertEqual(self.run_async(ato_dicts(Product.objects.all(), inspect_related_objects=False)),
+                         to_dicts(Product.objects.all(), inspect_related_objects=False))
+
+    def test_ato_dicts_graph_arguments(self):
+        """Depth, repeated objects and related modes are the same as with `to_dicts`"""
+        for kwargs in ({'depth': 2}, {'depth': 2, 'repeated_objects': 'reference'},
+                       {'related_modes': {'customer': 'pk', 'order_positions': 'skip'}}, {'depth': 0}):
+            self.assertEqual(self.run_async(ato_dicts(Order.objects.order_by('pk'), chunk_size=2, **kwargs)),
+                             to_dicts(Order.objects.order_by('pk'), **kwargs))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cache
+------------
+
+Tests for `django-model-to-dict` output caching.
+"""
+
+from unittest import mock
+
+from django.apps import apps
+from django.db import models
+from django.db.models.signals import post_save
+from django.test import TestCase
+from django_model_to_dict import cache
+from django_model_to_dict.cache import LRUCacheBackend
+from django_model_to_dict.mixins import ToDictMixin
+from django_model_to_dict.models import Customer, Order, Product
+
+
+class CatalogItem(models.Model, ToDictMixin):
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        app_label = 'django_model_to_dict'
+
+
+class Catalog(models.Model, ToDictMixin):
+    # a many-to-many relation with an auto-created through model
+    items = models.ManyToManyField(CatalogItem, related_name='catalogs')
+
+    class Meta:
+        app_label = 'django_model_to_dict'
+
+
+class LRUCacheBackendTestCase(TestCase):
+    def test_size_bound(self):
+        backend = LRUCacheBackend(max_size=2)
+        backend.set('a', {'a': 1})
+        backend.set('b', {'b': 2})
+        backend.get('a')
+        backend.set('c', {'c': 3})
+        self.assertEqual(backend.get('a'), {'a': 1})
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('c'), {'c': 3})
+
+
+class ToDictCacheTestCase(TestCase):
+    def setUp(self):
+        self.backend = LRUCacheBackend()
+        self.customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                                email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+                                                address_country="Ukraine", address_street="Tarasa Shevchenko")
+        self.product = Product.objects.create(name='Apple', price=10)
+
+    def test_output_is_cached(self):
+        """Cached output is keyed by to_dict arguments and is returned without touching the instance"""
+        with mock.patch.object(Product, 'TO_DICT_CACHE', self.backend, create=True):
+            product = Product.objects.get()
+            self.assertEqual(product.to_dict(inspect_related_objects=False),
+                             {'id': product.id, 'name': 'Apple', 'price': 10})
+            # modifying an instance without saving it doesn't invalidate the cache
+            product.name = 'Pear'
+            self.assertEqual(product.to_dict(inspect_related_objects=False)['name'], 'Apple')
+            self.assertEqual(product.to_dict()['name'], 'Pear')
+
+    def test_invalidation_on_save_and_delete(self):
+        with mock.patch.object(Product, 'TO_DICT_CACHE', self.backend, create=True):
+            product = Product.objects.get()
+            product.to_dict()
+            product.name = 'Pear'
+            product.save()
+            self.assertEqual(Product.objects.get().to_dict()['name'], 'Pear')
+            pk = product.pk
+            product.delete()
+            product.pk = pk
+            self.assertEqual(product.to_dict()['name'], 'Pear')
+            self.assertEqual(len(self.backend._data), 1)
+
+    def test_embedding_objects_invalidation(self):
+        """Objects embedding the saved one through related fields are invalidated too"""
+        with mock.patch.object(Customer, 'TO_DICT_CACHE', self.backend, create=True), \
+                mock.patch.object(Order, 'TO_DICT_CACHE', self.backend, create=True):
+            self.assertEqual(self.customer.to_dict()['orders'], [])
+            order = Order.objects.create(customer=self.customer)
+            self.assertEqual(len(Customer.objects.get().to_dict()['orders']), 1)
+
+            self.assertNotIn('nickname', order.to_dict()['customer'])
+            self.customer.nickname = 'Super'
+            self.customer.save()
+            self.assertEqual(Order.objects.get().to_dict()['customer']['nickname'], 'Super')
+
+    def test_moved_objects_invalidation(self):
+        """Objects a saved one used to be embedded in are invalidated too"""
+        other_customer = Customer.objects.create(first_name="Ivan", last_name="Urgant")
+        with mock.patch.object(Customer, 'TO_DICT_CACHE', self.backend, create=True):
+            order = Order.objects.create(customer=self.customer)
+            self.assertEqual(len(Customer.objects.get(pk=self.customer.pk).to_dict()['orders']), 1)
+            self.assertEqual(Customer.objects.get(pk=other_customer.pk).to_dict()['orders'], [])
+
+            order.customer = other_customer
+            order.save()
+            self.assertEqual(Customer.objects.get(pk=self.customer.pk).to_dict()['orders'], [])
+            self.assertEqual(len(Customer.objects.get(pk=other_customer.pk).to_dict()['orders']), 1)
+
+    def test_cleared_relations_invalidation(self):
+        """Objects removed from a many-to-many relation with clear() are invalidated, from either side"""
+        item, other_item = CatalogItem.objects.create(name='Apple'), CatalogItem.objects.create(name='Pear')
+        catalog = Catalog.objects.create()
+        catalog.items.add(item, other_item)
+        with mock.patch.object(CatalogItem, 'TO_DICT_CACHE', self.backend, create=True), \
+                mock.patch.object(Catalog, 'TO_DICT_CACHE', self.backend, create=True):
+            self.assertEqual(item.to_dict()['catalogs'], [catalog.pk])
+            self.assertEqual(len(catalog.to_dict()['items']), 2)
+
+            catalog.items.clear()
+            self.assertEqual(CatalogItem.objects.get(pk=item.pk).to_dict()['catalogs'], [])
+            self.assertEqual(CatalogItem.objects.get(pk=other_item.pk).to_dict()['catalogs'], [])
+
+            catalog.items.add(item)
+            self.assertEqual(Catalog.objects.get().to_dict()['items'], [item.pk])
+            item.catalogs.clear()
+            self.assertEqual(Catalog.objects.get().to_dict()['items'], [])
+
+    def test_signals_connected_on_ready(self):
+        """Processes which only save objects invalidate cached output as well"""
+        with mock.patch.object(Product, 'TO_DICT_CACHE', self.backend, create=True), \
+                mock.patch.object(cache, '_signals_connected', False):
+            post_save.disconnect(dispatch_uid='django_model_to_dict.cache.post_save')
+            apps.get_app_config('django_model_to_dict').ready()
+            self.assertTrue(cache._signals_connected)
+
+            cache.set_cached(self.backend, self.product, ('arguments',), {'name': 'Apple'})
+            self.product.save()
+            self.assertEqual(self.backend._data, {})
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_codegen
+------------
+
+Tests for `django-model-to-dict` generated serializers.
+"""
+import itertools
+import os
+import shutil
+import tempfile
+from importlib.util import module_from_spec, spec_from_file_location
+
+from django.core.management import call_command
+from django.db import models
+from django.test import TestCase
+from django.utils.six import StringIO
+from django_model_to_dict import codegen
+from django_model_to_dict.models import Customer
+from django_model_to_dict.plugins.serialization import SerializationPlugin
+from django_model_to_dict.querysets import to_dicts
+
+
+class UpperCasePlugin(SerializationPlugin):
+    field_type = models.CharField
+
+    @staticmethod
+    def serialize_field(field, model_instance):
+        value = field.value_from_object(model_instance)
+        return value and value.upper()
+
+
+class PluginCustomer(Customer):
+    TO_DICT_SERIALIZATION_PLUGINS = (UpperCasePlugin,)
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class GenericCustomer(Customer):
+    TO_DICT_CODEGEN = False
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class CodegenTestCase(TestCase):
+
+    def setUp(self):
+        Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55", has_superpowers=True,
+                                address_country="Ukraine", address_city="Kyiv")
+        self.customer = PluginCustomer.objects.get()
+
+    def test_same_as_plan(self):
+        """Generated serializers return the same dictionaries as the plan, for every compression"""
+        for model in (Customer, PluginCustomer):
+            plan = model._get_to_dict_plan()
+            instance = model.objects.get()
+            row = model.objects.values_list(*plan.attnames).get()
+            values = [plugin and plugin.serialize_field(field, instance) or field.value_from_object(instance)
+                      for field, bucket, key, plugin in plan.fields]
+            for compression in itertools.product((True, False), repeat=5):
+                expected = plan.build(values, *compression)
+                result = codegen.get_serializer(plan, compression)(instance)
+                self.assertEqual(list(result.items()), list(expected.items()))
+                if not plan.plugin_fields:
+                    result = codegen.get_serializer(plan, compression, values=True)(row)
+                    self.assertEqual(list(result.items()), list(expected.items()))
+
+    def test_to_dict(self):
+        """`to_dict` uses the generated serializers unless they are disabled"""
+        plan = PluginCustomer._get_to_dict_plan()
+        self.assertEqual(self.customer.to_dict(inspect_related_objects=False)['name'],
+                         {'first': "IVO", 'last': "BOBUL"})
+        self.assertIn((codegen.DEFAULT_COMPRESSION, False), plan._serializers)
+
+        customer = GenericCustomer.objects.get()
+        self.assertEqual(customer.to_dict(inspect_related_objects=False),
+                         Customer.objects.get().to_dict(inspect_related_objects=False))
+        self.assertEqual(GenericCustomer._get_to_dict_plan()._serializers, {})
+
+    def test_projection(self):
+        """Projected plans are built with the generic code, no serializers are compiled for them"""
+        result = self.customer.to_dict(fields='name.first,has_superpowers')
+        self.assertEqual(result, {'name': {'first': "IVO"}, 'has_superpowers': True})
+        self.assertEqual(PluginCustomer._get_to_dict_plan('name.first,has_superpowers')._serializers, {})
+
+        # values_list() rows of projected plans, too
+        self.assertEqual(to_dicts(Customer.objects.all(), fields='name.first,has_superpowers'),
+                         [{'name': {'first': "Ivo"}, 'has_superpowers': True}])
+        self.assertEqual(Customer._get_to_dict_plan('name.first,has_superpowers')._serializers, {})
+
+    def test_source(self):
+        """The generated source loads attributes right into the result"""
+        source = codegen.get_source(Customer, codegen.NO_COMPRESSION, values=True)
+        self.assertIn("'name': {'first': row[0], 'middle': row[1], 'last': row[2]}", source)
+        source = codegen.get_source(PluginCustomer)
+        self.assertIn("p0.serialize_field(f0, obj) or obj.first_name", source)
+        with self.assertRaises(ValueError):
+            codegen.get_source(PluginCustomer, values=True)
+
+    def test_write_module(self):
+        """Serializers written ahead of time are used instead of compiling them"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'serializers.py')
+            stdout = StringIO()
+            call_command('to_dict_codegen', path, 'django_model_to_dict.PluginCustomer', '--uncompressed',
+                         stdout=stdout)
+            self.assertIn('Wrote 2 serializers', stdout.getvalue())
+
+            spec = spec_from_file_location('serializers', path)
+            module = module_from_spec(spec)
+            spec.loader.exec_module(module)
+            codegen._precompiled = module.SERIALIZERS
+            try:
+                plan = PluginCustomer._get_to_dict_plan().project({'name': {}})
+                self.assertEqual(codegen.get_serializer(plan, codegen.DEFAULT_COMPRESSION)(self.customer),
+                                 {'name': {'first': "IVO", 'last': "BOBUL"}})
+                self.assertNotEqual(plan._serializers[(codegen.DEFAULT_COMPRESSION, False)].__code__.co_filename,
+                                    path)
+
+                plan = PluginCustomer._get_to_dict_plan()
+                plan._serializers.clear()
+                serializer = codegen.get_serializer(plan, codegen.NO_COMPRESSION)
+                self.assertEqual(serializer.__code__.co_filename, path)
+                self.assertEqual(serializer(self.customer)['name'], {'first': "IVO", 'middle': None, 'last': "BOBUL"})
+            finally:
+                codegen._precompiled = None
+        finally:
+            shutil.rmtree(directory)
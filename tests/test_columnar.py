@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_columnar
+------------
+
+Tests for `django-model-to-dict` columnar output.
+"""
+
+import unittest
+
+from django.test import TestCase
+from django_model_to_dict.columnar import to_columns
+from django_model_to_dict.models import Customer, Order
+from django_model_to_dict.querysets import ToDictQuerySet
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ColumnarTestCase(TestCase):
+
+    def setUp(self):
+        self.ivo = Customer.objects.create(first_name="Ivo", last_name="Bobul", address_city="Kyiv", tel="")
+        self.ivan = Customer.objects.create(first_name="Ivan", last_name="Urgant", has_superpowers=True)
+
+    def test_columns(self):
+        """Every output path gets a column, in the order of `to_dict` output keys, with no values compressed"""
+        columns = to_columns(Customer.objects.order_by('pk'))
+        self.assertEqual(list(columns), [
+            'contacts.tel', 'contacts.email', 'contacts.website',
+            'address.country', 'address.state', 'address.city', 'address.street',
+            'name.first', 'name.middle', 'name.last',
+            'nickname', 'has_superpowers',
+        ])
+        self.assertEqual(columns['name.first'], ["Ivo", "Ivan"])
+        self.assertEqual(columns['address.city'], ["Kyiv", None])
+        self.assertEqual(columns['nickname'], [None, None])
+        self.assertEqual(columns['has_superpowers'], [False, True])
+
+    def test_matches_to_dict(self):
+        """Columns hold the same values as uncompressed `to_dict` output"""
+        columns = to_columns(Customer.objects.order_by('pk'), separator='/')
+        for i, customer in enumerate(Customer.objects.order_by('pk')):
+            result = customer.to_dict(compress_fields=False, compress_groups=False, compress_prefixes=False,
+                                      compress_postfixes=False, inspect_related_objects=False)
+            for path, column in columns.items():
+                value = result
+                for key in path.split('/'):
+                    value = value[key]
+                self.assertEqual(column[i], value)
+
+    def test_single_query(self):
+        """Columns are built from a single query, with only the projected columns fetched"""
+        with self.assertNumQueries(1):
+            columns = ToDictQuerySet(model=Customer).order_by('pk').to_columns(
+                fields=['name', 'has_superpowers'], chunk_size=1)
+        self.assertEqual(list(columns), ['name.first', 'name.middle', 'name.last', 'has_superpowers'])
+        self.assertEqual(columns['name.last'], ["Bobul", "Urgant"])
+
+    def test_foreign_keys(self):
+        """Foreign keys are emitted as their column values"""
+        order = Order.objects.create(customer=self.ivo)
+        self.assertEqual(to_columns(Order.objects.all()), {'id': [order.pk], 'customer': [self.ivo.pk]})
+
+    def test_empty_queryset(self):
+        """Empty querysets give empty columns"""
+        columns = to_columns(Customer.objects.none())
+        self.assertEqual(columns['name.first'], [])
+
+    @unittest.skipUnless(numpy, 'NumPy is not installed')
+    def test_numpy(self):
+        """NumPy arrays get native dtypes for non-nullable numeric and boolean fields"""
+        columns = to_columns(Customer.objects.order_by('pk'), numpy=True)
+        self.assertEqual(columns['has_superpowers'].dtype, numpy.bool_)
+        self.assertEqual(columns['has_superpowers'].tolist(), [False, True])
+        self.assertEqual(columns['address.city'].dtype, object)
+        self.assertEqual(columns['address.city'].tolist(), ["Kyiv", None])
+        self.assertEqual(to_columns(Order.objects.all(), numpy=True)['id'].dtype, numpy.int64)
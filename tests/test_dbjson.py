@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_dbjson
+------------
+
+Tests for `django-model-to-dict` database-side JSON construction.
+"""
+import json
+
+from django.db import models
+from django.test import TestCase
+from django_model_to_dict.dbjson import ToDictJSON, can_build_in_database, iter_db_json, to_db_json
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product, ProductTag, Tag
+from django_model_to_dict.output import DatabaseJSONBackend
+from django_model_to_dict.plugins.serialization import SerializationPlugin
+from django_model_to_dict.querysets import ToDictQuerySet, to_dicts
+
+
+class UpperCasePlugin(SerializationPlugin):
+    field_type = models.CharField
+
+    @staticmethod
+    def serialize_field(field, model_instance):
+        value = field.value_from_object(model_instance)
+        return value and value.upper()
+
+
+class DatabasePluginCustomer(Customer):
+    TO_DICT_SERIALIZATION_PLUGINS = (UpperCasePlugin,)
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class DatabaseHookedOrder(Order):
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+    def _to_dict_pre_finish_hook(self, result):
+        result['hooked'] = True
+
+
+class DatabaseJSONTestCase(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                                address_country="Ukraine", address_city="Kyiv")
+        Customer.objects.create(first_name="Ivan", last_name="Urgant", nickname="", has_superpowers=True)
+        self.order = Order.objects.create(customer=self.customer)
+        Order.objects.create(customer=self.customer)
+        product = Product.objects.create(name="Guitar", price=100)
+        ProductTag.objects.create(product=product, tag=Tag.objects.create(name="music"))
+        OrderPosition.objects.create(order=self.order, product=product, price=100, quantity=2)
+
+    def assertSameAsPython(self, queryset, **kwargs):
+        payloads = [json.loads(payload) for payload in iter_db_json(queryset, **kwargs)]
+        expected = to_dicts(queryset, **kwargs)
+        self.assertEqual(payloads, expected)
+        # the keys come in the same order as well
+        self.assertEqual([list(payload) for payload in payloads], [list(result) for result in expected])
+
+    def test_fields(self):
+        """Groups, prefixes and postfixes are nested objects, compressed by the database"""
+        queryset = Customer.objects.order_by('pk')
+        self.assertSameAsPython(queryset, inspect_related_objects=False)
+        self.assertSameAsPython(queryset, inspect_related_objects=False, compress_empty_groups=True)
+        self.assertSameAsPython(queryset, inspect_related_objects=False, compress_fields=False, compress_groups=False,
+                                compress_prefixes=False, compress_postfixes=False)
+        self.assertSameAsPython(queryset, fields='name.first,address,has_superpowers')
+
+    def test_related_objects(self):
+        """Related objects are built by subqueries"""
+        self.assertSameAsPython(Customer.objects.order_by('pk'))
+        self.assertSameAsPython(Order.objects.order_by('pk'))
+        self.assertSameAsPython(Order.objects.order_by('pk'), related_modes={'customer': 'pk'})
+        self.assertSameAsPython(OrderPosition.objects.all(), related_modes={'order': 'skip'})
+        self.assertSameAsPython(Product.objects.all())
+        self.assertSameAsPython(Product.objects.all(), related_modes={'tags': 'nested', 'order_positions': 'pk'})
+        self.assertSameAsPython(Customer.objects.order_by('pk'), fields='name,orders.customer')
+
+    def test_single_query(self):
+        """The payloads come right from the database"""
+        with self.assertNumQueries(1):
+            data = json.loads(to_db_json(Customer.objects.order_by('pk')).decode('utf-8'))
+        self.assertEqual(data[0]['orders'], [{'id': self.order.pk, 'customer': self.customer.pk},
+                                             {'id': self.order.pk + 1, 'customer': self.customer.pk}])
+        self.assertEqual(data[1]['name'], {'first': "Ivan", 'last': "Urgant"})
+        self.assertIs(data[1]['has_superpowers'], True)
+
+        payload = Customer.objects.annotate(payload=ToDictJSON(Customer, fields='name.last')).get(pk=self.customer.pk)\
+            .payload
+        self.assertEqual(json.loads(payload), {'name': {'last': "Bobul"}})
+
+    def test_plugin_fields(self):
+        """Models with plugin fields are serialized in python, with the same keys in the same order"""
+        queryset = DatabasePluginCustomer.objects.order_by('pk')
+        self.assertFalse(can_build_in_database(queryset, queryset.model._get_to_dict_plan()))
+        self.assertSameAsPython(queryset)
+        self.assertSameAsPython(queryset, inspect_related_objects=False, compress_empty_groups=True)
+        self.assertSameAsPython(queryset, inspect_related_objects=False, compress_fields=False, compress_groups=False,
+                                compress_prefixes=False, compress_postfixes=False)
+        self.assertSameAsPython(queryset, fields='nickname,name.first,has_superpowers')
+
+    def test_fallback(self):
+        """Whatever can't be built by the database is serialized in python"""
+        self.assertEqual(json.loads(to_db_json(DatabaseHookedOrder.objects.all()).decode('utf-8'))[0]['hooked'], True)
+        self.assertSameAsPython(Customer.objects.order_by('pk'), depth=2)
+        with self.assertRaises(ValueError):
+            ToDictJSON(Customer, depth=2)
+
+    def test_output_backend(self):
+        """`DatabaseJSONBackend` builds querysets with the database"""
+        queryset = ToDictQuerySet(model=Customer).order_by('pk')
+        self.assertEqual(queryset.to_output(DatabaseJSONBackend()), queryset.to_db_json())
+        self.assertEqual(DatabaseJSONBackend().loads(queryset.to_db_json()), to_dicts(queryset))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_delta
+------------
+
+Tests for `django-model-to-dict` incremental serialization.
+"""
+
+from django.test import TestCase
+from django_model_to_dict.delta import ChangeTracker, Delta
+from django_model_to_dict.models import Customer, Order
+
+
+class ChangeTrackerTestCase(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                                address_country="Ukraine", address_city="Kyiv")
+
+    def test_first_delta(self):
+        """Every path is new the first time an object is seen"""
+        tracker = ChangeTracker(inspect_related_objects=False)
+        delta = tracker.delta(self.customer)
+        self.assertEqual(delta.changed['name.first'], "Ivo")
+        self.assertEqual(delta.changed['address.city'], "Kyiv")
+        self.assertEqual(delta.removed, [])
+        self.assertFalse(tracker.delta(self.customer))
+
+    def test_changed_and_removed_paths(self):
+        """Changed paths inside groups are reported, compressed paths are reported as removed"""
+        for tracker in (ChangeTracker(inspect_related_objects=False),
+                        ChangeTracker(inspect_related_objects=False, hashes=True)):
+            tracker.delta(self.customer)
+            self.customer.address_city = "Lviv"
+            self.customer.tel = ""
+            self.customer.nickname = "Bobul"
+            self.assertEqual(tracker.delta(self.customer),
+                             Delta({'address.city': "Lviv", 'nickname': "Bobul"}, ['contacts.tel']))
+            self.customer.refresh_from_db()
+            tracker.delta(self.customer)
+
+    def test_update_fields(self):
+        """Only the updated fields are read, without serializing the whole object"""
+        tracker = ChangeTracker(inspect_related_objects=False)
+        tracker.delta(self.customer)
+        self.customer.first_name = "Ivan"
+        self.customer.last_name = "Urgant"
+        self.customer.address_city = None
+        with self.assertNumQueries(0):
+            delta = tracker.delta(self.customer, update_fields={'first_name', 'address_city'})
+        self.assertEqual(delta, Delta({'name.first': "Ivan"}, ['address.city']))
+
+    def test_related_update_fields(self):
+        """Updated relations are serialized as a whole"""
+        order = Order.objects.create(customer=self.customer)
+        tracker = ChangeTracker()
+        tracker.delta(order)
+        customer = Customer.objects.create(first_name="Ivan", last_name="Urgant")
+        order.customer = customer
+        delta = tracker.delta(order, update_fields={'customer'})
+        self.assertEqual(list(delta.changed), ['customer'])
+        self.assertEqual(delta.changed['customer']['name']['first'], "Ivan")
+
+    def test_skipped_related_update_fields(self):
+        """Updated foreign keys of skipped relations are left out, just like they are left out of the output"""
+        order = Order.objects.create(customer=self.customer)
+        tracker = ChangeTracker(related_modes={'customer': 'skip'})
+        tracker.delta(order)
+        self.assertNotIn('customer', order.to_dict(related_modes={'customer': 'skip'}))
+        order.customer = Customer.objects.create(first_name="Ivan", last_name="Urgant")
+        self.assertFalse(tracker.delta(order, update_fields={'customer'}))
+        self.assertFalse(tracker.delta(order))
+
+    def test_connect(self):
+        """Saved objects' changes are passed to the callback, deleted objects are forgotten"""
+        deltas = []
+        tracker = ChangeTracker(inspect_related_objects=False)
+        tracker.connect(Customer, lambda instance, delta: deltas.append(delta))
+        try:
+            self.customer.save()
+            self.customer.save()
+            self.customer.nickname = "Bobul"
+            self.customer.save(update_fields=['nickname'])
+            self.customer.save(update_fields=['nickname'])
+        finally:
+            tracker.disconnect(Customer)
+        self.assertEqual(len(deltas), 2)
+        self.assertEqual(deltas[1], Delta({'nickname': "Bobul"}, []))
+        self.customer.save()
+        self.assertEqual(len(deltas), 2)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_encoding
+------------
+
+Tests for `django-model-to-dict` direct JSON encoding.
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.test import TestCase
+from django_model_to_dict.encoding import get_field_encoder, get_json_plan, to_json_lines
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product
+from django_model_to_dict.querysets import to_dicts, ToDictQuerySet
+
+
+def encode(result):
+    return json.loads(json.dumps(result, cls=DjangoJSONEncoder))
+
+
+class ToJSONBytesTestCase(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                                address_country="Україна", has_superpowers=True)
+        product = Product.objects.create(name='Apple "Golden"', price=10)
+        self.order = Order.objects.create(customer=self.customer)
+        OrderPosition.objects.create(order=self.order, product=product, price=product.price, quantity=2)
+
+    def test_same_as_to_dict(self):
+        """The output is the same as `to_dict` output encoded with `DjangoJSONEncoder`"""
+        for obj in (self.customer, self.order, OrderPosition.objects.get()):
+            for kwargs in ({}, {'inspect_related_objects': False}, {'compress_fields': False},
+                           {'compress_groups': False, 'compress_prefixes': False, 'compress_postfixes': False},
+                           {'compress_empty_groups': True}, {'fields': 'name,address.country,orders'},
+                           {'depth': 2}, {'related_modes': {'orders': 'pk'}}):
+                if 'fields' in kwargs and not isinstance(obj, Customer):
+                    continue
+                self.assertEqual(json.loads(obj.to_json_bytes(**kwargs).decode()), encode(obj.to_dict(**kwargs)))
+
+    def test_typed_values(self):
+        """Values are encoded by field type like `DjangoJSONEncoder` does"""
+        values = (
+            (models.DecimalField(max_digits=5, decimal_places=2), decimal.Decimal('10.50')),
+            (models.UUIDField(), uuid.UUID('12345678123456781234567812345678')),
+            (models.DateTimeField(), self.customer.created_at),
+            (models.DateTimeField(), datetime.datetime(2016, 1, 1, 12, 30, 0, 123456)),
+            (models.DateField(), datetime.date(2016, 1, 1)),
+            (models.TimeField(), datetime.time(12, 30, 0, 123456)),
+            (models.BooleanField(), False),
+            (models.FloatField(), 0.1),
+            (models.CharField(), 'Україна "Ukraine"'),
+        )
+        for field, value in values:
+            self.assertEqual(json.loads(get_field_encoder(field)(value)), encode(value))
+
+    def test_values_of_other_types(self):
+        """Values assigned to fields but not reloaded yet are encoded as they are"""
+        position = OrderPosition.objects.get()
+        position.quantity = '3'
+        self.assertEqual(json.loads(position.to_json_bytes(inspect_related_objects=False).decode()),
+                         encode(position.to_dict(inspect_related_objects=False)))
+
+    def test_json_plan_per_projection(self):
+        """Projected plans get their own JSON plans"""
+        plan = Customer._get_to_dict_plan()
+        self.assertIs(get_json_plan(plan), get_json_plan(plan))
+        projected = Customer._get_to_dict_plan('name')
+        self.assertIs(get_json_plan(projected).plan, projected)
+
+
+class ToJSONLinesTestCase(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55")
+        product = Product.objects.create(name='Apple', price=10)
+        for i in range(3):
+            order = Order.objects.create(customer=customer)
+            OrderPosition.objects.create(order=order, product=product, price=product.price, quantity=i + 1)
+
+    def test_json_lines(self):
+        """Every object is encoded on its own line, the same as `to_dicts` output"""
+        for model, kwargs in ((Order, {}), (OrderPosition, {'inspect_related_objects': False}),
+                              (Customer, {'fields': 'name,orders'})):
+            lines = to_json_lines(model.objects.order_by('pk'), **kwargs).decode().splitlines()
+            self.assertEqual([json.loads(line) for line in lines],
+                             encode(to_dicts(model.objects.order_by('pk'), **kwargs)))
+
+    def test_values_path(self):
+        """Objects are encoded straight from rows when no related objects are inspected"""
+        with self.assertNumQueries(1):
+            data = ToDictQuerySet(model=OrderPosition).to_json_lines(inspect_related_objects=False, chunk_size=2)
+        self.assertEqual(data.count(b'\n'), 3)
+
+    def test_empty_queryset(self):
+        self.assertEqual(to_json_lines(Order.objects.none()), b'')
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_filebrowser
+------------
+
+Tests for `django-model-to-dict` django-filebrowser serialization plugin.
+"""
+
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import TestCase
+from django_model_to_dict.cache import LRUCacheBackend
+
+try:
+    from filebrowser.fields import FileBrowseField
+    from django_model_to_dict.plugins.serialization import filebrowser_field
+    from django_model_to_dict.plugins.serialization.filebrowser_field import FilebrowserFieldSerializationPlugin
+except ImportError:
+    filebrowser_field = None
+
+VERSIONS = {'small': {}, 'big': {}}
+
+
+def make_file_object(path, date=1.0):
+    """A stub of filebrowser's `FileObject`, generating version URLs without touching the storage"""
+    file_object = mock.Mock(path=path, url='/media/' + path, date=date)
+    file_object.version_generate.side_effect = lambda version: mock.Mock(url='/media/%s/%s' % (version, path))
+    file_object.version_path.side_effect = lambda version: '%s/%s' % (version, path)
+    file_object.site.storage.url.side_effect = lambda name: '/storage/' + name
+    return file_object
+
+
+@unittest.skipUnless(filebrowser_field, 'django-filebrowser is not installed')
+class FilebrowserFieldSerializationPluginTestCase(TestCase):
+
+    def setUp(self):
+        self.field = FileBrowseField(max_length=200)
+        self.field.set_attributes_from_name('image')
+        for name, value in (('FILEBROWSER_VERSIONS', VERSIONS), ('TO_DICT_FILEBROWSER_VERSIONS_CACHE', None),
+                            ('TO_DICT_FILEBROWSER_LAZY_VERSIONS', False)):
+            patcher = mock.patch.object(filebrowser_field, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def serialize(self, file_object):
+        return FilebrowserFieldSerializationPlugin.serialize_field(self.field, SimpleNamespace(image=file_object))
+
+    def test_versions(self):
+        self.assertEqual(self.serialize(make_file_object('a.jpg')), {
+            'original': '/media/a.jpg', 'small': '/media/small/a.jpg', 'big': '/media/big/a.jpg'})
+        self.assertEqual(self.serialize(None), {})
+
+    def test_file_not_found(self):
+        file_object = make_file_object('a.jpg')
+        file_object.version_generate.side_effect = FileNotFoundError
+        self.assertEqual(self.serialize(file_object)['error'], 'file not found')
+
+    def test_versions_cache(self):
+        """Versions are generated once per file path and modification time"""
+        with mock.patch.object(filebrowser_field, 'TO_DICT_FILEBROWSER_VERSIONS_CACHE', LRUCacheBackend()):
+            file_object = make_file_object('a.jpg')
+            result = self.serialize(file_object)
+            self.assertEqual(self.serialize(file_object), result)
+            self.assertEqual(self.serialize(make_file_object('a.jpg')), result)
+            self.assertEqual(file_object.version_generate.call_count, len(VERSIONS))
+
+            modified = make_file_object('a.jpg', date=2.0)
+            self.assertEqual(self.serialize(modified), result)
+            self.assertEqual(modified.version_generate.call_count, len(VERSIONS))
+
+    def test_lazy_versions(self):
+        """Lazy version URLs are built by the storage, no versions are generated"""
+        with mock.patch.object(filebrowser_field, 'TO_DICT_FILEBROWSER_LAZY_VERSIONS', True):
+            file_object = make_file_object('a.jpg')
+            self.assertEqual(self.serialize(file_object), {
+                'original': '/media/a.jpg', 'small': '/storage/small/a.jpg', 'big': '/storage/big/a.jpg'})
+            self.assertFalse(file_object.version_generate.called)
+
+    def test_batch(self):
+        """Every distinct file of a batch is resolved once, every instance gets its own dictionary"""
+        first, second = make_file_object('a.jpg'), make_file_object('b.jpg')
+        instances = [SimpleNamespace(image=file_object) for file_object in (first, second, first, None)]
+        results = FilebrowserFieldSerializationPlugin.serialize_field_batch(self.field, instances)
+        self.assertEqual(first.version_generate.call_count, len(VERSIONS))
+        self.assertEqual(results, [self.serialize(first), self.serialize(second), self.serialize(first), {}])
+        self.assertIsNot(results[0], results[2])
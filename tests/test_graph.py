@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_graph
+------------
+
+Tests for `django-model-to-dict` graph serialization.
+"""
+
+from unittest import mock
+
+from django.test import TestCase
+from django_model_to_dict.encoding import iter_json
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product
+from django_model_to_dict.plan import IdentityMap
+from django_model_to_dict.querysets import iter_dicts, to_dicts
+
+
+class GraphSerializationTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                                email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+                                                address_country="Ukraine", address_street="Tarasa Shevchenko")
+        self.product = Product.objects.create(name='Apple', price=10)
+        for i in range(2):
+            order = Order.objects.create(customer=self.customer)
+            for quantity in (1, 2):
+                OrderPosition.objects.create(order=order, product=self.product, price=10, quantity=quantity)
+
+    def test_default_depth(self):
+        """A single level of related objects is inspected by default"""
+        result = self.customer.to_dict()
+        self.assertEqual(result, self.customer.to_dict(depth=1))
+        self.assertEqual(result['orders'], [order.to_dict(depth=0) for order in self.customer.orders.all()])
+        self.assertEqual(self.customer.to_dict(depth=0), self.customer.to_dict(inspect_related_objects=False))
+
+    def test_cycles_are_references(self):
+        """Objects up the graph are emitted as primary keys"""
+        result = self.customer.to_dict(depth=3)
+        order = result['orders'][0]
+        self.assertEqual(order['customer'], self.customer.pk)
+        position = order['order_positions'][0]
+        self.assertEqual(position['order'], order['id'])
+        self.assertEqual(position['product'], {'id': self.product.pk, 'name': 'Apple', 'price': 10})
+
+    def test_repeated_objects_reuse(self):
+        """Repeated objects are serialized once and reused"""
+        result = self.customer.to_dict(depth=3)
+        products = [p['product'] for o in result['orders'] for p in o['order_positions']]
+        self.assertEqual(len(products), 4)
+        self.assertTrue(all(product is products[0] for product in products))
+
+    def test_repeated_objects_reference(self):
+        """Repeated objects are emitted as primary keys after the first occurrence"""
+        result = self.customer.to_dict(depth=3, repeated_objects='reference')
+        products = [p['product'] for o in result['orders'] for p in o['order_positions']]
+        self.assertEqual(products[0], {'id': self.product.pk, 'name': 'Apple', 'price': 10})
+        self.assertEqual(products[1:], [self.product.pk] * 3)
+
+    def test_repeated_objects_are_fetched_once(self):
+        """Foreign keys to already serialized objects are not followed"""
+        order = Order.objects.first()
+        with self.assertNumQueries(4):
+            # order positions, the product (once for both positions), the customer, the customer's orders
+            order.to_dict(depth=2)
+
+    def test_to_dicts(self):
+        """Bulk serialization loads the whole graph with a constant number of queries"""
+        queryset = Customer.objects.all()
+        expected = [o.to_dict(depth=3) for o in queryset]
+        with self.assertNumQueries(4):
+            # customers, orders, order positions, products
+            self.assertEqual(to_dicts(queryset, depth=3), expected)
+        fields = 'nickname,orders.order_positions.product.name'
+        expected = [o.to_dict(depth=3, fields=fields) for o in queryset]
+        with self.assertNumQueries(4):
+            self.assertEqual(to_dicts(queryset, depth=3, fields=fields), expected)
+
+    def test_streaming_identity_maps(self):
+        """Streamed objects reuse related objects within a chunk only, so identity maps never outgrow a chunk"""
+        for i in range(4):
+            product = Product.objects.create(name='Pear %d' % i, price=i)
+            OrderPosition.objects.create(order=Order.objects.first(), product=product, price=i, quantity=1)
+        queryset = OrderPosition.objects.order_by('pk')
+        expected = to_dicts(queryset)
+
+        for iterate in (iter_dicts, iter_json):
+            identity_maps = []
+
+            def create_identity_map():
+                identity_maps.append(IdentityMap())
+                return identity_maps[-1]
+
+            with mock.patch('django_model_to_dict.querysets.IdentityMap', create_identity_map):
+                self.assertEqual(len(list(iterate(queryset, chunk_size=3))), len(expected))
+                self.assertEqual(len(identity_maps), 3)
+                self.assertTrue(all(identity_maps))
+                # an order and a product per object at most
+                self.assertTrue(all(len(identity_map) <= 2 * 3 for identity_map in identity_maps))
+
+                identity_maps.clear()
+                self.assertEqual(list(iter_dicts(queryset)), expected)
+                self.assertEqual(len(identity_maps), 1)
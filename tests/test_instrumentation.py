@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_instrumentation
+------------
+
+Tests for `django-model-to-dict` serialization instrumentation.
+"""
+
+from django.test import TestCase
+from django_model_to_dict import instrumentation
+from django_model_to_dict.instrumentation import instrument, to_dict_instrumented
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product
+from django_model_to_dict.plugins.serialization import SerializationPlugin
+from django_model_to_dict.querysets import to_dicts
+
+
+class NamePlugin(SerializationPlugin):
+
+    @classmethod
+    def check_field(cls, field):
+        return field.name == 'name'
+
+    @staticmethod
+    def serialize_field(field, model_instance):
+        return field.value_from_object(model_instance).upper()
+
+
+class NamePluginProduct(Product):
+    TO_DICT_SERIALIZATION_PLUGINS = (NamePlugin,)
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class InstrumentationTestCase(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(first_name="Ivo", last_name="Bobul")
+        product = Product.objects.create(name='Apple', price=10)
+        for i in range(2):
+            order = Order.objects.create(customer=customer)
+            OrderPosition.objects.create(order=order, product=product, price=product.price, quantity=i + 1)
+
+    def test_disabled(self):
+        """Nothing is collected outside of instrumented blocks"""
+        self.assertEqual(instrumentation.active, 0)
+        self.assertIsNone(instrumentation.get_stats())
+        with instrument() as stats:
+            self.assertEqual(instrumentation.active, 1)
+            self.assertIs(instrumentation.get_stats(), stats)
+        self.assertEqual(instrumentation.active, 0)
+        self.assertIsNone(instrumentation.get_stats())
+
+    def test_phases_and_relations(self):
+        """Phases, objects, and queries per relation are recorded"""
+        order = Order.objects.first()
+        with instrument() as stats:
+            order.to_dict()
+        self.assertEqual(stats.objects, 1 + 1 + 1)  # the order, its customer and its position
+        self.assertEqual(set(stats.phases), {'fields', 'compression', 'related'})
+        self.assertEqual(stats.queries, 2)
+        self.assertEqual(stats.relations['django_model_to_dict.Order.customer'].queries, 1)
+        self.assertEqual(stats.relations['django_model_to_dict.Order.order_positions'].queries, 1)
+        self.assertEqual(stats.relations['django_model_to_dict.Order.order_positions'].calls, 1)
+        self.assertEqual(stats.as_dict()['relations']['django_model_to_dict.Order.customer']['calls'], 1)
+
+    def test_plugins(self):
+        product = NamePluginProduct.objects.first()
+        with instrument() as stats:
+            self.assertEqual(product.to_dict(inspect_related_objects=False)['name'], 'APPLE')
+        self.assertIn('plugins', stats.phases)
+        self.assertEqual(list(stats.plugins), ['NamePlugin'])
+
+    def test_bulk(self):
+        """Objects serialized by `to_dicts` are counted, including the rows read with `values_list()`"""
+        with instrument() as stats:
+            to_dicts(OrderPosition.objects.all(), inspect_related_objects=False)
+        self.assertEqual(stats.objects, 2)
+        self.assertEqual(stats.queries, 1)
+
+    def test_signal_and_callback(self):
+        received = []
+        to_dict_instrumented.connect(lambda sender, stats, **kwargs: received.append(stats), weak=False,
+                                     dispatch_uid='test_instrumentation')
+        try:
+            with instrument(callback=received.append) as stats:
+                Order.objects.first().to_dict(inspect_related_objects=False)
+        finally:
+            to_dict_instrumented.disconnect(dispatch_uid='test_instrumentation')
+        self.assertEqual(received, [stats, stats])
+
+    def test_sampling(self):
+        """Blocks which aren't sampled aren't instrumented"""
+        with instrument(sample_rate=0) as stats:
+            self.assertIsNone(stats)
+            self.assertEqual(instrumentation.active, 0)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_many_to_many
+------------
+
+Tests for `django-model-to-dict` many-to-many relations serialization.
+"""
+
+from unittest import mock
+
+from django.test import TestCase
+from django_model_to_dict.cache import LRUCacheBackend
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product, ProductTag, Tag
+from django_model_to_dict.querysets import to_dicts
+
+
+class NestedTagsProduct(Product):
+    TO_DICT_MANY_TO_MANY = 'nested'
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class WeightedTagsProduct(Product):
+    TO_DICT_THROUGH_FIELDS = {'tags': ('weight',)}
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class NestedWeightedTagsProduct(WeightedTagsProduct):
+    TO_DICT_MANY_TO_MANY = 'nested'
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class ManyToManyTestCase(TestCase):
+    def setUp(self):
+        self.apple = Product.objects.create(name='Apple', price=10)
+        self.pear = Product.objects.create(name='Pear', price=12)
+        self.fruit = Tag.objects.create(name='fruit')
+        self.green = Tag.objects.create(name='green')
+        ProductTag.objects.create(product=self.apple, tag=self.fruit, weight=2)
+        ProductTag.objects.create(product=self.apple, tag=self.green, weight=1)
+        ProductTag.objects.create(product=self.pear, tag=self.fruit, weight=3)
+
+    def test_pks(self):
+        """Related objects are emitted as primary keys by default, in both directions"""
+        self.assertEqual(self.apple.to_dict()['tags'], [self.fruit.pk, self.green.pk])
+        self.assertEqual(self.fruit.to_dict()['products'], [self.apple.pk, self.pear.pk])
+        self.assertNotIn('tags', self.apple.to_dict(inspect_related_objects=False))
+
+    def test_nested(self):
+        """Related objects are serialized with TO_DICT_MANY_TO_MANY = 'nested'"""
+        apple = NestedTagsProduct.objects.get(pk=self.apple.pk)
+        self.assertEqual(apple.to_dict()['tags'], [
+            {'id': self.fruit.pk, 'name': 'fruit'}, {'id': self.green.pk, 'name': 'green'}])
+        self.assertEqual(apple.to_dict(fields='tags.name')['tags'], [{'name': 'fruit'}, {'name': 'green'}])
+
+    def test_through_fields(self):
+        """Through model fields are emitted under the 'through' key"""
+        self.assertEqual(WeightedTagsProduct.objects.get(pk=self.apple.pk).to_dict()['tags'], [
+            {'pk': self.fruit.pk, 'through': {'weight': 2}}, {'pk': self.green.pk, 'through': {'weight': 1}}])
+        self.assertEqual(NestedWeightedTagsProduct.objects.get(pk=self.apple.pk).to_dict()['tags'][0],
+                         {'id': self.fruit.pk, 'name': 'fruit', 'through': {'weight': 2}})
+
+    def test_to_dicts(self):
+        """The through table is loaded with a single query per relation for the whole queryset"""
+        expected = [o.to_dict() for o in Product.objects.all()]
+        with self.assertNumQueries(3):
+            # products, order positions, product tags
+            self.assertEqual(to_dicts(Product.objects.all()), expected)
+
+        for model in (NestedTagsProduct, NestedWeightedTagsProduct):
+            expected = [o.to_dict() for o in model.objects.all()]
+            with self.assertNumQueries(4):
+                # products, order positions, product tags, tags
+                self.assertEqual(to_dicts(model.objects.all()), expected)
+
+    def test_to_dicts_graph(self):
+        """Many-to-many relations deeper in the graph are loaded for the whole queryset as well"""
+        customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                           email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+                                           address_country="Ukraine", address_street="Tarasa Shevchenko")
+        for product in (self.apple, self.pear):
+            order = Order.objects.create(customer=customer)
+            OrderPosition.objects.create(order=order, product=product, price=product.price, quantity=1)
+
+        expected = [o.to_dict(depth=3) for o in Order.objects.all()]
+        self.assertEqual(expected[0]['order_positions'][0]['product']['tags'], [self.fruit.pk, self.green.pk])
+        with self.assertNumQueries(7):
+            # orders with customers, order positions, products, products' order positions,
+            # customers' orders, their order positions, product tags
+            self.assertEqual(to_dicts(Order.objects.all(), depth=3), expected)
+
+    def test_cache_invalidation(self):
+        """Changes of the related objects and of the through table invalidate the cached output"""
+        backend = LRUCacheBackend()
+        with mock.patch.object(Product, 'TO_DICT_CACHE', backend, create=True):
+            self.assertEqual(Product.objects.get(pk=self.pear.pk).to_dict()['tags'], [self.fruit.pk])
+            ProductTag.objects.create(product=self.pear, tag=self.green)
+            self.assertEqual(Product.objects.get(pk=self.pear.pk).to_dict()['tags'], [self.fruit.pk, self.green.pk])
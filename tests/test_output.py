@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_output
+------------
+
+Tests for `django-model-to-dict` output backends.
+"""
+
+import json
+import unittest
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase
+from django_model_to_dict.models import Customer, Order
+from django_model_to_dict.output import DictBackend, JSONBackend, MessagePackBackend, get_backend, get_key_table, \
+    intern_keys, restore_keys
+from django_model_to_dict.querysets import to_dicts, ToDictQuerySet
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def encode(result):
+    return json.loads(json.dumps(result, cls=DjangoJSONEncoder))
+
+
+class JSONOrder(Order):
+    TO_DICT_OUTPUT_BACKEND = 'django_model_to_dict.output.JSONBackend'
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class OutputBackendTestCase(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                           address_country="Ukraine", address_city="Kyiv")
+        for i in range(3):
+            Order.objects.create(customer=customer)
+
+    def test_default_backend(self):
+        """Dictionaries are emitted by default"""
+        order = Order.objects.first()
+        self.assertIsInstance(get_backend(Order), DictBackend)
+        self.assertEqual(order.to_output(), order.to_dict())
+        self.assertEqual(ToDictQuerySet(model=Order).to_output(inspect_related_objects=False),
+                         to_dicts(Order.objects.all(), inspect_related_objects=False))
+
+    def test_model_backend(self):
+        """Models may set their own backend, which is instantiated once"""
+        order = JSONOrder.objects.first()
+        self.assertIs(get_backend(JSONOrder), get_backend(JSONOrder))
+        self.assertEqual(json.loads(order.to_output().decode()), encode(order.to_dict()))
+
+    def test_json_backend(self):
+        backend = JSONBackend()
+        data = ToDictQuerySet(model=Order).to_output(backend=backend)
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(backend.loads(data), encode(to_dicts(Order.objects.all())))
+        self.assertEqual(backend.loads(backend.dumps_queryset(Order.objects.none())), [])
+
+    def test_intern_keys(self):
+        """Every distinct key gets a single index, restored with the table of keys"""
+        data = to_dicts(Customer.objects.all()) + to_dicts(Order.objects.all())
+        keys = {}
+        interned = intern_keys(data, keys)
+        table = get_key_table(keys)
+        self.assertEqual(len(table), len(set(table)))
+        self.assertIn('address', table)
+        self.assertEqual(restore_keys(interned, table), data)
+
+    @unittest.skipUnless(msgpack, 'msgpack is not installed')
+    def test_message_pack_backend(self):
+        for backend in (MessagePackBackend(), MessagePackBackend(intern_keys=True)):
+            order = Order.objects.first()
+            self.assertEqual(backend.loads(order.to_output(backend=backend)), encode(order.to_dict()))
+            self.assertEqual(backend.loads(ToDictQuerySet(model=Order).to_output(backend=backend)),
+                             encode(to_dicts(Order.objects.all())))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_parallel
+------------
+
+Tests for `django-model-to-dict` parallel exports.
+"""
+
+import io
+import json
+
+from django.test import TestCase, TransactionTestCase
+from django_model_to_dict.models import Order, OrderPosition, Product, Customer
+from django_model_to_dict.parallel import export, _get_pk_ranges, MODE_PROCESS, MODE_THREAD
+from django_model_to_dict.querysets import to_dicts
+
+
+def create_orders():
+    customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                       email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+                                       address_country="Ukraine", address_street="Tarasa Shevchenko")
+    product = Product.objects.create(name='Apple', price=10)
+    for i in range(7):
+        order = Order.objects.create(customer=customer)
+        OrderPosition.objects.create(order=order, product=product, price=product.price, quantity=i + 1)
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        create_orders()
+
+    def test_in_process_export(self):
+        expected = to_dicts(Order.objects.order_by('pk'))
+        self.assertEqual(export(Order.objects.all(), workers=1, chunk_size=3), expected)
+
+    def test_json_lines_output(self):
+        output = io.StringIO()
+        self.assertEqual(export(OrderPosition.objects.filter(quantity__gt=2), output, workers=1, chunk_size=2), 5)
+        self.assertEqual([json.loads(line) for line in output.getvalue().splitlines()],
+                         to_dicts(OrderPosition.objects.filter(quantity__gt=2).order_by('pk')))
+
+    def test_pk_ranges(self):
+        """Only the range boundaries are queried"""
+        pks = list(Order.objects.order_by('pk').values_list('pk', flat=True))
+        with self.assertNumQueries(5):
+            self.assertEqual(_get_pk_ranges(Order.objects.all(), 3),
+                             [(pks[0], pks[2]), (pks[3], pks[5]), (pks[6], pks[6])])
+        self.assertEqual(_get_pk_ranges(Order.objects.all(), 7), [(pks[0], pks[6])])
+        self.assertEqual(_get_pk_ranges(Order.objects.filter(pk__gt=pks[1]), 5), [(pks[2], pks[6])])
+        self.assertEqual(_get_pk_ranges(Order.objects.none(), 5), [])
+
+    def test_sliced_queryset(self):
+        self.assertRaises(ValueError, export, Order.objects.all()[:3], workers=1)
+
+
+class PoolExportTestCase(TransactionTestCase):
+    def setUp(self):
+        create_orders()
+
+    def test_thread_export(self):
+        """Chunks serialized by worker threads are merged in primary key order"""
+        expected = to_dicts(Order.objects.order_by('pk'), fields='id,order_positions')
+        self.assertEqual(export(Order.objects.all(), workers=3, mode=MODE_THREAD, chunk_size=2,
+                                fields='id,order_positions'), expected)
+
+    def test_process_export(self):
+        """Chunks serialized by worker processes are merged in primary key order"""
+        expected = to_dicts(Order.objects.order_by('pk'), fields='id,order_positions')
+        self.assertEqual(export(Order.objects.all(), workers=3, mode=MODE_PROCESS, chunk_size=2,
+                                fields='id,order_positions'), expected)
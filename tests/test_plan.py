@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_plan
+------------
+
+Tests for `django-model-to-dict` compiled serialization plans.
+"""
+
+import itertools
+
+from django.test import TestCase
+from django_model_to_dict.models import ContactPerson, Customer, Person
+
+
+class ToDictPlanTestCase(TestCase):
+
+    def test_plan_is_cached_per_model(self):
+        """The plan is built once per model class and never shared between models"""
+        self.assertIs(Customer._get_to_dict_plan(), Customer._get_to_dict_plan())
+        self.assertIsNot(Customer._get_to_dict_plan(), Person._get_to_dict_plan())
+
+    def test_plan_layout(self):
+        """Every non-skipped field is mapped to its output path"""
+        plan = Customer._get_to_dict_plan()
+        self.assertEqual(plan.buckets, ('contacts', 'address', 'name'))
+        self.assertEqual([(f.field.name, f.bucket, f.key) for f in plan.fields], [
+            ('first_name', 'name', 'first'),
+            ('middle_name', 'name', 'middle'),
+            ('last_name', 'name', 'last'),
+            ('nickname', None, 'nickname'),
+            ('has_superpowers', None, 'has_superpowers'),
+            ('tel', 'contacts', 'tel'),
+            ('email', 'contacts', 'email'),
+            ('website', 'contacts', 'website'),
+            ('address_country', 'address', 'country'),
+            ('address_state', 'address', 'state'),
+            ('address_city', 'address', 'city'),
+            ('address_street', 'address', 'street'),
+        ])
+
+    def test_key_order(self):
+        """Buckets come first, followed by root-level fields"""
+        contact_person = ContactPerson.objects.create(name="Name", tel="555-55-55", email="name@example.com")
+        self.assertEqual(list(contact_person.to_dict()), ['contacts', 'id', 'name'])
+
+
+def compress_post_hoc(result, plan, compress_fields, compress_groups, compress_prefixes, compress_postfixes,
+                      compress_empty_groups):
+    """Reference implementation: compression as a set of sweeps over an uncompressed result"""
+    if compress_fields:
+        for key in [key for key, value in result.items() if not value]:
+            del result[key]
+    for compress, buckets in ((compress_groups, plan.groups), (compress_prefixes, plan.prefixes),
+                              (compress_postfixes, plan.postfixes)):
+        if compress:
+            for bucket in buckets:
+                for key in [key for key, value in result.get(bucket, {}).items() if not value]:
+                    del result[bucket][key]
+    if compress_empty_groups:
+        for key in [key for key in result if result[key] == {}]:
+            del result[key]
+    return result
+
+
+class CompressionTestCase(TestCase):
+
+    def test_single_pass_compression(self):
+        """Compression on emission gives the same result as compressing afterwards, for every flags combination"""
+        customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="", email="", website="",
+                                           address_country="Ukraine", address_street="")
+        plan = Customer._get_to_dict_plan()
+        values = [f.field.value_from_object(customer) for f in plan.fields]
+        for flags in itertools.product((True, False), repeat=5):
+            expected = compress_post_hoc(plan.build(values, False, False, False, False, False), plan, *flags)
+            result = plan.build(values, *flags)
+            self.assertEqual(result, expected)
+            self.assertEqual(list(result), list(expected))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_plugins
+------------
+
+Tests for `django-model-to-dict` serialization plugins dispatch.
+"""
+
+import json
+
+from django.db import models
+from django.db.models import Value
+from django.test import TestCase
+from django_model_to_dict.encoding import to_json_lines
+from django_model_to_dict.models import Customer, Product
+from django_model_to_dict.plugins.serialization import SerializationPlugin, PluginDispatcher
+from django_model_to_dict.querysets import to_dicts
+
+
+class CharFieldPlugin(SerializationPlugin):
+    field_type = models.CharField
+
+    @staticmethod
+    def serialize_field(field, model_instance):
+        return field.value_from_object(model_instance).upper()
+
+
+class EmailFieldPlugin(SerializationPlugin):
+    field_type = models.EmailField
+
+    @staticmethod
+    def serialize_field(field, model_instance):
+        return 'hidden'
+
+
+class PriceFieldPlugin(SerializationPlugin):
+
+    @classmethod
+    def check_field(cls, field):
+        return field.name == 'price'
+
+    @staticmethod
+    def serialize_field(field, model_instance):
+        return {'amount': field.value_from_object(model_instance)}
+
+
+class BatchPriceFieldPlugin(PriceFieldPlugin):
+    batches = []
+
+    @classmethod
+    def serialize_field_batch(cls, field, model_instances):
+        cls.batches.append(len(model_instances))
+        return [{'amount': field.value_from_object(i), 'currency': i.currency} for i in model_instances]
+
+    @classmethod
+    def prepare(cls, field, queryset):
+        return queryset.annotate(currency=Value('EUR', output_field=models.CharField()))
+
+
+class PluginDispatcherTestCase(TestCase):
+
+    def test_mro_dispatch(self):
+        """The most specific field_type wins, subclasses are matched too"""
+        dispatcher = PluginDispatcher((CharFieldPlugin, EmailFieldPlugin))
+        self.assertIs(dispatcher.get_plugin(Customer._meta.get_field('email')), EmailFieldPlugin)
+        self.assertIs(dispatcher.get_plugin(Customer._meta.get_field('website')), CharFieldPlugin)
+        self.assertIs(dispatcher.get_plugin(Customer._meta.get_field('nickname')), CharFieldPlugin)
+        self.assertIsNone(dispatcher.get_plugin(Customer._meta.get_field('has_superpowers')))
+
+    def test_custom_check_field(self):
+        """Plugins with a custom check_field take precedence over the plugins listed after them"""
+        dispatcher = PluginDispatcher((PriceFieldPlugin, CharFieldPlugin))
+        self.assertIs(dispatcher.get_plugin(Product._meta.get_field('price')), PriceFieldPlugin)
+        self.assertIs(dispatcher.get_plugin(Product._meta.get_field('name')), CharFieldPlugin)
+        dispatcher = PluginDispatcher((CharFieldPlugin, PriceFieldPlugin))
+        self.assertIs(dispatcher.get_plugin(Product._meta.get_field('name')), CharFieldPlugin)
+
+    def test_dotted_paths(self):
+        dispatcher = PluginDispatcher(('tests.test_plugins.PriceFieldPlugin',))
+        self.assertIs(dispatcher.get_plugin(Product._meta.get_field('price')), PriceFieldPlugin)
+
+
+class PluginSerializationTestCase(TestCase):
+
+    def test_plugins_in_to_dict(self):
+        class PluginProduct(Product):
+            TO_DICT_SERIALIZATION_PLUGINS = ('tests.test_plugins.PriceFieldPlugin', CharFieldPlugin)
+            TO_DICT_SKIP = ('id',)
+
+            class Meta:
+                proxy = True
+                app_label = 'django_model_to_dict'
+
+        product = PluginProduct.objects.create(name='Apple', price=10)
+        self.assertEqual(product.to_dict(inspect_related_objects=False), {'name': 'APPLE', 'price': {'amount': 10}})
+
+    def test_per_instance_plugins_in_bulk(self):
+        BulkPluginProduct.objects.create(name='Apple', price=10)
+        BulkPluginProduct.objects.create(name='Pear', price=20)
+        queryset = BulkPluginProduct.objects.order_by('pk')
+        self.assertEqual(to_dicts(queryset, chunk_size=1, inspect_related_objects=False),
+                         [p.to_dict(inspect_related_objects=False) for p in queryset])
+
+
+class BatchPluginTestCase(TestCase):
+
+    def setUp(self):
+        BatchPriceFieldPlugin.batches = []
+        for i in range(5):
+            BatchProduct.objects.create(name='Product %d' % i, price=i + 1)
+
+    def test_to_dicts(self):
+        """serialize_field_batch is called once per field per chunk, on the queryset prepared by the plugin"""
+        result = to_dicts(BatchProduct.objects.order_by('pk'), chunk_size=2, inspect_related_objects=False)
+        self.assertEqual(BatchPriceFieldPlugin.batches, [2, 2, 1])
+        self.assertEqual(result[0], {'name': 'Product 0', 'price': {'amount': 1, 'currency': 'EUR'}})
+        self.assertEqual([r['price']['amount'] for r in result], [1, 2, 3, 4, 5])
+
+        BatchPriceFieldPlugin.batches = []
+        to_dicts(BatchProduct.objects.all())
+        self.assertEqual(BatchPriceFieldPlugin.batches, [5])
+
+    def test_to_json_lines(self):
+        lines = to_json_lines(BatchProduct.objects.order_by('pk'), inspect_related_objects=False).splitlines()
+        self.assertEqual(BatchPriceFieldPlugin.batches, [5])
+        self.assertEqual(json.loads(lines[4].decode('utf-8')),
+                         {'name': 'Product 4', 'price': {'amount': 5, 'currency': 'EUR'}})
+
+    def test_single_instance(self):
+        """to_dict of a single instance still goes through serialize_field"""
+        product = BatchProduct.objects.get(name='Product 1')
+        self.assertEqual(product.to_dict(inspect_related_objects=False),
+                         {'name': 'Product 1', 'price': {'amount': 2}})
+        self.assertEqual(BatchPriceFieldPlugin.batches, [])
+
+
+class BulkPluginProduct(Product):
+    TO_DICT_SERIALIZATION_PLUGINS = ('tests.test_plugins.PriceFieldPlugin', CharFieldPlugin)
+    TO_DICT_SKIP = ('id',)
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class BatchProduct(Product):
+    TO_DICT_SERIALIZATION_PLUGINS = (BatchPriceFieldPlugin,)
+    TO_DICT_SKIP = ('id',)
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_projection
+------------
+
+Tests for `django-model-to-dict` field projections.
+"""
+
+from unittest import mock
+
+from django.test import TestCase
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product
+from django_model_to_dict.plan import freeze_projection, parse_projection
+from django_model_to_dict.querysets import to_dicts
+
+
+class ProjectionTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Ivo", nickname="Super", last_name="Bobul", middle_name="Tarasovich", has_superpowers=True,
+            tel="333-55-55", email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+            address_country="Ukraine", address_city="Kiev", address_street="Tarasa Shevchenko")
+        apple = Product.objects.create(name='Apple', price=10)
+        for i in range(3):
+            order = Order.objects.create(customer=self.customer)
+            OrderPosition.objects.create(order=order, product=apple, price=apple.price, quantity=i + 1)
+
+    def test_parse_projection(self):
+        self.assertEqual(parse_projection('name, address.city,orders.price,orders'), {
+            'name': {}, 'address': {'city': {}}, 'orders': {'price': {}}})
+        self.assertEqual(parse_projection(['name.first']), {'name': {'first': {}}})
+
+    def test_to_dict_projection(self):
+        """Projections select root fields, whole buckets, bucket fields and related objects"""
+        customer = Customer.objects.get()
+        self.assertEqual(customer.to_dict(fields='nickname,name,address.city'), {
+            'nickname': 'Super',
+            'name': {'first': 'Ivo', 'middle': 'Tarasovich', 'last': 'Bobul'},
+            'address': {'city': 'Kiev'},
+        })
+        order = Order.objects.first()
+        self.assertEqual(order.to_dict(fields='customer.contacts.tel,order_positions.quantity'), {
+            'customer': {'contacts': {'tel': '333-55-55'}},
+            'order_positions': [{'quantity': 1}],
+        })
+
+    def test_to_dicts_projection_pushdown(self):
+        """Only the projected columns are selected from the database"""
+        with self.assertNumQueries(1) as captured:
+            self.assertEqual(to_dicts(Customer.objects.all(), fields='address.city'), [{'address': {'city': 'Kiev'}}])
+        self.assertNotIn('address_street', captured.captured_queries[0]['sql'])
+
+    def test_to_dicts_related_projection_pushdown(self):
+        """Projected related objects are prefetched with the projected fields only"""
+        fields = 'id,customer.nickname,order_positions.quantity'
+        expected = [o.to_dict(fields=fields) for o in Order.objects.all()]
+        with self.assertNumQueries(3) as captured:
+            self.assertEqual(to_dicts(Order.objects.all(), fields=fields), expected)
+        sql = ' '.join(query['sql'] for query in captured.captured_queries)
+        self.assertNotIn('address_street', sql)
+        self.assertNotIn('"price"', sql)
+
+    def test_projection_cache_size(self):
+        """Only the most recently used projected plans are kept"""
+        plan = Customer._get_to_dict_plan()
+        plan._projections.clear()
+        with mock.patch.object(plan, 'projection_cache_size', 2):
+            nickname = Customer._get_to_dict_plan('nickname')
+            Customer._get_to_dict_plan('name')
+            self.assertIs(Customer._get_to_dict_plan('nickname'), nickname)
+            Customer._get_to_dict_plan('address')
+            self.assertEqual(len(plan._projections), 2)
+            self.assertIs(Customer._get_to_dict_plan('nickname'), nickname)
+            self.assertNotIn(freeze_projection({'name': {}}), plan._projections)
+
+            # arbitrary (e.g. client given) projections never grow the cache
+            customer = Customer.objects.get()
+            for i in range(100):
+                self.assertEqual(customer.to_dict(fields='nickname,unknown_%d' % i), {'nickname': 'Super'})
+            self.assertEqual(len(plan._projections), 2)
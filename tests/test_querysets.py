@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_querysets
+------------
+
+Tests for `django-model-to-dict` bulk serialization.
+"""
+
+from django.test import TestCase
+from django_model_to_dict.models import Customer, DeliveryRecord, Order, OrderPosition, Person, Product
+from django_model_to_dict.querysets import to_dicts, ToDictQuerySet
+
+
+class ToDictsTestCase(TestCase):
+    def setUp(self):
+        Person.objects.create(first_name="Ivo", last_name="Bobul")
+        Person.objects.create(first_name="Taras", middle_name="Grigorovich", last_name="Shevchenko")
+        DeliveryRecord.objects.create(address_country="Russia", address_city="Moscow", address_street="Red Square")
+        Customer.objects.create(first_name="Ivo", nickname="Super", last_name="Bobul", middle_name="Tarasovich",
+                                actually_exists=False, has_superpowers=True,
+                                tel="333-55-55", email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+                                address_country="Ukraine", address_city="Kiev", address_street="Tarasa Shevchenko")
+
+    def test_to_dicts_matches_to_dict(self):
+        """Bulk serialization gives the same output as per-instance serialization"""
+        for queryset, kwargs in (
+                (Person.objects.all(), {}),
+                (Person.objects.all(), {'compress_postfixes': False}),
+                (DeliveryRecord.objects.all(), {'compress_prefixes': False, 'compress_fields': False}),
+                (Customer.objects.all(), {'inspect_related_objects': False}),
+                (Customer.objects.all(), {})):
+            self.assertEqual(to_dicts(queryset, **kwargs), [o.to_dict(**kwargs) for o in queryset])
+
+    def test_to_dicts_reads_values(self):
+        """Rows are read with values_list(), skipped columns are not selected"""
+        with self.assertNumQueries(1) as captured:
+            to_dicts(Customer.objects.all(), inspect_related_objects=False)
+        sql = captured.captured_queries[0]['sql']
+        self.assertIn('address_city', sql)
+        self.assertNotIn('created_at', sql)
+
+    def test_queryset_method(self):
+        """ToDictQuerySet exposes bulk serialization as a queryset method"""
+        queryset = ToDictQuerySet(model=Person).order_by('last_name')
+        self.assertEqual(queryset.to_dicts(), [o.to_dict() for o in queryset])
+
+
+class PrefetchForToDictTestCase(TestCase):
+    def setUp(self):
+        products = [Product.objects.create(name=name, price=price)
+                    for name, price in (('Apple', 10), ('Pear', 12), ('Tomato', 9))]
+        for i in range(5):
+            customer = Customer.objects.create(first_name="Ivo", last_name="Bobul %s" % i, tel="333-55-55",
+                                               email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+                                               address_country="Ukraine", address_street="Tarasa Shevchenko")
+            for j in range(i):
+                order = Order.objects.create(customer=customer)
+                for product in products:
+                    OrderPosition.objects.create(order=order, product=product, price=product.price, quantity=j)
+
+    def test_related_objects_are_prefetched(self):
+        """The number of queries doesn't depend on the number of serialized objects"""
+        expected = [o.to_dict() for o in Order.objects.all()]
+        with self.assertNumQueries(2):
+            self.assertEqual(to_dicts(Order.objects.all()), expected)
+
+        expected = [o.to_dict() for o in Customer.objects.all()]
+        with self.assertNumQueries(2):
+            self.assertEqual(to_dicts(Customer.objects.all()), expected)
+
+    def test_chunked_prefetch(self):
+        """Chunked serialization issues one set of prefetch queries per chunk"""
+        expected = [o.to_dict() for o in Order.objects.all()]
+        with self.assertNumQueries(1 + 4):
+            self.assertEqual(to_dicts(Order.objects.all(), chunk_size=3), expected)
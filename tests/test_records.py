@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_records
+------------
+
+Tests for `django-model-to-dict` compact records.
+"""
+
+import operator
+import pickle
+
+from django.test import TestCase
+from django_model_to_dict.models import Customer, DeliveryRecord, Order, OrderPosition, Person, Product
+from django_model_to_dict.querysets import ToDictQuerySet, to_dicts
+from django_model_to_dict.records import MISSING, Record, get_record_class, to_record, to_records
+
+
+class RecordsTestCase(TestCase):
+
+    def setUp(self):
+        Person.objects.create(first_name="Ivo", last_name="Bobul")
+        Person.objects.create(first_name="Taras", middle_name="Grigorovich", last_name="Shevchenko")
+        DeliveryRecord.objects.create(address_country="Russia", address_city="Moscow", address_street="Red Square")
+        customer = Customer.objects.create(first_name="Ivo", nickname="Super", last_name="Bobul", tel="333-55-55",
+                                           address_country="Ukraine", address_city="Kiev")
+        product = Product.objects.create(name="Apple", price=10)
+        order = Order.objects.create(customer=customer)
+        OrderPosition.objects.create(order=order, product=product, price=10, quantity=2)
+
+    def test_matches_to_dicts(self):
+        """Records have the same items as dictionaries, in the same order"""
+        for queryset, kwargs in (
+                (Person.objects.all(), {}),
+                (Person.objects.all(), {'compress_postfixes': False}),
+                (DeliveryRecord.objects.all(), {'compress_prefixes': False, 'compress_fields': False}),
+                (Customer.objects.all(), {'inspect_related_objects': False, 'compress_empty_groups': True}),
+                (Customer.objects.all(), {'fields': 'name.first,address,orders'}),
+                (Customer.objects.all(), {'depth': 2}),
+                (OrderPosition.objects.all(), {'related_modes': {'order': 'pk', 'product': 'pk'}})):
+            queryset = queryset.order_by('pk')
+            records = to_records(queryset, **kwargs)
+            expected = to_dicts(queryset, **kwargs)
+            self.assertEqual(records, expected)
+            self.assertEqual([record.to_dict() for record in records], expected)
+            self.assertEqual([list(record) for record in records], [list(result) for result in expected])
+
+    def test_mapping(self):
+        record = ToDictQuerySet(model=Customer).to_records(inspect_related_objects=False)[0]
+        self.assertIsInstance(record, Record)
+        self.assertEqual(record['name']['first'], "Ivo")
+        self.assertEqual(dict(record['address']), {'country': "Ukraine", 'city': "Kiev"})
+        self.assertNotIn('middle', record['name'])
+        self.assertIsNone(record.get('actually_exists'))
+        self.assertRaises(KeyError, lambda: record['actually_exists'])
+        self.assertRaises(TypeError, operator.setitem, record, 'nickname', "Ivo")
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_values_rows(self):
+        """Records of values_list() rows share their class and keep the rows as they are"""
+        with self.assertNumQueries(1):
+            records = to_records(Person.objects.order_by('pk'))
+        self.assertIs(type(records[0]), type(records[1]))
+        self.assertIsInstance(records[0]._values, tuple)
+        self.assertIsNone(records[0]._extra)
+
+    def test_changed_output(self):
+        """Items differing from the plan (e.g. related objects) are kept alongside the values"""
+        class HookedPerson(Person):
+            class Meta:
+                proxy = True
+                app_label = 'django_model_to_dict'
+
+            def _to_dict_pre_finish_hook(self, result):
+                del result['name']
+                result['greeting'] = 'Hi'
+
+        person = HookedPerson.objects.get(first_name="Ivo")
+        record = to_record(person)
+        self.assertEqual(record, person.to_dict())
+        self.assertEqual(record._extra, {'name': MISSING, 'greeting': 'Hi'})
+        self.assertNotIn('name', record)
+
+    def test_pickle(self):
+        records = to_records(Customer.objects.all(), fields='name,orders')
+        self.assertEqual(pickle.loads(pickle.dumps(records)), records)
+        self.assertIs(type(pickle.loads(pickle.dumps(records[0]))), type(records[0]))
+
+    def test_record_class_cache(self):
+        plan = Person._get_to_dict_plan()
+        compression = (True, True, True, True, False)
+        self.assertIs(get_record_class(plan, compression), get_record_class(plan, compression))
+        self.assertIsNot(get_record_class(plan, compression), get_record_class(plan, (False,) * 5))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_related_modes
+------------
+
+Tests for `django-model-to-dict` related objects emitted as primary keys or skipped.
+"""
+
+from django.test import TestCase
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product
+from django_model_to_dict.querysets import to_dicts
+
+
+class PkOrder(Order):
+    TO_DICT_RELATED_MODES = {'customer': 'pk', 'order_positions': 'pk'}
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class UnknownModeOrder(Order):
+    TO_DICT_RELATED_MODES = {'customer': 'pks'}
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class RelatedModesTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                                email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+                                                address_country="Ukraine", address_street="Tarasa Shevchenko")
+        product = Product.objects.create(name='Apple', price=10)
+        for i in range(2):
+            order = Order.objects.create(customer=self.customer)
+            OrderPosition.objects.create(order=order, product=product, price=10, quantity=i + 1)
+
+    def test_pk(self):
+        """Foreign keys are emitted as primary keys without fetching the related objects"""
+        order = Order.objects.first()
+        with self.assertNumQueries(1):
+            result = order.to_dict(related_modes={'customer': 'pk'})
+        self.assertEqual(result['customer'], self.customer.pk)
+        self.assertEqual(result['order_positions'], [p.to_dict(depth=0) for p in order.order_positions.all()])
+        self.assertEqual(self.customer.to_dict(related_modes={'orders': 'pk'})['orders'],
+                         [o.pk for o in self.customer.orders.all()])
+
+    def test_skip(self):
+        """Skipped related objects are not emitted at all"""
+        order = Order.objects.first()
+        with self.assertNumQueries(0):
+            self.assertEqual(order.to_dict(related_modes={'customer': 'skip', 'order_positions': 'skip'}),
+                             {'id': order.pk})
+
+    def test_model_modes(self):
+        """Related modes may be set with TO_DICT_RELATED_MODES, and overridden per call"""
+        order = PkOrder.objects.first()
+        self.assertEqual(order.to_dict(), {'id': order.pk, 'customer': self.customer.pk,
+                                           'order_positions': [p.pk for p in order.order_positions.all()]})
+        self.assertEqual(order.to_dict(related_modes={'customer': 'nested'})['customer'],
+                         self.customer.to_dict(depth=0))
+
+    def test_nested_modes(self):
+        """Dotted keys apply to nested related objects"""
+        result = self.customer.to_dict(depth=2, related_modes={'orders.order_positions': 'pk'})
+        order = self.customer.orders.first()
+        self.assertEqual(result['orders'][0]['order_positions'], [p.pk for p in order.order_positions.all()])
+
+    def test_to_dicts(self):
+        """Foreign keys emitted as primary keys are read with values_list()"""
+        related_modes = {'customer': 'pk', 'order_positions': 'skip'}
+        expected = [o.to_dict(related_modes=related_modes) for o in Order.objects.all()]
+        with self.assertNumQueries(1):
+            self.assertEqual(to_dicts(Order.objects.all(), related_modes=related_modes), expected)
+
+        related_modes = {'customer.orders': 'pk'}
+        expected = [o.to_dict(depth=2, related_modes=related_modes) for o in Order.objects.all()]
+        self.assertEqual(expected[0]['customer']['orders'], [o.pk for o in self.customer.orders.all()])
+        with self.assertNumQueries(4):
+            # orders joined with customers, order positions, products, primary keys of customers' orders
+            self.assertEqual(to_dicts(Order.objects.all(), depth=2, related_modes=related_modes), expected)
+
+    def test_unknown_mode(self):
+        """Unknown related modes are rejected instead of being emitted as nested objects"""
+        order = Order.objects.first()
+        for serialize in (order.to_dict, lambda **kwargs: to_dicts(Order.objects.all(), **kwargs)):
+            with self.assertRaisesRegex(ValueError, 'pks'):
+                serialize(related_modes={'customer': 'pks'})
+        with self.assertRaisesRegex(ValueError, 'pks'):
+            UnknownModeOrder.objects.first().to_dict()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_snapshots
+------------
+
+Tests for `django-model-to-dict` snapshots.
+"""
+import json
+from unittest import mock
+
+from django.apps import apps
+from django.core.management import call_command
+from django.db.models.signals import post_save
+from django.test import TestCase
+from django.utils.six import StringIO
+from django_model_to_dict import cache
+from django_model_to_dict.cache import LRUCacheBackend
+from django_model_to_dict.models import Customer, Order, OrderPosition, Product, ProductTag, Tag
+from django_model_to_dict.snapshots import store
+from django_model_to_dict.snapshots.models import Snapshot
+from django_model_to_dict.snapshots.store import iter_snapshots, rebuild, to_snapshot_json
+from tests.test_cache import Catalog, CatalogItem
+
+
+class SnapshotOrderPosition(OrderPosition):
+    TO_DICT_SNAPSHOTS = True
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class SnapshotOrder(Order):
+    TO_DICT_SNAPSHOTS = True
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class SnapshotCustomer(Customer):
+    TO_DICT_SNAPSHOTS = True
+    TO_DICT_SNAPSHOT_ARGUMENTS = {'inspect_related_objects': False, 'compress_empty_groups': True}
+
+    class Meta:
+        proxy = True
+        app_label = 'django_model_to_dict'
+
+
+class SnapshotsTestCase(TestCase):
+
+    def setUp(self):
+        self.customer = SnapshotCustomer.objects.create(first_name="Ivo", last_name="Bobul")
+        self.order = Order.objects.create(customer=self.customer)
+        self.product = Product.objects.create(name="Guitar", price=100)
+        self.position = SnapshotOrderPosition.objects.create(order=self.order, product=self.product, price=100,
+                                                             quantity=2)
+
+    def get_payload(self, instance):
+        snapshot = Snapshot.objects.get(model=instance._meta.label_lower, object_pk=str(instance.pk))
+        return json.loads(snapshot.payload)
+
+    def test_save(self):
+        """Snapshots are stored on save with the configured arguments"""
+        self.assertEqual(self.get_payload(self.customer), {'name': {'first': "Ivo", 'last': "Bobul"}})
+        self.customer.nickname = "Bobul"
+        self.customer.save()
+        self.assertEqual(self.get_payload(self.customer)['nickname'], "Bobul")
+        self.assertEqual(self.get_payload(self.position)['product'], {'id': self.product.pk, 'name': "Guitar",
+                                                                      'price': 100})
+
+    def test_dependencies(self):
+        """Changes of embedded objects refresh the snapshots embedding them"""
+        self.product.price = 120
+        self.product.save()
+        self.assertEqual(self.get_payload(self.position)['product']['price'], 120)
+
+    def test_moved_objects(self):
+        """Snapshots of the objects a changed object was moved away from are refreshed too"""
+        other_order = Order.objects.create(customer=self.customer)
+        order, other_order = SnapshotOrder.objects.get(pk=self.order.pk), SnapshotOrder.objects.get(pk=other_order.pk)
+        order.save()
+        other_order.save()
+        self.assertEqual(len(self.get_payload(order)['order_positions']), 1)
+
+        position = OrderPosition.objects.get(pk=self.position.pk)
+        position.order = other_order
+        position.save()
+        self.assertEqual(self.get_payload(order)['order_positions'], [])
+        self.assertEqual([p['id'] for p in self.get_payload(other_order)['order_positions']], [position.pk])
+
+    def test_cleared_relations(self):
+        """Snapshots of the objects removed from a many-to-many relation with clear() are refreshed"""
+        item = CatalogItem.objects.create(name='Apple')
+        catalog = Catalog.objects.create()
+        with mock.patch.object(CatalogItem, 'TO_DICT_SNAPSHOTS', True, create=True):
+            catalog.items.add(item)
+            self.assertEqual(self.get_payload(item)['catalogs'], [catalog.pk])
+            catalog.items.clear()
+            self.assertEqual(self.get_payload(item)['catalogs'], [])
+
+    def test_cached_output(self):
+        """Snapshots of models with cached output are built from their current state"""
+        tag = Tag.objects.create(name="music")
+        with mock.patch.object(Tag, 'TO_DICT_SNAPSHOTS', True, create=True), \
+                mock.patch.object(Tag, 'TO_DICT_CACHE', LRUCacheBackend(), create=True):
+            ProductTag.objects.create(product=self.product, tag=tag)
+            self.assertEqual(tag.to_dict()['name'], "music")
+            tag.name = "rock"
+            tag.save()
+            self.assertEqual(self.get_payload(tag)['name'], "rock")
+            self.assertEqual(self.get_payload(tag)['products'], [self.product.pk])
+            tag.to_dict()
+            self.product.tags.clear()
+            self.assertEqual(self.get_payload(tag)['products'], [])
+            self.assertEqual(tag.to_dict()['products'], [])
+
+    def test_untracked_dependents(self):
+        """Saves of objects embedded in models without snapshots nor cached output cost no extra queries"""
+        self.assertTrue(cache.is_tracked(SnapshotOrder))
+        self.assertFalse(cache.is_tracked(Tag))
+        product_tag = ProductTag.objects.create(product=self.product, tag=Tag.objects.create(name="music"))
+        with self.assertNumQueries(1):
+            product_tag.save()
+
+    def test_signals_connected_on_demand(self):
+        """Signals are connected once a model keeps snapshots, either on app ready or when it's defined later"""
+        def is_connected():
+            return any(lookup_key[0] == 'django_model_to_dict.snapshots.post_save'
+                       for lookup_key, _ in post_save.receivers)
+
+        with mock.patch.object(store, '_signals_connected', False):
+            post_save.disconnect(dispatch_uid='django_model_to_dict.snapshots.post_save')
+            with mock.patch.object(store, 'is_used', return_value=False):
+                apps.get_app_config('to_dict_snapshots').ready()
+            self.assertFalse(is_connected())
+            store.on_class_prepared(Order)
+            self.assertFalse(is_connected())
+            store.on_class_prepared(SnapshotOrder)
+            self.assertTrue(is_connected())
+
+    def test_delete(self):
+        """Snapshots of deleted objects are deleted"""
+        self.position.delete()
+        self.assertFalse(Snapshot.objects.filter(model='django_model_to_dict.snapshotorderposition').exists())
+
+    def test_read(self):
+        """Snapshots are read along with the objects in a single query, missing ones are built on the fly"""
+        queryset = SnapshotCustomer.objects.order_by('pk')
+        with self.assertNumQueries(1):
+            self.assertEqual([json.loads(payload) for payload in iter_snapshots(queryset)],
+                             [{'name': {'first': "Ivo", 'last': "Bobul"}}])
+
+        SnapshotCustomer.objects.filter(pk=self.customer.pk).update(first_name="Ivan")
+        Snapshot.objects.all().delete()
+        data = json.loads(to_snapshot_json(queryset).decode('utf-8'))
+        self.assertEqual(data, [{'name': {'first': "Ivan", 'last': "Bobul"}}])
+        self.assertEqual(Snapshot.objects.count(), 1)
+
+    def test_rebuild(self):
+        """Snapshots are rebuilt in bulk, stale ones are deleted"""
+        SnapshotOrderPosition.objects.filter(pk=self.position.pk).update(quantity=3)
+        Snapshot.objects.create(model='django_model_to_dict.snapshotorderposition', version=1, object_pk='100500',
+                                payload='{}')
+        self.assertEqual(rebuild(SnapshotOrderPosition), 1)
+        self.assertEqual(self.get_payload(self.position)['quantity'], 3)
+        self.assertEqual(Snapshot.objects.filter(model='django_model_to_dict.snapshotorderposition').count(), 1)
+
+        stdout = StringIO()
+        call_command('to_dict_rebuild_snapshots', stdout=stdout)
+        self.assertIn('Rebuilt 1 snapshots of django_model_to_dict.SnapshotCustomer', stdout.getvalue())
+        self.assertIn('Rebuilt 1 snapshots of django_model_to_dict.SnapshotOrderPosition', stdout.getvalue())
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_streaming
+------------
+
+Tests for `django-model-to-dict` streaming JSON serialization.
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase
+from django_model_to_dict.models import Order, OrderPosition, Person, Product, Customer
+from django_model_to_dict.querysets import to_dicts
+from django_model_to_dict.streaming import stream_json, stream_json_lines, streaming_json_response
+
+
+class StreamJSONTestCase(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(first_name="Ivo", last_name="Bobul", tel="333-55-55",
+                                           email="super.ivo@bobul.com", website="https://super.ivo.bobul.com",
+                                           address_country="Ukraine", address_street="Tarasa Shevchenko")
+        product = Product.objects.create(name='Apple', price=10)
+        for i in range(5):
+            order = Order.objects.create(customer=customer)
+            OrderPosition.objects.create(order=order, product=product, price=product.price, quantity=i + 1)
+
+    def test_stream_json(self):
+        """Streamed chunks make up a JSON array of serialized objects"""
+        expected = json.loads(json.dumps(to_dicts(Order.objects.all()), cls=DjangoJSONEncoder))
+        chunks = list(stream_json(Order.objects.all(), chunk_size=2))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(json.loads(''.join(chunks)), expected)
+
+    def test_stream_empty_queryset(self):
+        self.assertEqual(''.join(stream_json(Person.objects.all())), '[]')
+
+    def test_stream_json_lines(self):
+        lines = ''.join(stream_json_lines(OrderPosition.objects.all(), chunk_size=2)).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], to_dicts(OrderPosition.objects.all()))
+
+    def test_streaming_response(self):
+        response = streaming_json_response(Order.objects.all(), inspect_related_objects=False)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(b''.join(response.streaming_content).decode()),
+                         to_dicts(Order.objects.all(), inspect_related_objects=False))